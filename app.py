@@ -1,12 +1,19 @@
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, jsonify, request, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import json
 import os
 import logging
 from datetime import datetime
 from gmail_service import GmailMonitor
+from email_store import EmailStore, RecipientWaiters
+from email_db import EmailDatabase
+from ingest import StoreSink
+from subscriptions import ALL_ROOM, Subscription, email_rooms, route
+from scan_jobs import ScanCoordinator
 import threading
 import time
+import hashlib
+import math
 
 # Configurar logging
 logging.basicConfig(
@@ -21,9 +28,59 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Variables globales
 monitor = None
-netflix_emails = []
+email_store = EmailStore()
+email_db = None   # EmailDatabase (SQLite) si la persistencia está habilitada
 monitoring_active = False
 monitoring_thread = None
+full_check_thread = None
+idle_mux = None   # IdleMultiplexer del loop de monitoreo (para la métrica de cobertura)
+# Suscripción de cada cliente de Socket.IO (sid → Subscription); sin entrada = room 'all'
+client_subscriptions = {}
+
+# Campos que /api/emails devuelve por defecto (el HTML completo se pide aparte)
+EMAIL_LIST_FIELDS = ['key', 'id', 'subject', 'from', 'to', 'date', 'timestamp',
+                     'type', 'code', 'body_preview', 'account', 'accounts', 'expired']
+EMAIL_ALL_FIELDS = EMAIL_LIST_FIELDS + ['body_full']
+EMAILS_PAGE_SIZE = 50
+EMAILS_MAX_PAGE_SIZE = 500
+WAIT_DEFAULT_TIMEOUT = 30
+WAIT_MAX_TIMEOUT = 120
+# Esperas simultáneas de /api/wait. Con eventlet/gevent cada una es un greenlet;
+# con el servidor por hilos (async_mode 'threading') cada una ocupa un hilo del
+# sistema hasta WAIT_MAX_TIMEOUT segundos, así que el límite es mucho más bajo
+WAIT_MAX_WAITERS = 500
+WAIT_MAX_THREADED_WAITERS = 32
+# Días que se recuerdan los correos ya vistos (para no volver a anunciarlos)
+SEEN_RETENTION_DAYS = 30
+# Segundos mínimos entre verificaciones completas (pedidos más seguidos reciben el último resultado)
+MIN_SCAN_INTERVAL = 30
+# Verificación completa periódica de respaldo (IDLE es el camino principal)
+FULL_CHECK_INTERVAL = 300
+SCAN_WAIT_MAX_TIMEOUT = 120
+# Esperas simultáneas de /api/wait. Con eventlet/gevent cada una es un greenlet;
+# con el servidor por hilos (async_mode 'threading') cada una ocupa un hilo del
+# sistema hasta WAIT_MAX_TIMEOUT segundos, así que el límite es mucho más bajo
+WAIT_MAX_WAITERS = 500
+WAIT_MAX_THREADED_WAITERS = 32
+# Minutos de validez de cada tipo de código; al vencer se descarta el HTML y queda la metadata
+DEFAULT_EXPIRY_MINUTES = {'codigo_inicio': 15, 'codigo_temporal': 15, 'actualizacion_hogar': 15}
+# Mínimo de cada ajuste numérico que acepta POST /api/settings
+NUMERIC_SETTINGS = {
+    'check_interval': 1, 'days_back': 1, 'fetch_workers': 1, 'account_timeout': 1,
+    'fetch_batch_size': 1, 'pool_max_per_account': 1, 'pool_idle_timeout': 1,
+    'archive_retention_days': 1, 'min_scan_interval': 0, 'parse_workers': 0
+}
+NULLABLE_SETTINGS = {'parse_workers'}   # null = valor por defecto
+
+# Esperas de /api/wait por destinatario; los eventos siguen el modo de Socket.IO
+recipient_waiters = RecipientWaiters(
+    event_factory=socketio.server.eio.create_event,
+    max_waiters=WAIT_MAX_THREADED_WAITERS if socketio.async_mode == 'threading' else WAIT_MAX_WAITERS
+)
+
+# Último número de secuencia del almacén ya enviado a los clientes
+published_seq = 0
+publish_lock = threading.Lock()
 
 def load_accounts():
     """Carga las cuentas desde variable de entorno o archivo de configuración"""
@@ -62,47 +119,393 @@ def load_settings():
         return {
             'check_interval': 30,  # 30 segundos para detección casi en tiempo real
             'days_back': 7,
-            'auto_mark_read': False
+            'auto_mark_read': False,
+            'fetch_workers': 8,
+            'account_timeout': 120,
+            'fetch_batch_size': 50,
+            'pool_max_per_account': 3,
+            'pool_idle_timeout': 600,
+            'database_path': 'data/emails.db',
+            'archive_retention_days': 90,
+            'expiry_minutes': DEFAULT_EXPIRY_MINUTES,
+            'min_scan_interval': MIN_SCAN_INTERVAL
         }
     except Exception as e:
         logger.error(f"Error al cargar settings.json: {str(e)}")
         return {
             'check_interval': 30,
             'days_back': 7,
-            'auto_mark_read': False
+            'auto_mark_read': False,
+            'fetch_workers': 8,
+            'account_timeout': 120,
+            'fetch_batch_size': 50,
+            'pool_max_per_account': 3,
+            'pool_idle_timeout': 600,
+            'database_path': 'data/emails.db',
+            'archive_retention_days': 90,
+            'expiry_minutes': DEFAULT_EXPIRY_MINUTES,
+            'min_scan_interval': MIN_SCAN_INTERVAL
         }
 
-def monitoring_loop():
+def is_number(value):
+    """Número finito de JSON (true/false no cuentan)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_settings(updates):
+    """Devuelve el error de una actualización parcial de settings, o None si es válida"""
+    if not isinstance(updates, dict):
+        return 'Se esperaba un objeto JSON con la configuración'
+    for key, minimum in NUMERIC_SETTINGS.items():
+        if key not in updates or (updates[key] is None and key in NULLABLE_SETTINGS):
+            continue
+        if not is_number(updates[key]) or updates[key] < minimum:
+            return f"'{key}' debe ser un número mayor o igual a {minimum}"
+    if 'expiry_minutes' in updates:
+        minutes = updates['expiry_minutes']
+        if not isinstance(minutes, dict):
+            return "'expiry_minutes' debe ser un objeto {tipo: minutos}"
+        for email_type, value in minutes.items():
+            if email_type not in DEFAULT_EXPIRY_MINUTES:
+                return f"Tipo de correo desconocido en 'expiry_minutes': {email_type}"
+            if value is not None and (not is_number(value) or value < 0):
+                return f"'expiry_minutes.{email_type}' debe ser un número de minutos mayor o igual a 0 (0 = no vence)"
+    return None
+
+def apply_expiry_settings(settings):
+    """Configura el TTL por tipo del almacén (0 o null = el tipo no vence)"""
+    minutes = settings.get('expiry_minutes', DEFAULT_EXPIRY_MINUTES) or {}
+    email_store.set_ttl({email_type: value * 60 for email_type, value in minutes.items() if value})
+
+def apply_scan_settings(settings):
+    """Configura la separación mínima entre verificaciones completas"""
+    scans.min_interval = settings.get('min_scan_interval', MIN_SCAN_INTERVAL)
+
+def expire_emails():
+    """Vence los correos cuyo TTL pasó y envía los cambios 'expire'"""
+    expired = email_store.expire()
+    if expired:
+        logger.info(f"{expired} correos vencidos (se descartó su HTML)")
+        publish_changes()
+
+def create_monitor(accounts):
+    """Crea el GmailMonitor con los parámetros de concurrencia de settings.json"""
+    settings = load_settings()
+    new_monitor = GmailMonitor(
+        accounts,
+        max_workers=settings.get('fetch_workers', 8),
+        account_timeout=settings.get('account_timeout', 120),
+        fetch_batch_size=settings.get('fetch_batch_size', 50),
+        pool_max_per_account=settings.get('pool_max_per_account', 3),
+        pool_idle_timeout=settings.get('pool_idle_timeout', 600),
+        parse_workers=settings.get('parse_workers')
+    )
+    if email_db:
+        # Arranque en caliente: la primera verificación sólo trae lo posterior a los cursores guardados
+        new_monitor.sync_cursors.update(email_db.load_cursors())
+    return new_monitor
+
+def open_database():
     """
-    Loop de monitoreo en segundo plano.
-    Intenta usar IMAP IDLE (push en tiempo real).
-    Si IDLE no funciona, usa polling con el intervalo configurado.
+    Abre la base SQLite y carga en memoria los correos guardados, así el panel
+    tiene datos apenas arranca el proceso (sin esperar la verificación completa).
+    La ruta sale de DATABASE_PATH o de settings.json; vacía deshabilita la persistencia.
     """
-    global netflix_emails, monitoring_active
+    global email_db, published_seq
 
+    if email_db:
+        return email_db
     settings = load_settings()
-    check_interval = settings.get('check_interval', 30)
+    path = os.environ.get('DATABASE_PATH', settings.get('database_path', 'data/emails.db'))
+    if not path:
+        logger.info("Persistencia deshabilitada (database_path vacío)")
+        return None
+
+    start = time.time()
+    email_db = EmailDatabase(path)
     days_back = settings.get('days_back', 7)
+    cutoff = time.time() - (days_back + 1) * 86400
+    with email_store.lock:
+        email_store.add_many(email_db.load_emails(since=cutoff))
+        email_db.mark_loaded(email_store)
+        published_seq = email_store.version
+    logger.info(f"Base de datos {path}: {len(email_store)} correos cargados en {time.time() - start:.2f}s")
+    return email_db
 
-    logger.info(f"Iniciando loop de monitoreo (intervalo fallback: {check_interval}s, días: {days_back})")
+def merge_scan_results(found, resynced, days_back, since=None):
+    """
+    Reconcilia el resultado de una verificación (incremental) con el almacén por
+    clave estable: altas, cambios y, en las cuentas resincronizadas, bajas.
+    Descarta los correos más antiguos que days_back. since es la versión del almacén
+    al empezar la verificación: lo que IDLE agregó mientras tanto se conserva.
+
+    Returns:
+        Lista de correos que no estaban en el almacén
+    """
+    cutoff = time.time() - (days_back + 1) * 86400
+    truly_new = email_store.merge_scan(found, resynced, cutoff=cutoff, since=since)
+    if email_db:
+        # No volver a anunciar correos ya vistos antes (por ejemplo tras una resincronización)
+        truly_new = email_db.filter_unseen(truly_new)
+        email_db.prune_seen(time.time() - max(days_back + 1, SEEN_RETENTION_DAYS) * 86400)
+        retention_days = load_settings().get('archive_retention_days', 90)
+        email_db.prune_archive(time.time() - max(days_back + 1, retention_days) * 86400)
+    return truly_new
+
+def attach_duplicates():
+    """
+    Agrega a cada correo las cuentas donde llegaron sus copias reenviadas (que no
+    se descargaron ni se parsearon). Las copias cuyo original todavía no llegó al
+    almacén (sigue en el pipeline de su cuenta) quedan en cola para la próxima vez.
+
+    Returns:
+        Cantidad de copias anotadas
+    """
+    if not monitor:
+        return 0
+    return monitor.dedupe.apply(email_store.attach_account)
 
-    # ── Carga inicial completa ──────────────────────────────────────────────
+def project_email(email, fields=EMAIL_LIST_FIELDS):
+    """Copia del correo sólo con los campos pedidos (sin el HTML completo por defecto)"""
+    projected = {field: email.get(field) for field in fields if field != 'key'}
+    if 'key' in fields:
+        projected['key'] = EmailStore.public_id(email)
+    return projected
+
+def delta_payload(changes, prev_seq, to_seq=None):
+    """
+    Convierte cambios del almacén en deltas compactos (sin el HTML completo).
+
+    prev_seq y to_seq son los límites del lote completo, no de los cambios
+    enviados: a un cliente suscrito le llega sólo una parte del lote, y el
+    hueco que hay en las secuencias no es un cambio que se haya perdido. El
+    cliente detecta un hueco real cuando prev_seq supera su última secuencia.
+
+    Args:
+        prev_seq: Secuencia anterior al lote (la última ya enviada)
+        to_seq: Última secuencia del lote (por defecto la del último cambio)
+    """
+    deltas = []
+    for seq, op, key, email in changes:
+        delta = {'seq': seq, 'op': op, 'key': EmailStore.format_key(key)}
+        if op != 'remove':
+            delta['email'] = project_email(email)
+        deltas.append(delta)
+    return {
+        'epoch': email_store.epoch,
+        'prev_seq': prev_seq,
+        'to_seq': changes[-1][0] if to_seq is None else to_seq,
+        'deltas': deltas,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def persist_changes():
+    """Guarda en SQLite los cambios del almacén y después los cursores de sincronización"""
+    if not email_db:
+        return
     try:
+        email_db.persist_changes(email_store)
         if monitor:
-            logger.info("Carga inicial de correos de Netflix...")
-            netflix_emails = monitor.fetch_all_netflix_emails(days_back=days_back)
-            logger.info(f"Carga inicial completada: {len(netflix_emails)} correos encontrados")
-            socketio.emit('emails_updated', {
-                'total': len(netflix_emails),
-                'timestamp': datetime.now().isoformat()
-            })
+            email_db.save_cursors(dict(monitor.sync_cursors))
     except Exception as e:
-        logger.error(f"Error en carga inicial: {str(e)}")
+        logger.error(f"Error al guardar en la base de datos: {str(e)}")
+
+def publish_changes():
+    """
+    Guarda los cambios del almacén y los envía desde el último envío.
+
+    Los clientes sin suscripción (room 'all') reciben el lote completo; los
+    suscritos reciben un solo envío con los cambios de sus rooms (cuenta,
+    destinatario, tipo) y los límites del lote completo (ver client_runs). Las
+    estadísticas salen después de los deltas con la secuencia publicada: un
+    cliente suscrito sin cambios en el lote avanza con ella y no confunde el
+    lote siguiente con un hueco. Las esperas de /api/wait se despiertan con los
+    correos nuevos de su destinatario.
+    """
+    global published_seq
+
+    persist_changes()
+    with publish_lock:
+        changes = email_store.changes_since(published_seq)
+        if changes:
+            recipient_waiters.notify(changes)
+        if changes is None:
+            published_seq = email_store.version
+            socketio.emit('resync_required', {'epoch': email_store.epoch, 'seq': published_seq})
+            return
+        if not changes:
+            return
+        prev_seq, published_seq = published_seq, changes[-1][0]
+        if monitor:
+            # Original fuera del almacén: la próxima copia reenviada se procesa como correo propio
+            for _, op, key, _ in changes:
+                if op == 'remove':
+                    monitor.dedupe.release(key)
+        socketio.emit('email_deltas', delta_payload(changes, prev_seq), to=ALL_ROOM)
+        if client_subscriptions:
+            for sids, run in client_runs(changes):
+                socketio.emit('email_deltas', delta_payload(run, prev_seq, published_seq), to=sids)
+        socketio.emit('stats', {**current_stats(), 'epoch': email_store.epoch, 'seq': published_seq})
+
+def client_runs(changes):
+    """
+    Reparte un lote entre los clientes suscritos: cada uno recibe un único envío
+    con todos sus cambios en orden, y los clientes con los mismos cambios
+    comparten el envío. Con varios envíos por lote un cliente que está en varios
+    rooms perdería los posteriores al primero: aplica sólo seq > lastSeq y
+    avanza hasta el to_seq del lote completo.
+
+    Returns:
+        Lista de (sids, cambios)
+    """
+    runs = route(changes, lambda change: email_rooms(change[3]))
+    received = {}   # sid → índices de los runs que le tocan
+    for index, (rooms, _) in enumerate(runs):
+        if not rooms:
+            continue
+        for sid, _ in socketio.server.manager.get_participants('/', rooms):
+            received.setdefault(sid, []).append(index)
+    clients = {}
+    for sid, indices in received.items():
+        clients.setdefault(tuple(indices), []).append(sid)
+    return [(sids, [change for index in indices for change in runs[index][1]])
+            for indices, sids in clients.items()]
+
+def current_stats():
+    """Totales y tasas mantenidos por el almacén al escribir (costo fijo)"""
+    stats = email_store.stats()
+    stats['monitoring_active'] = monitoring_active
+    # Fracción del tiempo que cada cuenta estuvo escuchando en IDLE
+    stats['idle_coverage'] = idle_mux.coverage() if idle_mux else {}
+    return stats
+
+def notify_new_emails(truly_new):
+    """Aviso de correos nuevos (para notificación/sonido); la lista se actualiza con los deltas"""
+    socketio.emit('new_emails', {
+        'count': len(truly_new),
+        'emails': [project_email(e) for e in truly_new]
+    }, to=ALL_ROOM)
+    if client_subscriptions:
+        for rooms, emails in route(truly_new, email_rooms):
+            socketio.emit('new_emails', {
+                'count': len(emails),
+                'emails': [project_email(e) for e in emails]
+            }, to=list(rooms))
+
+def run_full_scan(job):
+    """Verificación completa de todas las cuentas (la ejecuta el ScanCoordinator)"""
+    if not monitor:
+        raise RuntimeError('El monitor no está inicializado')
+    days_back = load_settings().get('days_back', 7)
+    total = len(monitor.accounts)
+    done = []
+    scans.progress(job, 0, total)
+
+    def on_result(account, emails):
+        done.append(account)
+        scans.progress(job, len(done), total)
+
+    # IDLE sigue agregando correos en paralelo mientras corre la verificación
+    since = email_store.version
+    # Cada correo llega al panel en cuanto se parsea; al final se reconcilia todo lo encontrado
+    sink = StoreSink(email_store, on_flush=announce_streamed)
+    found = monitor.fetch_all_netflix_emails(days_back=days_back, on_result=on_result, on_email=sink)
+    sink.flush()
+    truly_new = merge_scan_results(found, monitor.last_resynced, days_back, since=since)
+    attach_duplicates()
+    if truly_new:
+        notify_new_emails(truly_new)
+    publish_changes()
+    new = sink.added + len(truly_new)
+    if new:
+        logger.info(f"Verificación completa ({job.reason}) encontró {new} correos nuevos")
+    return {'new': new, 'total': len(email_store)}
+
+def announce_streamed(new_emails):
+    """Publica y avisa los correos que la verificación va encontrando, sin esperar a que termine"""
+    attach_duplicates()
+    if email_db:
+        # No volver a anunciar correos ya vistos antes (por ejemplo tras una resincronización)
+        new_emails = email_db.filter_unseen(new_emails)
+    publish_changes()
+    if new_emails:
+        notify_new_emails(new_emails)
+
+def emit_scan_update(job):
+    """Progreso de la verificación completa por Socket.IO"""
+    socketio.emit('scan_progress', job.to_dict())
+
+# Verificaciones completas en single-flight (manuales, periódicas e inicial)
+scans = ScanCoordinator(
+    run=run_full_scan,
+    min_interval=MIN_SCAN_INTERVAL,
+    on_update=emit_scan_update,
+    event_factory=socketio.server.eio.create_event,
+    start_task=socketio.start_background_task
+)
+
+def full_check_loop():
+    """
+    Verificaciones completas programadas, en su propio hilo: el loop de IDLE
+    nunca espera a una verificación y sigue detectando correos mientras corre.
+    La primera es la carga inicial; después se pide una cada FULL_CHECK_INTERVAL
+    segundos desde la última que terminó (las manuales también cuentan).
+    """
+    initial = True
+    while monitoring_active:
+        try:
+            last = scans.last
+            due = time.time() if initial or not last else last.finished_at + FULL_CHECK_INTERVAL
+            if not monitor or time.time() < due:
+                time.sleep(min(max(due - time.time(), 0.5), 5))
+                continue
+            logger.info("Carga inicial de correos de Netflix..." if initial
+                        else "Ejecutando verificación completa periódica...")
+            job, _ = scans.request('inicial' if initial else 'periodica', force=initial)
+            scans.wait(job)
+            if initial and job.status == 'done':
+                logger.info(f"Carga inicial completada: {len(email_store)} correos encontrados")
+            initial = False
+        except Exception as e:
+            logger.error(f"Error en verificación programada: {str(e)}")
+            time.sleep(5)
+
+def monitoring_loop():
+    """
+    Loop de monitoreo en segundo plano con IMAP IDLE (push en tiempo real).
+    Las cuentas sin conexión IDLE reciben sus correos con las verificaciones
+    completas periódicas de full_check_loop; check_interval es cada cuánto se
+    despierta el loop para vencer códigos y cerrar conexiones libres.
+    """
+    global full_check_thread, idle_mux
+
+    settings = load_settings()
+    check_interval = settings.get('check_interval', 30)
+    days_back = settings.get('days_back', 7)
+
+    logger.info(f"Iniciando loop de monitoreo (intervalo fallback: {check_interval}s, días: {days_back})")
+
+    # ── Carga inicial y verificaciones periódicas en su propio hilo ─────────
+    full_check_thread = threading.Thread(target=full_check_loop, daemon=True, name='full-check')
+    full_check_thread.start()
 
     # ── Loop principal con IMAP IDLE ────────────────────────────────────────
-    from gmail_service import IMAPService
+    from idle_multiplexer import IdleMultiplexer
+
+    # Un único selector con las conexiones persistentes de todas las cuentas.
+    # Las conexiones IDLE salen del mismo pool que usan las verificaciones completas.
+    gmail_monitor = monitor
+    pool = gmail_monitor.pool
+    idle_mux = IdleMultiplexer(pool=pool)
 
-    idle_services = {}   # email_address → IMAPService con conexión persistente
+    def open_idle_connection(addr, pwd):
+        """Toma una conexión del pool, la pone en IDLE y la registra en el multiplexor."""
+        svc = pool.acquire(addr, pwd)
+        try:
+            svc.prepare_idle()
+            idle_mux.add(svc)
+        except Exception:
+            pool.release(svc, broken=True)
+            raise
 
     def open_idle_connections():
         """Abre conexiones persistentes para IDLE en todas las cuentas."""
@@ -110,106 +513,74 @@ def monitoring_loop():
         for acc in accounts:
             addr = acc.get('email')
             pwd  = acc.get('password')
-            if not addr or not pwd or addr in idle_services:
+            if not addr or not pwd or addr in idle_mux:
                 continue
             try:
-                svc = IMAPService(email_address=addr, password=pwd)
-                svc.connect()
-                svc.mail.select("INBOX")
-                idle_services[addr] = svc
+                open_idle_connection(addr, pwd)
                 logger.info(f"Conexión IDLE abierta para {addr}")
             except Exception as e:
                 logger.warning(f"No se pudo abrir conexión IDLE para {addr}: {e}")
 
-    open_idle_connections()
+    def reconnect_idle(addr):
+        """Cierra la conexión caída de una cuenta e intenta abrir una nueva."""
+        idle_mux.drop(addr)
+        try:
+            accounts = load_accounts()
+            acc_data = next((a for a in accounts if a.get('email') == addr), None)
+            if acc_data:
+                open_idle_connection(addr, acc_data['password'])
+                logger.info(f"[{addr}] Reconectado exitosamente")
+        except Exception as e2:
+            logger.error(f"[{addr}] No se pudo reconectar: {e2}")
 
-    last_full_check = time.time()
-    FULL_CHECK_EVERY = 300   # Forzar re-verificación completa cada 5 min como respaldo
+    open_idle_connections()
 
     while monitoring_active:
         try:
-            new_found = False
+            # ── Escuchar IDLE en todas las cuentas a la vez ─────────────────
+            if not idle_mux:
+                logger.info("Sin conexiones IDLE activas: los correos llegan con las verificaciones completas periódicas")
+            # Despertar a tiempo para el próximo vencimiento
+            timeout = check_interval
+            next_expiry = email_store.next_expiry()
+            if next_expiry is not None:
+                timeout = max(0.5, min(timeout, next_expiry - time.time()))
+            ready, failed = idle_mux.poll(timeout=timeout)
 
-            # ── Escuchar IDLE en cada cuenta ────────────────────────────────
-            for addr, svc in list(idle_services.items()):
+            for addr, lines in ready:
+                svc = idle_mux.services[addr]
                 try:
-                    got_notification = svc.wait_for_new_email(timeout=check_interval)
-                    if got_notification:
-                        logger.info(f"[{addr}] Notificación IDLE recibida — buscando correos nuevos...")
-                        recent = svc.fetch_recent_netflix_emails(minutes_back=15)
-                        if recent:
-                            old_ids = {e['id'] for e in netflix_emails}
-                            truly_new = [e for e in recent if e['id'] not in old_ids]
-                            if truly_new:
-                                netflix_emails = truly_new + netflix_emails
-                                netflix_emails.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
-                                logger.info(f"[{addr}] {len(truly_new)} correos nuevos encontrados por IDLE")
-                                socketio.emit('new_emails', {
-                                    'count': len(truly_new),
-                                    'emails': truly_new
-                                })
-                                socketio.emit('emails_updated', {
-                                    'total': len(netflix_emails),
-                                    'timestamp': datetime.now().isoformat()
-                                })
-                                new_found = True
+                    logger.info(f"[{addr}] Notificación IDLE recibida — descargando correos anunciados...")
+                    recent = svc.fetch_idle_updates(lines)
+                    truly_new = email_store.add_many(recent) if recent else []
+                    if attach_duplicates() or truly_new:
+                        publish_changes()
+                    if truly_new:
+                        logger.info(f"[{addr}] {len(truly_new)} correos nuevos encontrados por IDLE")
+                        notify_new_emails(truly_new)
+                    idle_mux.resume(addr)
                 except Exception as e:
                     logger.warning(f"[{addr}] Error en IDLE, reconectando: {e}")
-                    try:
-                        svc.disconnect()
-                    except:
-                        pass
-                    del idle_services[addr]
-                    # Intentar reconectar
-                    try:
-                        accounts = load_accounts()
-                        acc_data = next((a for a in accounts if a.get('email') == addr), None)
-                        if acc_data:
-                            new_svc = IMAPService(email_address=addr, password=acc_data['password'])
-                            new_svc.connect()
-                            new_svc.mail.select("INBOX")
-                            idle_services[addr] = new_svc
-                            logger.info(f"[{addr}] Reconectado exitosamente")
-                    except Exception as e2:
-                        logger.error(f"[{addr}] No se pudo reconectar: {e2}")
-
-            # ── Si no había conexiones IDLE, esperar el intervalo normal ────
-            if not idle_services:
-                logger.info("Sin conexiones IDLE activas, usando polling normal...")
-                time.sleep(check_interval)
-
-            # ── Verificación completa periódica (cada 5 min) ─────────────────
-            if time.time() - last_full_check >= FULL_CHECK_EVERY:
-                logger.info("Ejecutando verificación completa periódica...")
-                if monitor:
-                    all_emails = monitor.fetch_all_netflix_emails(days_back=days_back)
-                    old_ids = {e['id'] for e in netflix_emails}
-                    truly_new = [e for e in all_emails if e['id'] not in old_ids]
-                    if truly_new:
-                        netflix_emails = all_emails
-                        logger.info(f"Verificación completa encontró {len(truly_new)} correos nuevos")
-                        socketio.emit('new_emails', {
-                            'count': len(truly_new),
-                            'emails': truly_new
-                        })
-                    else:
-                        netflix_emails = all_emails
-                    socketio.emit('emails_updated', {
-                        'total': len(netflix_emails),
-                        'timestamp': datetime.now().isoformat()
-                    })
-                last_full_check = time.time()
+                    failed.append(addr)
+
+            # ── Reconectar las cuentas cuya conexión IDLE falló ─────────────
+            for addr in failed:
+                reconnect_idle(addr)
+
+            # ── Vencer códigos viejos ───────────────────────────────────────
+            expire_emails()
+
+            # ── Cerrar conexiones del pool que llevan demasiado tiempo libres ─
+            pool.evict_idle()
 
         except Exception as e:
             logger.error(f"Error en loop de monitoreo: {str(e)}")
             time.sleep(check_interval)
 
-    # Cerrar conexiones IDLE al detener
-    for addr, svc in idle_services.items():
-        try:
-            svc.disconnect()
-        except:
-            pass
+    # Cerrar conexiones IDLE y las libres del pool al detener
+    idle_mux.close()
+    pool.close_all()
+    gmail_monitor.shutdown_parser()
     logger.info("Loop de monitoreo detenido.")
 
 
@@ -240,12 +611,26 @@ def get_settings():
 
 @app.route('/api/settings', methods=['POST'])
 def update_settings():
-    """Actualiza la configuración"""
+    """
+    Actualiza la configuración. Acepta sólo las claves que cambian: se combinan
+    con settings.json (también dentro de expiry_minutes) en lugar de reemplazarlo.
+    """
+    updates = request.get_json(silent=True)
+    error = validate_settings(updates)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
     try:
-        new_settings = request.json
-        
+        settings = load_settings()
+        if 'expiry_minutes' in updates:
+            updates = {**updates, 'expiry_minutes': {**(settings.get('expiry_minutes') or {}),
+                                                     **updates['expiry_minutes']}}
+        settings.update(updates)
+
         with open('settings.json', 'w') as f:
-            json.dump(new_settings, f, indent=2)
+            json.dump(settings, f, indent=2)
+        apply_expiry_settings(settings)
+        apply_scan_settings(settings)
+        expire_emails()
         
         return jsonify({
             'success': True,
@@ -259,58 +644,237 @@ def update_settings():
 
 @app.route('/api/emails')
 def get_emails():
-    """Obtiene todos los correos de Netflix filtrados"""
+    """
+    Obtiene los correos de Netflix filtrados, paginados y sin el HTML completo.
+
+    Query params:
+        type, account, to: Filtros (se resuelven con los índices del almacén)
+        limit: Correos por página (por defecto 50)
+        cursor: Cursor devuelto como next_cursor por la página anterior
+        fields: Campos separados por coma; 'all' incluye body_full
+
+    Responde 304 si el almacén no cambió desde el ETag que envía el cliente.
+    """
     email_type = request.args.get('type', None)
     account = request.args.get('account', None)
-    
-    filtered_emails = netflix_emails
-    
-    # Filtrar por tipo si se especifica
-    if email_type:
-        filtered_emails = [e for e in filtered_emails if e['type'] == email_type]
-    
-    # Filtrar por cuenta si se especifica
-    if account:
-        filtered_emails = [e for e in filtered_emails if e['account'] == account]
-    
-    return jsonify({
+    to = request.args.get('to', None)
+    cursor = request.args.get('cursor', None)
+
+    try:
+        limit = min(max(int(request.args.get('limit', EMAILS_PAGE_SIZE)), 1), EMAILS_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit debe ser un número'}), 400
+
+    fields_arg = request.args.get('fields', '')
+    if fields_arg == 'all':
+        fields = EMAIL_ALL_FIELDS
+    elif fields_arg:
+        fields = [f for f in fields_arg.split(',') if f in EMAIL_ALL_FIELDS]
+    else:
+        fields = EMAIL_LIST_FIELDS
+
+    # ETag: versión del almacén + parámetros de la consulta
+    query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items()))
+    etag = f"{email_store.epoch}-{email_store.version}-{hashlib.sha1(query.encode()).hexdigest()[:12]}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    try:
+        # Página, total y secuencia tomados juntos: el cliente aplica los deltas posteriores a `seq`
+        with email_store.lock:
+            page, next_cursor = email_store.page(account=account, email_type=email_type, to=to,
+                                                 limit=limit, cursor=cursor)
+            total = email_store.count(account=account, email_type=email_type, to=to)
+            seq = email_store.version
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    response = jsonify({
         'success': True,
-        'emails': filtered_emails,
-        'total': len(filtered_emails),
+        'emails': [project_email(e, fields) for e in page],
+        'total': total,
+        'next_cursor': next_cursor,
+        'seq': seq,
+        'epoch': email_store.epoch,
         'timestamp': datetime.now().isoformat()
     })
+    response.set_etag(etag)
+    # El navegador revalida siempre con If-None-Match y reutiliza el cuerpo si es 304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/emails/<email_key>/body')
+def get_email_body(email_key):
+    """Obtiene el HTML completo de un correo (lo pide el modal al abrirse)"""
+    email = email_store.get(EmailStore.parse_public_id(email_key))
+    if not email:
+        return jsonify({'success': False, 'error': 'Correo no encontrado'}), 404
+    if email.get('expired'):
+        return jsonify({'success': False, 'error': 'El correo venció y su contenido ya no se guarda'}), 410
+    return jsonify({
+        'success': True,
+        'key': email_key,
+        'body': email.get('body_full') or ''
+    })
+
+def recipient_param():
+    """Dirección normalizada del parámetro `to` (acepta 'Nombre <dirección>')"""
+    addresses = EmailStore.recipients(request.args.get('to', ''))
+    return next(iter(addresses), None)
+
+@app.route('/api/latest')
+def get_latest():
+    """
+    Último código o link enviado a un destinatario, leído del índice por destinatario.
+
+    Query params:
+        to: Dirección del destinatario (obligatorio)
+        type: Tipo de correo (opcional)
+    """
+    to = recipient_param()
+    if not to:
+        return jsonify({'success': False, 'error': 'Falta el parámetro to'}), 400
+
+    email = email_store.latest(to=to, email_type=request.args.get('type') or None)
+    if not email:
+        return jsonify({'success': False, 'error': 'No hay correos para ese destinatario'}), 404
+    return jsonify({'success': True, 'email': project_email(email)})
+
+@app.route('/api/wait')
+def wait_for_code():
+    """
+    Long-poll: espera hasta que llegue un correo nuevo para el destinatario.
+
+    Query params:
+        to: Dirección del destinatario (obligatorio)
+        type: Tipo de correo (opcional)
+        timeout: Segundos máximos de espera (por defecto 30, máximo 120)
+        since: Si ya hay un correo más reciente que este timestamp se devuelve al instante
+
+    Responde con 'email': null y 'timeout': true si no llegó nada a tiempo, y
+    503 si ya hay recipient_waiters.max_waiters esperas (con el servidor por
+    hilos cada espera ocupa un hilo; para muchas esperas usar eventlet/gevent).
+    """
+    to = recipient_param()
+    if not to:
+        return jsonify({'success': False, 'error': 'Falta el parámetro to'}), 400
+    email_type = request.args.get('type') or None
+    try:
+        timeout = min(max(float(request.args.get('timeout', WAIT_DEFAULT_TIMEOUT)), 0), WAIT_MAX_TIMEOUT)
+        since = parse_time_param(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Parámetro inválido: {str(e)}'}), 400
+
+    # Registrar antes de mirar el almacén: un correo que llegue en el medio no se pierde
+    try:
+        waiter = recipient_waiters.register(to, email_type)
+    except OverflowError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    try:
+        email = None
+        if since is not None:
+            latest = email_store.latest(to=to, email_type=email_type)
+            if latest and (latest.get('timestamp') or 0) > since:
+                email = latest
+        if email is None:
+            email = recipient_waiters.wait(waiter, timeout)
+    finally:
+        recipient_waiters.unregister(to, waiter)
+
+    return jsonify({
+        'success': True,
+        'email': project_email(email) if email else None,
+        'timeout': email is None
+    })
+
+def parse_time_param(value):
+    """Acepta un timestamp (segundos) o una fecha ISO ('2024-05-01', '2024-05-01T10:00')"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/search')
+def search_emails():
+    """
+    Busca en el histórico (más allá de days_back, según archive_retention_days).
+
+    Query params:
+        q: Texto a buscar en asunto, destinatario, remitente y código
+        type, account: Filtros exactos
+        since, until: Rango de fechas (timestamp o fecha ISO)
+        limit: Resultados por página (por defecto 50)
+        cursor: next_cursor de la página anterior
+    """
+    if not email_db:
+        return jsonify({'success': False, 'error': 'La búsqueda requiere la base de datos (database_path)'}), 503
+
+    try:
+        limit = min(max(int(request.args.get('limit', EMAILS_PAGE_SIZE)), 1), EMAILS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+        since = parse_time_param(request.args.get('since'))
+        until = parse_time_param(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Parámetro inválido: {str(e)}'}), 400
+
+    start = time.perf_counter()
+    results, next_cursor = email_db.search(
+        request.args.get('q', ''),
+        email_type=request.args.get('type') or None,
+        account=request.args.get('account') or None,
+        since=since, until=until, limit=limit, before=cursor
+    )
+    for result in results:
+        result['key'] = EmailStore.public_id(result)
+
+    return jsonify({
+        'success': True,
+        'emails': results,
+        'next_cursor': next_cursor,
+        'took_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
 
 @app.route('/api/check', methods=['POST'])
 def check_emails():
-    """Fuerza una verificación manual de correos"""
-    global netflix_emails
-    
-    try:
-        settings = load_settings()
-        days_back = settings.get('days_back', 7)
-        
-        if monitor:
-            netflix_emails = monitor.fetch_all_netflix_emails(days_back=days_back)
-            
-            return jsonify({
-                'success': True,
-                'message': f'Se encontraron {len(netflix_emails)} correos de Netflix',
-                'total': len(netflix_emails),
-                'emails': netflix_emails
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'El monitor no está inicializado'
-            }), 500
-    
-    except Exception as e:
-        logger.error(f"Error al verificar correos: {str(e)}")
+    """
+    Pide una verificación completa y responde de inmediato con el ID del trabajo.
+    Si ya hay una en curso (o terminó hace menos de min_scan_interval) se devuelve
+    ese mismo trabajo. El progreso llega por Socket.IO ('scan_progress').
+    """
+    if not monitor:
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': 'El monitor no está inicializado'
         }), 500
 
+    job, started = scans.request('manual')
+    return jsonify({
+        'success': True,
+        'message': 'Verificación iniciada' if started else 'Se reutiliza la verificación en curso o reciente',
+        'coalesced': not started,
+        'job': job.to_dict()
+    }), 202
+
+@app.route('/api/check/<job_id>')
+def get_check_job(job_id):
+    """Estado de una verificación; ?wait=segundos espera a que termine"""
+    job = scans.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Verificación no encontrada'}), 404
+    try:
+        timeout = min(max(float(request.args.get('wait', 0)), 0), SCAN_WAIT_MAX_TIMEOUT)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Parámetro inválido: wait'}), 400
+    if timeout and not job.finished:
+        scans.wait(job, timeout)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 @app.route('/api/start', methods=['POST'])
 def start_monitoring():
     """Inicia el monitoreo automático"""
@@ -332,8 +896,9 @@ def start_monitoring():
                 'error': 'No hay cuentas configuradas'
             }), 400
         
-        # Inicializar monitor de Gmail
-        monitor = GmailMonitor(accounts)
+        # Inicializar monitor de Gmail (con los cursores guardados si hay base de datos)
+        open_database()
+        monitor = create_monitor(accounts)
         
         # Iniciar thread de monitoreo
         monitoring_active = True
@@ -377,48 +942,97 @@ def stop_monitoring():
 
 @app.route('/api/stats')
 def get_stats():
-    """Obtiene estadísticas de los correos"""
-    stats = {
-        'total': len(netflix_emails),
-        'by_type': {},
-        'by_account': {},
-        'monitoring_active': monitoring_active
-    }
-    
-    for email in netflix_emails:
-        # Contar por tipo
-        email_type = email.get('type', 'unknown')
-        stats['by_type'][email_type] = stats['by_type'].get(email_type, 0) + 1
-        
-        # Contar por cuenta
-        account = email.get('account', 'unknown')
-        stats['by_account'][account] = stats['by_account'].get(account, 0) + 1
-    
+    """Obtiene estadísticas de los correos (totales y tasas de la última hora / 24h)"""
     return jsonify({
         'success': True,
-        'stats': stats
+        'stats': current_stats()
     })
 
 @socketio.on('connect')
 def handle_connect():
     """Maneja nuevas conexiones WebSocket"""
     logger.info(f"Cliente conectado")
+    join_room(ALL_ROOM)
     emit('connected', {
         'message': 'Conectado al servidor',
         'monitoring_active': monitoring_active,
-        'total_emails': len(netflix_emails)
+        'total_emails': len(email_store),
+        'epoch': email_store.epoch,
+        'seq': email_store.version
     })
 
+def apply_subscription(subscription):
+    """Mueve al cliente actual a los rooms de su suscripción (o a 'all' si está vacía)"""
+    previous = client_subscriptions.pop(request.sid, None)
+    for room in previous.rooms if previous else [ALL_ROOM]:
+        leave_room(room)
+    if subscription:
+        client_subscriptions[request.sid] = subscription
+    for room in subscription.rooms or [ALL_ROOM]:
+        join_room(room)
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """
+    Suscribe al cliente a cuentas, destinatarios y/o tipos:
+    {"accounts": [...], "to": [...], "types": [...]}. Reemplaza la suscripción anterior.
+    """
+    try:
+        subscription = Subscription.parse(data)
+    except ValueError as e:
+        emit('subscription_error', {'error': str(e)})
+        return
+    apply_subscription(subscription)
+    emit('subscribed', subscription.to_dict())
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe():
+    """Vuelve a recibir todos los cambios"""
+    apply_subscription(Subscription())
+    emit('subscribed', Subscription().to_dict())
+
+@socketio.on('resume')
+def handle_resume(data):
+    """
+    Un cliente reconectado pide los cambios posteriores a su última secuencia.
+    Si el hueco ya no está en el buffer (o el servidor se reinició) debe recargar.
+    Puede traer su suscripción ('subscription') para volver a sus rooms.
+    """
+    data = data or {}
+    try:
+        last_seq = int(data.get('last_seq', 0))
+    except (TypeError, ValueError):
+        last_seq = 0
+
+    if 'subscription' in data:
+        try:
+            apply_subscription(Subscription.parse(data['subscription']))
+        except ValueError as e:
+            emit('subscription_error', {'error': str(e)})
+            return
+    subscription = client_subscriptions.get(request.sid)
+
+    changes = email_store.changes_since(last_seq, epoch=data.get('epoch'))
+    if changes is None:
+        emit('resync_required', {'epoch': email_store.epoch, 'seq': email_store.version})
+        return
+    # Siempre se responde (aunque no haya cambios para la suscripción) para que el cliente avance
+    to_seq = changes[-1][0] if changes else last_seq
+    if subscription:
+        changes = subscription.filter_changes(changes)
+    emit('email_deltas', delta_payload(changes, last_seq, to_seq))
+
 @socketio.on('disconnect')
 def handle_disconnect():
     """Maneja desconexiones WebSocket"""
+    client_subscriptions.pop(request.sid, None)
     logger.info("Cliente desconectado")
 
 @socketio.on('request_update')
 def handle_request_update():
     """Maneja solicitudes de actualización desde el cliente"""
     emit('emails_updated', {
-        'total': len(netflix_emails),
+        'total': len(email_store),
         'timestamp': datetime.now().isoformat()
     })
 
@@ -432,12 +1046,21 @@ if __name__ == '__main__':
     logger.info(f"Cuentas configuradas: {len(accounts_config)}")
     logger.info(f"Configuración: {settings}")
     
+    # Los correos cargados desde disco ya vencidos se guardan sin su HTML
+    apply_expiry_settings(settings)
+    apply_scan_settings(settings)
+
+    # Servir desde disco de inmediato; la verificación inicial sólo trae lo nuevo
+    try:
+        open_database()
+    except Exception as e:
+        logger.error(f"No se pudo abrir la base de datos, se sigue sin persistencia: {str(e)}")
+
     # Auto-iniciar monitor si hay cuentas
     if accounts_config:
         try:
-            from gmail_service import GmailMonitor
             # Inicializar monitor global
-            monitor = GmailMonitor(accounts_config)
+            monitor = create_monitor(accounts_config)
             
             # Iniciar monitoreo automático
             monitoring_active = True
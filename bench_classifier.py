@@ -0,0 +1,87 @@
+"""
+Micro-benchmark del clasificador: bucle de re.search por patrón (implementación
+anterior) vs. NetflixClassifier precompilado, sobre un corpus en español e inglés.
+Verifica además que ambas clasificaciones sean idénticas, también en los casos
+límite en que un patrón empieza en el asunto y termina en el cuerpo.
+
+Uso:
+    python bench_classifier.py --size 400 --repeat 5
+"""
+import argparse
+import re
+import sys
+import time
+
+from bench_corpus import netflix_corpus
+from netflix_parser import CLASSIFIER, NETFLIX_PATTERNS
+
+# Patrones partidos entre asunto y cuerpo: la implementación anterior buscaba en 'asunto cuerpo'
+BOUNDARY_CASES = [
+    ("Actualizar", "tu hogar ahora", 'actualizacion_hogar'),
+    ("Household", "update", 'actualizacion_hogar'),
+    ("código", "de inicio", 'codigo_inicio'),
+]
+
+
+def legacy_classify(subject: str, body: str):
+    """Implementación anterior de IMAPService._classify_email"""
+    text_to_search = (subject + " " + body).lower()
+    for email_type, patterns in NETFLIX_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, text_to_search, re.IGNORECASE):
+                return email_type
+    return None
+
+
+def timed(fn, corpus, repeat: int):
+    """Mejor tiempo de `repeat` pasadas sobre todo el corpus"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn(subject, body) for subject, body, _ in corpus]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=400, help='Correos en el corpus')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones (se toma la mejor)')
+    args = parser.parse_args()
+
+    corpus = netflix_corpus(args.size)
+    # También sin asunto útil, para forzar la búsqueda en el cuerpo
+    corpus += [('Netflix', body, expected) for _, body, expected in corpus]
+    corpus += BOUNDARY_CASES
+
+    legacy_time, legacy_results = timed(legacy_classify, corpus, args.repeat)
+    new_time, new_results = timed(CLASSIFIER.classify, corpus, args.repeat)
+
+    mismatches = [(i, a, b) for i, (a, b) in enumerate(zip(legacy_results, new_results)) if a != b]
+    boundary = [(subject, body, expected, CLASSIFIER.classify(subject, body))
+                for subject, body, expected in BOUNDARY_CASES]
+
+    print("=" * 70)
+    print(f"📊 Clasificador — {len(corpus)} correos, mejor de {args.repeat}")
+    print("=" * 70)
+    print(f"   re.search por patrón     {legacy_time * 1000:8.1f} ms  ({legacy_time / len(corpus) * 1e6:6.1f} µs/correo)")
+    print(f"   NetflixClassifier        {new_time * 1000:8.1f} ms  ({new_time / len(corpus) * 1e6:6.1f} µs/correo)")
+    print(f"   → {legacy_time / new_time:.1f}x más rápido")
+    print(f"   Clasificaciones distintas a la implementación anterior: {len(mismatches)}")
+
+    failed = False
+    for subject, body, expected, result in boundary:
+        if result != expected:
+            print(f"   ❌ Caso límite ({subject!r}, {body!r}): esperado={expected} nuevo={result}")
+            failed = True
+    if mismatches:
+        for i, a, b in mismatches[:10]:
+            print(f"   ❌ #{i}: anterior={a} nuevo={b} asunto={corpus[i][0]!r}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"\n✅ Misma clasificación que la implementación anterior, con {len(BOUNDARY_CASES)} casos límite")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Corpus sintético de correos de Netflix (español e inglés) para los benchmarks.
+
+Imita la estructura real: HTML con tablas anidadas y estilos inline, logo,
+botón rojo de acción, código en una celda propia y pie con links de ayuda,
+privacidad y baja. Incluye correos de publicidad que no deben clasificarse.
+"""
+import random
+
+FOOTER_LINKS = [
+    ('https://help.netflix.com/legal/termsofuse', {'es': 'Términos de uso', 'en': 'Terms of Use'}),
+    ('https://help.netflix.com/legal/privacy', {'es': 'Privacidad', 'en': 'Privacy'}),
+    ('https://www.netflix.com/unsubscribe?t=abc', {'es': 'Cancelar suscripción', 'en': 'Unsubscribe'}),
+    ('https://help.netflix.com/contactus', {'es': 'Centro de ayuda', 'en': 'Help Center'}),
+]
+
+TEMPLATES = {
+    'codigo_inicio': {
+        'es': ('Netflix: Tu código de inicio de sesión',
+               'Ingresa este código para iniciar sesión', '{code}', None),
+        'en': ('Netflix: Your sign-in code',
+               'Enter this code to sign in', '{code}', None),
+    },
+    'codigo_temporal': {
+        'es': ('Tu código de acceso temporal de Netflix',
+               'Solicitaste un código de acceso temporal desde un dispositivo.',
+               None, ('Obtener código', 'https://www.netflix.com/account/travel/verify?nftoken={token}')),
+        'en': ('Your Netflix temporary access code',
+               'You requested a temporary access code from a device.',
+               None, ('Get Code', 'https://www.netflix.com/account/travel/verify?nftoken={token}')),
+    },
+    'actualizacion_hogar': {
+        'es': ('Importante: Cómo actualizar tu Hogar con Netflix',
+               '¿Solicitaste actualizar tu Hogar con Netflix?',
+               None, ('Sí, la envié yo', 'https://www.netflix.com/account/update-primary-location?nftoken={token}')),
+        'en': ('Important: How to update your Netflix Household',
+               'Did you request to update your Netflix Household?',
+               None, ('Yes, This Was Me', 'https://www.netflix.com/account/update-primary-location?nftoken={token}')),
+    },
+    None: {
+        'es': ('Nuevo en Netflix: estrenos de la semana',
+               'Estos son los estrenos que te esperan esta semana.',
+               None, ('Ver ahora', 'https://www.netflix.com/title/{code}')),
+        'en': ('New on Netflix: this week\'s releases',
+               'Here are the new releases waiting for you this week.',
+               None, ('Watch now', 'https://www.netflix.com/title/{code}')),
+    },
+}
+
+
+def _cell(content: str, style: str = 'padding:0 40px;font-family:Netflix Sans,Helvetica,Arial') -> str:
+    return f'<tr><td align="left" style="{style}">{content}</td></tr>'
+
+
+def build_email(email_type, lang: str, rng: random.Random):
+    """Devuelve (asunto, html, tipo esperado) de un correo sintético"""
+    subject, intro, code_tpl, button = TEMPLATES[email_type][lang]
+    code = str(rng.randint(1000, 9999))
+    token = ''.join(rng.choice('abcdef0123456789') for _ in range(40))
+
+    rows = [
+        _cell('<a href="https://www.netflix.com/browse"><img src="https://assets.nflxext.com/logo.png" '
+              'alt="Netflix" width="24" height="44"></a>', 'padding:20px 40px'),
+        _cell(f'<h1 style="font-size:28px;margin:0">{intro}</h1>'),
+    ]
+    if code_tpl:
+        rows.append(_cell(f'<div style="font-size:28px;letter-spacing:6px">{code_tpl.format(code=code)}</div>'))
+    if button:
+        label, href = button
+        rows.append(_cell(
+            '<table cellpadding="0" cellspacing="0"><tr><td style="background-color:#e50914;border-radius:4px">'
+            f'<a href="{href.format(token=token, code=code)}" style="color:#fff;text-decoration:none;'
+            f'display:block;padding:14px 24px">{label}</a></td></tr></table>'
+        ))
+    # Relleno típico: varios párrafos y tablas de espaciado
+    for _ in range(rng.randint(8, 20)):
+        rows.append(_cell('<p style="font-size:14px;color:#221f1f">Netflix &middot; '
+                          + ' '.join(rng.choice(['cuenta', 'account', 'perfil', 'profile', 'dispositivo',
+                                                 'device', 'seguridad', 'security']) for _ in range(25))
+                          + '</p>'))
+        rows.append('<tr><td height="20" style="font-size:0;line-height:0">&nbsp;</td></tr>')
+    footer = ' | '.join(f'<a href="{href}" style="color:#a9a6a6">{text[lang]}</a>' for href, text in FOOTER_LINKS)
+    rows.append(_cell(f'<p style="font-size:11px;color:#a9a6a6">{footer}</p>'))
+
+    html = ('<!DOCTYPE html><html><head><meta charset="utf-8"><style>'
+            + 'td{font-family:Helvetica,Arial,sans-serif}' * 20
+            + '</style></head><body style="margin:0;background:#f2f2f2">'
+            '<table width="100%" cellpadding="0" cellspacing="0"><tr><td align="center">'
+            '<table width="500" cellpadding="0" cellspacing="0" style="background:#fff">'
+            + ''.join(rows)
+            + '</table></td></tr></table></body></html>')
+    return subject, html, email_type
+
+
+def netflix_corpus(size: int = 400, seed: int = 7):
+    """Lista de (asunto, html, tipo esperado) mezclando tipos e idiomas"""
+    rng = random.Random(seed)
+    types = list(TEMPLATES)
+    return [build_email(types[i % len(types)], 'es' if (i // len(types)) % 2 == 0 else 'en', rng)
+            for i in range(size)]
@@ -0,0 +1,128 @@
+"""
+Deduplicación de correos reenviados a varias cuentas.
+
+Todas las cuentas apuntan al mismo buzón del servidor IMAP falso, como cuando
+los buzones de perfil se reenvían a varias cuentas monitoreadas. Sin
+deduplicación cada cuenta descarga, parsea y clasifica cada correo y el panel
+muestra una tarjeta por cuenta; con MessageDedupe la primera cuenta que reclama
+el Message-ID lo procesa y las demás sólo se agregan al correo existente.
+Verifica que quede una tarjeta por código y que cada una liste todas las cuentas,
+también en el flujo real de la verificación completa: StoreSink agrega cada
+correo apenas se parsea y las copias se aplican en cada tanda, a mitad de la
+verificación, cuando muchos originales todavía no llegaron al almacén.
+
+Uso:
+    python bench_dedupe.py --accounts 4 --messages 150 --latency 0.01
+"""
+import argparse
+import logging
+import sys
+import time
+
+from bench_fetch import load_mailbox
+from bench_startup import LocalGmailMonitor
+from email_store import EmailStore
+from fake_imap_server import FakeIMAPServer
+from ingest import StoreSink
+
+
+class CountingMonitor(LocalGmailMonitor):
+    """Cuenta los mensajes parseados; con dedupe=False las cuentas no comparten MessageDedupe"""
+
+    def __init__(self, port: int, accounts, dedupe: bool, **kwargs):
+        super().__init__(port, accounts, **kwargs)
+        self.use_dedupe = dedupe
+        self.parsed = 0
+
+    def _create_service(self, email_address: str, password: str):
+        service = super()._create_service(email_address, password)
+        service.dedupe = self.dedupe if self.use_dedupe else None
+        submit = service._submit_parse
+
+        def counting_submit(*args, **kwargs):
+            self.parsed += 1
+            return submit(*args, **kwargs)
+
+        service._submit_parse = counting_submit
+        return service
+
+
+def scan(port: int, accounts, dedupe: bool, streamed: bool = False):
+    monitor = CountingMonitor(port, accounts, dedupe)
+    store = EmailStore()
+    flushes = []
+    begin = time.perf_counter()
+    if streamed:
+        # Como run_full_scan: cada tanda del sink aplica las copias ya anotadas
+        def on_flush(emails):
+            flushes.append(monitor.dedupe.pending())
+            monitor.dedupe.apply(store.attach_account)
+
+        sink = StoreSink(store, on_flush=on_flush, interval=0)
+        found = monitor.fetch_all_netflix_emails(on_email=sink)
+        sink.flush()
+    else:
+        found = monitor.fetch_all_netflix_emails()
+    store.merge_scan(found, monitor.last_resynced)
+    monitor.dedupe.apply(store.attach_account)
+    elapsed = time.perf_counter() - begin
+    monitor.pool.close_all()
+    return elapsed, monitor.parsed, store, monitor.dedupe.pending(), flushes
+
+
+def check(label: str, store: EmailStore, codes, expected_accounts):
+    """Una tarjeta por código y cada una con todas las cuentas; devuelve el error o None"""
+    if len(store) != len(codes) or {email['code'] for email in store.snapshot()} != codes:
+        return f"{label}: se esperaban {len(codes)} tarjetas, una por código; hay {len(store)}"
+    incomplete = [email for email in store.snapshot()
+                  if sorted(EmailStore.accounts_of(email)) != expected_accounts]
+    if incomplete:
+        return f"{label}: {len(incomplete)} tarjetas no listan todas las cuentas donde llegó el correo"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=4, help='Cuentas que reciben los mismos correos')
+    parser.add_argument('--messages', type=int, default=150, help='Correos en el buzón')
+    parser.add_argument('--latency', type=float, default=0.01, help='Round trip simulado (segundos)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    imap = FakeIMAPServer(latency=args.latency).start()
+    load_mailbox(imap, args.messages)
+    accounts = [{'email': f'cuenta{i}@gmail.com', 'password': 'bench'} for i in range(args.accounts)]
+
+    print("=" * 82)
+    print(f"📬 Correos reenviados — {args.accounts} cuentas × {args.messages} correos, "
+          f"RTT {args.latency * 1000:.0f} ms")
+    print("=" * 82)
+    results = {}
+    for dedupe, label in ((False, 'Antes  (por cuenta)'), (True, 'Ahora  (MessageDedupe)')):
+        elapsed, parsed, store, _, _ = scan(imap.port, accounts, dedupe)
+        results[dedupe] = (elapsed, parsed, store)
+        print(f"   {label:<24} {elapsed * 1000:8.1f} ms   {parsed:5d} mensajes parseados   "
+              f"{len(store):5d} tarjetas")
+    elapsed, parsed, streamed, pending, flushes = scan(imap.port, accounts, True, streamed=True)
+    print(f"   {'Ahora  (StoreSink)':<24} {elapsed * 1000:8.1f} ms   {parsed:5d} mensajes parseados   "
+          f"{len(streamed):5d} tarjetas   ({len(flushes)} tandas, hasta {max(flushes, default=0)} copias en cola)")
+
+    before, after = results[False], results[True]
+    print(f"\n   Parseo: {before[1] / max(after[1], 1):.1f}x menos mensajes; "
+          f"verificación {before[0] / max(after[0], 1e-9):.1f}x más rápida")
+
+    codes = {email['code'] for email in before[2].snapshot()}
+    expected_accounts = [account['email'] for account in accounts]
+    errors = [error for error in (check('Al final', after[2], codes, expected_accounts),
+                                  check('En streaming', streamed, codes, expected_accounts)) if error]
+    if pending:
+        errors.append(f"En streaming: {pending} copias quedaron en cola sin agregarse")
+    if errors:
+        for error in errors:
+            print(f"\n❌ {error}")
+        sys.exit(1)
+    print("\n✅ Una tarjeta por código, con todas las cuentas donde llegó (también aplicando a mitad de la verificación)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark y verificación de paridad del extractor de códigos/links: BeautifulSoup
+(implementación anterior) vs. el recorrido único con HTMLParser de netflix_parser.
+
+Compara el resultado de ambos sobre el corpus sintético (cada correo con los tres
+tipos) y sobre casos borde de HTML mal formado. Sale con código 1 si difieren.
+
+Uso:
+    python bench_extractor.py --size 200 --repeat 3
+"""
+import argparse
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from bench_corpus import netflix_corpus
+from netflix_parser import (
+    extract_code_or_link, scan_html, SIGNIN_CODE_PATTERNS, SIGNIN_CONTEXT_RE,
+    ISOLATED_CODE_RE, LINK_URL_PATTERNS
+)
+
+TYPES = ['codigo_inicio', 'codigo_temporal', 'actualizacion_hogar']
+
+EDGE_CASES = [
+    '',
+    'Tu código de inicio de sesión es 4821',
+    '<p>Ingresa este <b>código</b> para <i>iniciar sesión</i>:</p><div>  </div><td>1234</td>',
+    '<p>sign-in</p><!-- 9999 --><script>var c = 5555;</script><style>.x{}</style><p>7777</p>',
+    '<p>login</p><template>1111</template><noscript>2222</noscript><title>3333</title>',
+    '<pre>  code  </pre> <textarea>\n\n</textarea>\n \n<p>sign in 8080</p>',
+    '<p>sign-in <![CDATA[ 4242 ]]> &copy &foo; &#150; &#x41; &#0; &nbsp;&amp;</p>',
+    '<a href="https://www.netflix.com/a">Sí, la <b>envié</b> yo</a>',
+    '<td><a href="https://www.netflix.com/x">Ver</td> Actualizar</a>'
+    '<a href="https://www.netflix.com/household/y">Otro</a>',
+    '<a href="https://www.netflix.com/o">fuera <a href="https://www.netflix.com/i">Get code</a></a>',
+    '<a href="https://help.netflix.com/update">Update</a><a href="https://www.netflix.com/nmv/1">x</a>',
+    '<a href=https://www.netflix.com/z/>confirmar</a>',
+    '<a href>update</a><a href="https://www.netflix.com/1" href="https://www.netflix.com/2">v</a>',
+    '<a href="https://www.netflix.com/s"><style>update</style>Ver</a>',
+    '<a href="https://www.netflix.com/terms">verify</a><a href="https://netflix.com/access/9">Ir</a>',
+    '<a href="https://www.netflix.com/unsubscribe">b</a><a href="https://www.netflix.com/browse">c</a>',
+    '<a href="https://example.com/verify">verify</a>',
+    '<div><a href="https://www.netflix.com/br">Confir<br>mar</a></div></a></div>',
+    '<!DOCTYPE html><?php echo 1 ?><p>sign in</p><p>code 123456</p>',
+    '<html><body><a href="https://www.netflix.com/update-primary-location?t=1">Sí, la envié yo',
+]
+
+
+def legacy_extract(body: str, email_type: str) -> str:
+    """Implementación anterior de IMAPService._extract_code_or_link (BeautifulSoup)"""
+    if not body:
+        return ""
+
+    soup = BeautifulSoup(body, 'html.parser')
+
+    if email_type == 'codigo_inicio':
+        text_content = soup.get_text(separator=' ')
+        for pattern in SIGNIN_CODE_PATTERNS:
+            match = pattern.search(text_content)
+            if match:
+                return match.group(1)
+        if SIGNIN_CONTEXT_RE.search(text_content):
+            match = ISOLATED_CODE_RE.search(text_content)
+            if match:
+                return match.group(1)
+
+    all_links = soup.find_all('a', href=True)
+    primary_link = None
+    button_keywords = [
+        'sí, la envié yo', 'si, la envie yo', 'obtener código', 'obtener codigo',
+        'get code', 'verify', 'update', 'actualizar', 'confirmar', 'yes, this was me'
+    ]
+    for link in all_links:
+        link_text = link.get_text().lower().strip()
+        link_href = link['href']
+        if 'netflix.com' not in link_href:
+            continue
+        if any(word in link_href.lower() for word in ['help', 'privacy', 'unsubscribe', 'terms', 'contact']):
+            continue
+        if any(keyword in link_text for keyword in button_keywords):
+            primary_link = link_href
+            break
+
+    url_pattern = LINK_URL_PATTERNS.get(email_type)
+    if not primary_link and url_pattern:
+        for link in all_links:
+            link_href = link['href']
+            if 'netflix.com' in link_href and url_pattern.search(link_href):
+                primary_link = link_href
+                break
+
+    if not primary_link:
+        for link in all_links:
+            link_href = link['href']
+            if 'netflix.com' in link_href and not any(word in link_href.lower() for word in ['help', 'privacy', 'unsubscribe']):
+                primary_link = link_href
+                break
+
+    return primary_link if primary_link else ""
+
+
+def check_parity(cases):
+    """Lista de diferencias (caso, tipo, anterior, nuevo) entre ambos extractores"""
+    mismatches = []
+    for body in cases:
+        for email_type in TYPES:
+            expected = legacy_extract(body, email_type)
+            actual = extract_code_or_link(body, email_type)
+            if expected != actual:
+                mismatches.append((body, email_type, expected, actual))
+        # El texto visible también debe coincidir (es lo que ven los patrones de código)
+        if body:
+            expected_text = BeautifulSoup(body, 'html.parser').get_text(separator=' ')
+            if expected_text != scan_html(body).text():
+                mismatches.append((body, 'get_text', expected_text, scan_html(body).text()))
+    return mismatches
+
+
+def timed(fn, corpus, repeat: int):
+    """Mejor tiempo de `repeat` pasadas extrayendo los tres tipos de cada correo"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, body, _ in corpus:
+            for email_type in TYPES:
+                fn(body, email_type)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=200, help='Correos en el corpus')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    args = parser.parse_args()
+
+    corpus = netflix_corpus(args.size)
+    mismatches = check_parity([body for _, body, _ in corpus] + EDGE_CASES)
+
+    legacy_time = timed(legacy_extract, corpus, args.repeat)
+    new_time = timed(extract_code_or_link, corpus, args.repeat)
+    calls = len(corpus) * len(TYPES)
+
+    print("=" * 70)
+    print(f"📊 Extractor — {len(corpus)} correos × {len(TYPES)} tipos + {len(EDGE_CASES)} casos borde, mejor de {args.repeat}")
+    print("=" * 70)
+    print(f"   BeautifulSoup            {legacy_time * 1000:8.1f} ms  ({legacy_time / calls * 1e6:7.1f} µs/correo)")
+    print(f"   HTMLScan (una pasada)    {new_time * 1000:8.1f} ms  ({new_time / calls * 1e6:7.1f} µs/correo)")
+    print(f"   → {legacy_time / new_time:.1f}x más rápido")
+    print(f"   Resultados distintos a la implementación anterior: {len(mismatches)}")
+
+    if mismatches:
+        for body, email_type, expected, actual in mismatches[:10]:
+            print(f"   ❌ {email_type}: anterior={expected!r} nuevo={actual!r} html={body[:80]!r}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de descarga: un FETCH por mensaje (comportamiento anterior) vs.
+FETCH por lotes en pipeline, contra un servidor IMAP falso local con latencia simulada.
+
+Uso:
+    python bench_fetch.py --messages 200 --latency 0.02
+"""
+import argparse
+import imaplib
+import logging
+import time
+
+from fake_imap_server import FakeIMAPServer, make_message
+from gmail_service import IMAPService
+
+
+class LocalIMAPService(IMAPService):
+    """IMAPService apuntando al servidor falso (IMAP sin TLS en 127.0.0.1)"""
+
+    def __init__(self, port: int, **kwargs):
+        super().__init__(email_address='bench@example.com', password='bench', **kwargs)
+        self.port = port
+
+    def connect(self):
+        self.mail = imaplib.IMAP4('127.0.0.1', self.port)
+        self.mail.login(self.email_address, self.password)
+        self._enable_condstore()
+        return True
+
+
+def load_mailbox(server: FakeIMAPServer, count: int):
+    """Carga el buzón: 2 de cada 3 correos son códigos, el resto publicidad con HTML pesado"""
+    filler = '<tr><td style="padding:0 40px">Descubre lo nuevo en Netflix este mes.</td></tr>' * 150
+    for i in range(count):
+        if i % 3 == 2:
+            body = f'<html><body><table>{filler}</table></body></html>'
+            server.mailbox.append(make_message('Novedades en Netflix', body))
+        else:
+            body = (f'<html><body><table>{filler}<tr><td>Ingresa este código para iniciar sesión</td></tr>'
+                    f'<tr><td>{1000 + i}</td></tr></table></body></html>')
+            server.mailbox.append(make_message('Netflix: Tu código de inicio de sesión', body))
+
+
+def legacy_fetch(service: IMAPService, uids):
+    """Comportamiento anterior: un UID FETCH (RFC822) por cada mensaje encontrado"""
+    results = []
+    for uid in uids:
+        status, msg_data = service.mail.uid('FETCH', uid, '(RFC822)')
+        for part in msg_data:
+            if isinstance(part, tuple):
+                parsed = service._parse_message(uid, part[1])
+                if parsed:
+                    results.append(parsed)
+    return results
+
+
+def measure(server: FakeIMAPServer, label: str, fn):
+    """Ejecuta fn(service, uids) y mide tiempo, comandos y bytes recibidos"""
+    service = LocalIMAPService(server.port)
+    service.connect()
+    service.select_inbox()
+    uids = service._uid_search('ALL')
+
+    commands, sent = server.commands, server.bytes_sent
+    start = time.perf_counter()
+    results = fn(service, uids)
+    elapsed = time.perf_counter() - start
+    commands, sent = server.commands - commands, server.bytes_sent - sent
+
+    service.disconnect()
+    print(f"   {label:<28} {elapsed * 1000:9.1f} ms  {commands:5d} comandos  "
+          f"{sent / 1024:9.1f} KiB  {len(results):4d} códigos")
+    return elapsed, commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200, help='Correos en el buzón')
+    parser.add_argument('--latency', type=float, default=0.02, help='Round trip simulado (segundos)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    server = FakeIMAPServer(latency=args.latency).start()
+    load_mailbox(server, args.messages)
+
+    print("=" * 78)
+    print(f"📊 FETCH por mensaje vs. por lotes — {args.messages} correos, RTT {args.latency * 1000:.0f} ms")
+    print("=" * 78)
+
+    base_time, base_cmds = measure(server, 'Un FETCH por mensaje', legacy_fetch)
+    for batch in (10, 50, 200):
+        def batched(service, uids, batch=batch):
+            service.fetch_batch_size = batch
+            return service._fetch_and_classify(uids)
+        elapsed, cmds = measure(server, f'Lotes de {batch} en pipeline', batched)
+        print(f"      → {base_time / elapsed:5.1f}x más rápido, {base_cmds / max(cmds, 1):5.1f}x menos comandos")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
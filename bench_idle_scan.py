@@ -0,0 +1,142 @@
+"""
+Detección por IDLE mientras corre una verificación completa.
+
+Arranca el loop de monitoreo real de app.py contra el servidor IMAP falso con
+latencia simulada. La carga inicial (verificación completa de todas las
+cuentas) corre en su propio hilo; a mitad de ella llega un código nuevo y se
+mide cuánto tarda en aparecer en el almacén. Con la verificación dentro del
+loop de IDLE el código recién se veía al terminar la verificación. Muestra
+también la cobertura de escucha IDLE por cuenta.
+
+Después verifica que un correo que llega mientras la cuenta atiende otra
+notificación (fuera de IDLE) se descargue enseguida: el servidor lo anuncia
+antes del "+ idling" y el aviso no se repite, así que antes quedaba sin ver
+hasta la renovación de IDLE (20 minutos).
+
+Uso:
+    python bench_idle_scan.py --accounts 3 --messages 300 --latency 0.02
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+
+import app as server
+from bench_fetch import LocalIMAPService, load_mailbox
+from bench_startup import LocalGmailMonitor
+from fake_imap_server import FakeIMAPServer, make_message
+from idle_multiplexer import IdleMultiplexer
+
+
+def wait_until(condition, timeout: float, step: float = 0.01) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(step)
+    return False
+
+
+def has_code(code: str) -> bool:
+    return any(email.get('code') == code for email in server.email_store.snapshot())
+
+
+def arrival_while_busy(imap: FakeIMAPServer, wait: float = 5.0):
+    """Segundos hasta ver un correo que llega entre fetch_idle_updates y resume (None si no se vio)"""
+    service = LocalIMAPService(imap.port)
+    service.connect()
+    service.prepare_idle()
+    mux = IdleMultiplexer()
+    mux.add(service)
+
+    imap.mailbox.append(make_message('Netflix: Tu código de inicio de sesión',
+                                     '<p>Ingresa este código para iniciar sesión</p><p>66101</p>'))
+    ready, _ = mux.poll(timeout=wait)
+    found = [email['code'] for _, lines in ready for email in service.fetch_idle_updates(lines)]
+    # Llega otro mientras la cuenta está fuera de IDLE
+    imap.mailbox.append(make_message('Netflix: Tu código de inicio de sesión',
+                                     '<p>Ingresa este código para iniciar sesión</p><p>66102</p>'))
+    mux.resume(service.email_address)
+
+    begin = time.time()
+    seen = None
+    while seen is None and time.time() - begin < wait:
+        ready, _ = mux.poll(timeout=wait - (time.time() - begin))
+        for address, lines in ready:
+            if '66102' in [email['code'] for email in service.fetch_idle_updates(lines)]:
+                seen = time.time() - begin
+            mux.resume(address)
+    mux.close()
+    return found, seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=3, help='Cuentas monitoreadas')
+    parser.add_argument('--messages', type=int, default=300, help='Correos en el buzón')
+    parser.add_argument('--latency', type=float, default=0.02, help='Round trip simulado (segundos)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    imap = FakeIMAPServer(latency=args.latency).start()
+    load_mailbox(imap, args.messages)
+    accounts = [{'email': f'cuenta{i}@example.com', 'password': 'bench'} for i in range(args.accounts)]
+
+    # El loop real, con las cuentas apuntando al servidor falso y sin persistencia
+    server.load_accounts = lambda: accounts
+    server.email_db = None
+    server.socketio.emit = lambda *a, **k: None
+    server.monitor = LocalGmailMonitor(imap.port, accounts, fetch_batch_size=10)
+    server.monitoring_active = True
+    threading.Thread(target=server.monitoring_loop, daemon=True).start()
+
+    print("=" * 78)
+    print(f"📡 IDLE durante la verificación completa — {args.accounts} cuentas × {args.messages} correos, "
+          f"RTT {args.latency * 1000:.0f} ms")
+    print("=" * 78)
+
+    # Esperar a que la carga inicial esté en curso y las cuentas escuchando IDLE
+    started = wait_until(lambda: server.scans.current is not None and server.idle_mux is not None
+                         and len(server.idle_mux) == args.accounts, timeout=60)
+    job = server.scans.current
+    if not started or job is None:
+        print("❌ La carga inicial no arrancó o IDLE no se abrió")
+        sys.exit(1)
+
+    sent = time.time()
+    imap.mailbox.append(make_message('Netflix: Tu código de inicio de sesión',
+                                     '<p>Ingresa este código para iniciar sesión</p><p>77123</p>'))
+    detected = wait_until(lambda: has_code('77123'), timeout=120)
+    detection = time.time() - sent
+    server.scans.wait(job, timeout=600)
+    scan_total = job.finished_at - job.started_at
+    scan_left = job.finished_at - sent
+
+    print(f"   Verificación completa            {scan_total:8.2f} s")
+    print(f"   Código detectado por IDLE en     {detection:8.3f} s "
+          f"(antes: al terminar la verificación, {scan_left:.2f} s)")
+    print("\n   Cobertura IDLE por cuenta:")
+    for account, coverage in sorted(server.idle_mux.coverage().items()):
+        print(f"   {account:<26} {coverage['coverage'] * 100:6.1f}%   "
+              f"{coverage['listened_seconds']:7.1f}s de {coverage['tracked_seconds']:7.1f}s")
+
+    server.monitoring_active = False
+    found, seen = arrival_while_busy(imap)
+    print(f"\n   Correo llegado fuera de IDLE visto en "
+          + (f"{seen:8.3f} s" if seen is not None else "— (no se vio en 5 s)"))
+
+    if found != ['66101'] or seen is None:
+        print("\n❌ El correo que llegó mientras se atendía otra notificación quedó sin descargar")
+        sys.exit(1)
+    if not detected or detection >= scan_left:
+        print("\n❌ El código no se detectó antes de que terminara la verificación")
+        sys.exit(1)
+    if not has_code('77123'):
+        print("\n❌ La verificación borró el código que había llegado por IDLE")
+        sys.exit(1)
+    print("\n✅ IDLE siguió escuchando durante la verificación completa y no perdió avisos fuera de IDLE")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Pipeline de ingesta: tiempo hasta el primer código y costo de cada etapa.
+
+Una verificación completa contra el servidor IMAP falso con latencia simulada.
+Antes el panel recibía los correos cuando terminaba la cuenta (la lista entera
+se fusionaba al final); ahora cada correo pasa por StoreSink en cuanto se
+parsea. Después mide cada etapa de ingest por separado, alimentándola con la
+salida ya materializada de la anterior. Verifica que el streaming entregue los
+mismos correos que la lista completa.
+
+Uso:
+    python bench_ingest.py --messages 600 --latency 0.02
+"""
+import argparse
+import logging
+import sys
+import time
+
+import ingest
+from bench_fetch import LocalIMAPService, load_mailbox
+from bench_startup import LocalGmailMonitor
+from email_store import EmailStore
+from fake_imap_server import FakeIMAPServer
+
+
+def full_scan(port: int, accounts, stream: bool):
+    """Devuelve (segundos hasta el primer correo en el almacén, segundos totales, almacén)"""
+    monitor = LocalGmailMonitor(port, accounts)
+    store = EmailStore()
+    first = []
+    begin = time.perf_counter()
+
+    def on_flush(emails):
+        if not first:
+            first.append(time.perf_counter() - begin)
+
+    if stream:
+        sink = ingest.StoreSink(store, on_flush=on_flush)
+        found = monitor.fetch_all_netflix_emails(days_back=7, on_email=sink)
+        sink.flush()
+    else:
+        found = monitor.fetch_all_netflix_emails(days_back=7)
+    store.merge_scan(found, monitor.last_resynced)
+    total = time.perf_counter() - begin
+    monitor.pool.close_all()
+    return (first[0] if first else total), total, store
+
+
+def timed(label: str, stage, count=len):
+    begin = time.perf_counter()
+    output = list(stage)
+    elapsed = time.perf_counter() - begin
+    print(f"   {label:<40} {elapsed * 1000:8.1f} ms   {count(output):5d} salidas")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=600, help='Correos en el buzón')
+    parser.add_argument('--latency', type=float, default=0.02, help='Round trip simulado (segundos)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    imap = FakeIMAPServer(latency=args.latency).start()
+    load_mailbox(imap, args.messages)
+    accounts = [{'email': 'cuenta0@example.com', 'password': 'bench'}]
+
+    print("=" * 78)
+    print(f"🚰 Pipeline de ingesta — {args.messages} correos, RTT {args.latency * 1000:.0f} ms")
+    print("=" * 78)
+    batch_first, batch_total, batch_store = full_scan(imap.port, accounts, stream=False)
+    stream_first, stream_total, stream_store = full_scan(imap.port, accounts, stream=True)
+    print(f"   Antes  (lista al terminar)   primer código en {batch_first * 1000:8.1f} ms   "
+          f"total {batch_total * 1000:8.1f} ms")
+    print(f"   Ahora  (StoreSink)           primer código en {stream_first * 1000:8.1f} ms   "
+          f"total {stream_total * 1000:8.1f} ms")
+    print(f"   → primer código {batch_first / max(stream_first, 1e-9):.1f}x antes")
+
+    print("\n   Etapas por separado:")
+    service = LocalIMAPService(imap.port)
+    service.connect()
+    service.select_inbox()
+    status, data = service.mail.uid('SEARCH', None, 'ALL')
+    uids = data[0].split()
+    previews = timed('fetch_previews (encabezados + inicio)', ingest.fetch_previews(service, uids))
+    candidates = timed('select_candidates (filtro y dedupe)', ingest.select_candidates(service, previews))
+    bodies = timed('fetch_bodies (mensaje completo)', ingest.fetch_bodies(service, candidates))
+    parsed = timed('parse_bodies (clasificado y extraído)', ingest.parse_bodies(service, bodies),
+                   count=lambda items: sum(1 for _, _, fields in items if fields))
+    records = timed('build_records (correo completo)', ingest.build_records(service, parsed))
+    service.disconnect()
+
+    key = lambda store: sorted((email['id'], email['code']) for email in store.snapshot())
+    if key(batch_store) != key(stream_store) or len(records) != len(batch_store):
+        print("\n❌ El streaming no entregó los mismos correos que la lista completa")
+        sys.exit(1)
+    if stream_first >= batch_first:
+        print("\n❌ El primer código no llegó antes que la lista completa")
+        sys.exit(1)
+    print(f"\n✅ Mismos {len(stream_store)} correos, el primero visible antes de terminar la cuenta")
+
+
+if __name__ == '__main__':
+    main()
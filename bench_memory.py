@@ -0,0 +1,109 @@
+"""
+Benchmark de memoria: RSS por cada 10.000 correos guardados.
+
+Antes: un dict de 11 claves por correo con el HTML completo como str (como la
+lista netflix_emails original). Después: EmailStore con EmailRecord (slots,
+textos repetidos compartidos y HTML comprimido con zlib). Cada variante corre
+en un proceso aparte para que una no ensucie la medición de la otra. También
+verifica que el HTML descomprimido sea idéntico al original.
+
+Uso:
+    python bench_memory.py --emails 10000
+"""
+import argparse
+import gc
+import random
+import subprocess
+import sys
+import time
+
+from bench_corpus import build_email, TEMPLATES
+
+
+def rss_kb() -> int:
+    """RSS actual del proceso en KB (Linux: /proc/self/status)"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    raise RuntimeError("No se pudo leer VmRSS")
+
+
+def make_email(i: int, rng: random.Random, start: float):
+    """Correo con la forma que devuelve IMAPService._parse_message"""
+    types = [t for t in TEMPLATES if t]
+    subject, html, email_type = build_email(types[i % len(types)], 'es' if i % 2 else 'en', rng)
+    return {
+        'id': str(i + 1),
+        'subject': subject,
+        'from': 'Netflix <info@account.netflix.com>',
+        'to': f'perfil{i % 300}@example.com',
+        'date': 'Mon, 06 May 2024 10:00:00 +0000',
+        'timestamp': start + i,
+        'type': email_type,
+        'code': str(rng.randint(1000, 9999)),
+        'body_preview': html[:200],
+        'body_full': html,
+        'account': f'cuenta{i % 4}@gmail.com',
+    }
+
+
+def measure(mode: str, count: int):
+    """Corre en el proceso hijo: arma `count` correos y devuelve KB de RSS agregados"""
+    rng = random.Random(19)
+    start = time.time()
+    if mode == 'store':
+        from email_store import EmailStore
+        store = EmailStore()
+    gc.collect()
+    before = rss_kb()
+    if mode == 'dicts':
+        emails = [make_email(i, rng, start) for i in range(count)]
+    else:
+        for i in range(count):
+            store.add(make_email(i, rng, start))
+    gc.collect()
+    grown = rss_kb() - before
+
+    # El HTML descomprimido tiene que ser idéntico al original
+    if mode == 'store':
+        check = random.Random(19)
+        for i in range(count):
+            original = make_email(i, check, start)
+            if i % 97 == 0 and store.get(store.key(original))['body_full'] != original['body_full']:
+                print('MISMATCH')
+                return
+    print(grown)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=10000, help='Correos guardados')
+    parser.add_argument('--mode', choices=['dicts', 'store'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.emails)
+        return
+
+    results = {}
+    for mode in ('dicts', 'store'):
+        output = subprocess.run([sys.executable, __file__, '--mode', mode, '--emails', str(args.emails)],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        if output == 'MISMATCH':
+            print(f"❌ El HTML descomprimido no coincide con el original")
+            sys.exit(1)
+        results[mode] = int(output)
+
+    per_10k = lambda kb: kb / args.emails * 10000 / 1024
+    print("=" * 70)
+    print(f"💾 Memoria (RSS) — {args.emails} correos")
+    print("=" * 70)
+    print(f"   Antes  (dict + HTML str)         {per_10k(results['dicts']):8.1f} MB por 10k correos")
+    print(f"   Ahora  (EmailRecord + zlib)      {per_10k(results['store']):8.1f} MB por 10k correos")
+    print(f"\n   Reducción: {results['dicts'] / max(results['store'], 1):.1f}x")
+    print("\n✅ HTML descomprimido idéntico al original")
+
+
+if __name__ == '__main__':
+    main()
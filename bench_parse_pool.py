@@ -0,0 +1,191 @@
+"""
+Latencia de la API durante una verificación completa: parseo en el hilo vs. pool de procesos.
+
+Una verificación descarga del servidor IMAP falso (en otro proceso) correos de código con
+HTML pesado mientras otro hilo consulta /api/stats de Flask cada pocos milisegundos
+(como el panel). Antes el parseo MIME, la clasificación y la extracción corrían
+en el hilo de la cuenta y le quitaban el GIL a Flask; ahora parse_message corre
+en un pool de procesos. Verifica que ambos modos devuelvan los mismos correos,
+también cuando un worker del pool muere a mitad de la verificación (los correos
+que estaban en el pool se parsean en el hilo y el pool se reemplaza) y cuando se
+detiene el monitoreo a mitad de la verificación (termina en el hilo sin crear otro pool).
+
+Uso:
+    python bench_parse_pool.py --messages 300 --workers 2
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import statistics
+import sys
+import threading
+import time
+
+logging.disable(logging.INFO)
+
+import app as server
+from bench_fetch import LocalIMAPService
+from fake_imap_server import FakeIMAPServer, make_message
+from gmail_service import GmailMonitor
+from message_parser import create_parse_executor
+
+
+def load_heavy_mailbox(imap: FakeIMAPServer, count: int):
+    """Correos de código con mucho HTML (tablas de diseño como las de Netflix)"""
+    filler = ''.join(f'<tr><td class="c{i}" style="padding:0 40px"><a href="https://www.netflix.com/browse/{i}">'
+                     f'Descubre lo nuevo en Netflix</a></td></tr>' for i in range(400))
+    for i in range(count):
+        body = (f'<html><body><table>{filler}<tr><td>Ingresa este código para iniciar sesión</td></tr>'
+                f'<tr><td>{10000 + i}</td></tr></table></body></html>')
+        imap.mailbox.append(make_message('Netflix: Tu código de inicio de sesión', body))
+
+
+def serve(count: int, conn):
+    """Proceso aparte con el servidor IMAP falso: su trabajo no compite por el GIL con la medición"""
+    imap = FakeIMAPServer(latency=0).start()
+    load_heavy_mailbox(imap, count)
+    conn.send(imap.port)
+    conn.recv()
+
+
+def probe(client, stop: threading.Event, latencies, interval: float):
+    """
+    Consulta la API cada `interval` segundos. La latencia se cuenta desde que la
+    consulta debía salir: incluye la espera por el GIL al despertar, que no se
+    vería midiendo sólo dentro del hilo ya despierto.
+    """
+    while not stop.is_set():
+        due = time.perf_counter() + interval
+        time.sleep(interval)
+        client.get('/api/stats')
+        latencies.append(time.perf_counter() - due)
+
+
+def run(port: int, workers: int, interval: float):
+    executor = create_parse_executor(workers)
+    # Los procesos arrancan antes de medir, como en el monitor ya en marcha
+    list(executor.map(abs, range(max(workers, 1))))
+    service = LocalIMAPService(port, parse_executor=executor)
+    service.connect()
+
+    client = server.app.test_client()
+    idle = []
+    stop = threading.Event()
+    thread = threading.Thread(target=probe, args=(client, stop, idle, interval))
+    thread.start()
+    time.sleep(0.5)
+    stop.set()
+    thread.join()
+
+    latencies = []
+    stop = threading.Event()
+    thread = threading.Thread(target=probe, args=(client, stop, latencies, interval))
+    thread.start()
+    begin = time.perf_counter()
+    emails = service.fetch_netflix_emails(days_back=7)
+    elapsed = time.perf_counter() - begin
+    stop.set()
+    thread.join()
+
+    service.disconnect()
+    executor.shutdown()
+    return elapsed, emails, statistics.median(idle), latencies
+
+
+def broken_run(port: int, workers: int, delay: float):
+    """Verificación en la que un worker del pool muere a los `delay` segundos"""
+    executors = [create_parse_executor(workers)]
+    list(executors[0].map(abs, range(workers)))
+
+    def rebuild(broken):
+        broken.shutdown(wait=False, cancel_futures=True)
+        executors.append(create_parse_executor(workers))
+        return executors[-1]
+
+    def kill():
+        time.sleep(delay)
+        os.kill(next(iter(executors[0]._processes)), signal.SIGKILL)
+
+    service = LocalIMAPService(port, parse_executor=executors[0], rebuild_parser=rebuild)
+    service.connect()
+    killer = threading.Thread(target=kill)
+    killer.start()
+    emails = service.fetch_netflix_emails(days_back=7)
+    killer.join()
+    # Otra verificación con la misma conexión: debe usar el pool nuevo
+    service.fetch_netflix_emails(days_back=7)
+    service.disconnect()
+    for executor in executors:
+        executor.shutdown()
+    return emails, len(executors) - 1
+
+
+def stopped_run(port: int, workers: int, delay: float):
+    """Verificación durante la cual se llama shutdown_parser a los `delay` segundos (/api/stop)"""
+    monitor = GmailMonitor([], parse_workers=workers)
+    list(monitor.parse_executor.map(abs, range(workers)))
+
+    def stop():
+        time.sleep(delay)
+        monitor.shutdown_parser()
+
+    service = LocalIMAPService(port, parse_executor=monitor.parse_executor, rebuild_parser=monitor.rebuild_parser)
+    service.connect()
+    stopper = threading.Thread(target=stop)
+    stopper.start()
+    emails = service.fetch_netflix_emails(days_back=7)
+    stopper.join()
+    service.disconnect()
+    # Ningún pool nuevo quedó vivo después de detenerlo
+    return emails, monitor._parse_executor is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=300, help='Correos en el buzón')
+    parser.add_argument('--workers', type=int, default=2, help='Procesos del pool de parseo')
+    parser.add_argument('--interval', type=float, default=0.005, help='Pausa entre consultas a la API (segundos)')
+    args = parser.parse_args()
+
+    parent, child = multiprocessing.Pipe()
+    imap = multiprocessing.Process(target=serve, args=(args.messages, child), daemon=True)
+    imap.start()
+    port = parent.recv()
+    server.email_db = None
+
+    print("=" * 92)
+    print(f"🧵 Latencia de /api/stats durante una verificación — {args.messages} correos con HTML pesado, "
+          f"{os.cpu_count()} núcleos")
+    print("=" * 92)
+    results = {}
+    for workers, label in ((0, 'Antes  (en el hilo)'), (args.workers, f'Ahora  ({args.workers} procesos)')):
+        elapsed, emails, idle, latencies = run(port, workers, args.interval)
+        results[workers] = emails
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        print(f"   {label:<22} verificación {elapsed:6.2f} s   API p50 {statistics.median(latencies) * 1000:7.2f} ms   "
+              f"p99 {p99 * 1000:7.2f} ms   máx {latencies[-1] * 1000:7.2f} ms   (en reposo {idle * 1000:.2f} ms)")
+
+    broken, rebuilt = broken_run(port, max(args.workers, 1), delay=0.2)
+    print(f"   {'Worker muerto a los 0.2 s':<22} {len(broken)} correos, pools reemplazados: {rebuilt}")
+    stopped, closed = stopped_run(port, max(args.workers, 1), delay=0.2)
+    print(f"   {'Detenido a los 0.2 s':<22} {len(stopped)} correos, pool cerrado: {'sí' if closed else 'no'}")
+
+    parent.send('fin')
+    key = lambda email: (email['id'], email['code'], email['type'], email['body_full'])
+    if sorted(map(key, results[0])) != sorted(map(key, results[args.workers])):
+        print("\n❌ El pool de procesos devolvió correos distintos al parseo en el hilo")
+        sys.exit(1)
+    if sorted(map(key, results[0])) != sorted(map(key, broken)) or rebuilt != 1:
+        print("\n❌ Al morir un worker se perdieron correos o el pool no se reemplazó")
+        sys.exit(1)
+    if sorted(map(key, results[0])) != sorted(map(key, stopped)) or not closed:
+        print("\n❌ Al detener el parseo a mitad de camino se perdieron correos o quedó un pool abierto")
+        sys.exit(1)
+    print(f"\n✅ Mismos {len(results[0])} correos con ambos modos, también con un worker muerto o el parseo detenido a mitad de camino")
+
+
+if __name__ == '__main__':
+    main()
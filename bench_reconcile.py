@@ -0,0 +1,151 @@
+"""
+Reconciliación de una verificación completa contra el almacén.
+
+Simula barridos periódicos de cuentas resincronizadas (el buzón entero vuelve en
+cada verificación) con unos pocos cambios entre barrido y barrido: correos
+nuevos, un código corregido, un correo borrado y una cuenta con UIDVALIDITY
+nuevo (todos los UIDs cambian, X-GM-MSGID no). Antes cada barrido reemplazaba
+los correos de la cuenta (todos salían del feed y volvían a entrar como nuevos);
+ahora se reconcilia por clave estable y sólo viajan los cambios. Verifica que
+el almacén termine igual al buzón y que sólo se anuncien los correos nuevos.
+
+Uso:
+    python bench_reconcile.py --accounts 4 --emails 2000 --sweeps 10
+"""
+import argparse
+import random
+import sys
+import time
+
+from email_store import EmailStore
+
+
+def make_email(account: str, uid: int, msgid: int, uidvalidity: int, timestamp: float, code: str):
+    return {
+        'id': str(uid),
+        'subject': 'Netflix: Tu código de inicio de sesión',
+        'from': 'Netflix <info@account.netflix.com>',
+        'to': f'perfil{msgid % 300}@example.com',
+        'date': '',
+        'timestamp': timestamp,
+        'type': 'codigo_inicio',
+        'code': code,
+        'body_preview': 'Ingresa este código para iniciar sesión',
+        'body_full': '<html>' + 'x' * 2000 + '</html>',
+        'account': account,
+        'gm_msgid': str(msgid),
+        'uidvalidity': uidvalidity,
+    }
+
+
+class Mailbox:
+    """Buzón de una cuenta: mensajes por X-GM-MSGID con su UID actual"""
+
+    def __init__(self, account: str, count: int, rng: random.Random, start: float):
+        self.account = account
+        self.rng = rng
+        self.uidvalidity = 1
+        self.next_uid = 1
+        self.next_msgid = hash(account) % 10 ** 6 * 10 ** 6
+        self.messages = {}   # msgid → [uid, timestamp, code]
+        for i in range(count):
+            self.append(start + i)
+
+    def append(self, timestamp: float):
+        self.messages[self.next_msgid] = [self.next_uid, timestamp, str(self.rng.randint(1000, 9999))]
+        self.next_msgid += 1
+        self.next_uid += 1
+
+    def renumber(self):
+        """UIDVALIDITY nuevo: el servidor vuelve a numerar todos los UIDs"""
+        self.uidvalidity += 1
+        self.next_uid = 1
+        for message in self.messages.values():
+            message[0] = self.next_uid
+            self.next_uid += 1
+
+    def scan(self):
+        return [make_email(self.account, uid, msgid, self.uidvalidity, timestamp, code)
+                for msgid, (uid, timestamp, code) in self.messages.items()]
+
+
+def replace_scan(store: EmailStore, found, resynced):
+    """Comportamiento anterior: los correos de las cuentas resincronizadas se reemplazan"""
+    with store.lock:
+        before = {store.key(e) for e in store.snapshot()}
+        for email in store.snapshot():
+            if email['account'] in resynced:
+                store.remove(store.key(email))
+        store.add_many(found)
+        return [e for e in found if store.key(e) not in before]
+
+
+def run(mode: str, accounts: int, emails: int, sweeps: int, seed: int):
+    rng = random.Random(seed)
+    now = time.time()
+    mailboxes = [Mailbox(f'cuenta{i}@gmail.com', emails // accounts, rng, now - emails) for i in range(accounts)]
+    store = EmailStore(replay_size=emails * 4)
+    store.add_many([e for box in mailboxes for e in box.scan()])
+
+    deltas = announced = expected = 0
+    elapsed = 0.0
+    for sweep in range(sweeps):
+        # Cambios entre barridos
+        for box in mailboxes:
+            for _ in range(rng.randint(0, 2)):
+                box.append(time.time())
+                expected += 1
+            msgid = rng.choice(list(box.messages))
+            box.messages[msgid][2] = str(rng.randint(1000, 9999))
+            del box.messages[rng.choice(list(box.messages))]
+        if sweep % 3 == 0:
+            rng.choice(mailboxes).renumber()
+
+        found = [e for box in mailboxes for e in box.scan()]
+        resynced = [box.account for box in mailboxes]
+        version = store.version
+        begin = time.perf_counter()
+        if mode == 'replace':
+            new = replace_scan(store, found, resynced)
+        else:
+            new = store.merge_scan(found, resynced, since=version)
+        elapsed += time.perf_counter() - begin
+        deltas += len(store.changes_since(version) or ())
+        announced += len(new)
+
+    expected_keys = {(box.account, str(uid)) for box in mailboxes for uid, _, _ in box.messages.values()}
+    matches = expected_keys == {store.key(e) for e in store.snapshot()}
+    return elapsed, deltas, announced, expected, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=4, help='Cuentas monitoreadas')
+    parser.add_argument('--emails', type=int, default=2000, help='Correos en los buzones')
+    parser.add_argument('--sweeps', type=int, default=10, help='Verificaciones completas simuladas')
+    args = parser.parse_args()
+
+    print("=" * 84)
+    print(f"🔁 Reconciliación — {args.accounts} cuentas, {args.emails} correos, {args.sweeps} barridos")
+    print("=" * 84)
+    results = {}
+    for mode, label in (('replace', 'Antes  (reemplazo)'), ('reconcile', 'Ahora  (clave estable)')):
+        elapsed, deltas, announced, expected, matches = run(mode, args.accounts, args.emails, args.sweeps, 22)
+        results[mode] = (deltas, announced, expected, matches)
+        print(f"   {label:<24} {elapsed * 1000 / args.sweeps:8.2f} ms/barrido   {deltas:7d} cambios en el feed   "
+              f"{announced:6d} anunciados como nuevos")
+
+    deltas, announced, expected, matches = results['reconcile']
+    print(f"\n   Cambios en el feed: {results['replace'][0] / max(deltas, 1):.0f}x menos; "
+          f"correos realmente nuevos: {expected}")
+    if not matches:
+        print("\n❌ El almacén no coincide con el buzón después de reconciliar")
+        sys.exit(1)
+    if announced != expected:
+        print(f"\n❌ Se anunciaron {announced} correos como nuevos, se esperaban {expected}")
+        sys.exit(1)
+    print("\n✅ Sólo se anunciaron los correos nuevos y el almacén coincide con el buzón")
+
+
+if __name__ == '__main__':
+    main()
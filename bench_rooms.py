@@ -0,0 +1,210 @@
+"""
+Prueba de carga de los rooms de Socket.IO con cientos de clientes simulados.
+
+Registra los clientes directamente en el manager de Socket.IO (sin red) y pasa
+por los handlers reales de connect/subscribe; cada paquete que el servidor
+enviaría se cuenta y se decodifica. Compara el envío por rooms (cada agente
+suscrito a unos pocos destinatarios) con el broadcast a todos de antes, y
+verifica, repitiendo lo que hace app.js con cada evento, que cada cliente
+aplique exactamente sus cambios, una vez y en orden, sin pedir `resume`.
+
+Uso:
+    python bench_rooms.py --clients 500 --profiles 2000 --emails 5000
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+
+logging.disable(logging.INFO)
+
+import app as server
+from subscriptions import Subscription
+
+NAMESPACE = '/'
+TYPES = ['codigo_inicio', 'codigo_temporal', 'actualizacion_hogar']
+
+
+class PacketCounter:
+    """Reemplaza el envío de Engine.IO: cuenta bytes y guarda los eventos por cliente"""
+
+    def __init__(self):
+        self.bytes = defaultdict(int)
+        self.events = defaultdict(list)
+        self.packets = 0
+
+    def reset(self):
+        self.bytes.clear()
+        self.events.clear()
+        self.packets = 0
+
+    def __call__(self, eio_sid, eio_pkt):
+        data = eio_pkt.data
+        self.packets += 1
+        self.bytes[eio_sid] += len(data)
+        event, payload = json.loads(data[data.index('['):])
+        self.events[eio_sid].append((event, payload))
+
+
+def connect_clients(count: int, profiles, accounts, rng: random.Random, dashboards: float):
+    """Conecta `count` clientes; una fracción son dashboards sin suscripción"""
+    clients = []
+    for i in range(count):
+        eio_sid = f"eio{i}"
+        sid = server.socketio.server.manager.connect(eio_sid, NAMESPACE)
+        if rng.random() < dashboards:
+            payload = None
+        else:
+            payload = {'to': rng.sample(profiles, rng.randint(1, 3))}
+            if rng.random() < 0.1:
+                payload['accounts'] = [rng.choice(accounts)]
+            if rng.random() < 0.1:
+                payload['types'] = [rng.choice(TYPES)]
+        with server.app.test_request_context('/'):
+            server.request.sid = sid
+            server.request.namespace = NAMESPACE
+            server.handle_connect()
+            if payload is not None:
+                server.handle_subscribe(payload)
+        clients.append((eio_sid, sid, Subscription.parse(payload) if payload else Subscription()))
+    return clients
+
+
+def make_emails(count: int, profiles, accounts, rng: random.Random, start: float):
+    emails = []
+    for i in range(count):
+        email_type = rng.choice(TYPES)
+        emails.append({
+            'id': str(i + 1),
+            'subject': f'Netflix {email_type}',
+            'from': 'Netflix <info@account.netflix.com>',
+            'to': rng.choice(profiles),
+            'date': '',
+            'timestamp': start + i,
+            'type': email_type,
+            'code': str(rng.randint(1000, 9999)),
+            'body_preview': 'Netflix ' * 30,
+            'body_full': '<html>' + 'x' * 4000 + '</html>',
+            'account': rng.choice(accounts),
+        })
+    return emails
+
+
+def broadcast_publish():
+    """Envío anterior: todos los cambios a todos los clientes"""
+    changes = server.email_store.changes_since(server.published_seq)
+    if changes:
+        prev_seq, server.published_seq = server.published_seq, changes[-1][0]
+        server.socketio.emit('email_deltas', server.delta_payload(changes, prev_seq))
+
+
+def run(mode: str, emails, batch: int, counter: PacketCounter):
+    """Carga los correos en lotes y publica; devuelve (segundos de publicación, secuencia inicial)"""
+    server.email_store.clear()
+    server.published_seq = server.email_store.version
+    start_seq = server.published_seq
+    counter.reset()
+    publish = server.publish_changes if mode == 'rooms' else broadcast_publish
+    elapsed = 0.0
+    for i in range(0, len(emails), batch):
+        server.email_store.add_many(emails[i:i + batch])
+        begin = time.perf_counter()
+        publish()
+        elapsed += time.perf_counter() - begin
+    return elapsed, start_seq
+
+
+def replay(events, start_seq: int):
+    """
+    Repite lo que hace app.js con los eventos de un cliente: aplica sólo los
+    deltas con seq > lastSeq, avanza lastSeq hasta to_seq (o la seq de stats) y
+    pide resume ante un hueco. Devuelve (seqs aplicadas, veces que pediría resume).
+    """
+    last_seq, pending, count, applied = start_seq, False, 0, []
+    for event, payload in events:
+        if event == 'email_deltas':
+            if payload['prev_seq'] > last_seq:
+                count += not pending
+                pending = True
+                continue
+            pending = False
+            applied.extend(delta['seq'] for delta in payload['deltas'] if delta['seq'] > last_seq)
+            last_seq = max(last_seq, payload['to_seq'])
+        elif event == 'stats' and not pending and payload.get('seq', 0) > last_seq:
+            last_seq = payload['seq']
+    return applied, count
+
+
+def check(clients, counter: PacketCounter, emails, start_seq: int):
+    """Cada cliente aplica sus correos exactamente una vez, en orden de secuencia y sin huecos"""
+    errors = []
+    for eio_sid, _, subscription in clients:
+        seqs, gaps = replay(counter.events[eio_sid], start_seq)
+        if gaps:
+            errors.append(f"{eio_sid}: pediría resume {gaps} veces sin haber perdido cambios")
+            continue
+        expected = sum(1 for email in emails if subscription.matches(email))
+        if len(seqs) != expected:
+            errors.append(f"{eio_sid}: aplicó {len(seqs)} deltas, se esperaban {expected}")
+        elif seqs != sorted(set(seqs)):
+            errors.append(f"{eio_sid}: deltas repetidos o desordenados")
+    return errors
+
+
+def summarize(label: str, clients, counter: PacketCounter, elapsed: float, emails: int):
+    agents = [eio for eio, _, sub in clients if sub]
+    dashboards = [eio for eio, _, sub in clients if not sub]
+    total = sum(counter.bytes.values())
+    avg = lambda sids: sum(counter.bytes[s] for s in sids) / len(sids) / 1024 if sids else 0
+    print(f"   {label:<10} {elapsed * 1000 / emails:7.3f} ms/correo   {counter.packets:8d} paquetes   "
+          f"{total / 1024 / 1024:8.1f} MB   agente {avg(agents):8.1f} KB   dashboard {avg(dashboards):8.1f} KB")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=500, help='Clientes de Socket.IO simulados')
+    parser.add_argument('--profiles', type=int, default=2000, help='Destinatarios distintos')
+    parser.add_argument('--accounts', type=int, default=4, help='Cuentas de Gmail')
+    parser.add_argument('--emails', type=int, default=5000, help='Correos publicados')
+    parser.add_argument('--batch', type=int, default=10, help='Correos por publicación')
+    parser.add_argument('--dashboards', type=float, default=0.05, help='Fracción de clientes sin suscripción')
+    args = parser.parse_args()
+
+    rng = random.Random(16)
+    profiles = [f'perfil{i}@example.com' for i in range(args.profiles)]
+    accounts = [f'cuenta{i}@gmail.com' for i in range(args.accounts)]
+    emails = make_emails(args.emails, profiles, accounts, rng, time.time() - args.emails)
+
+    counter = PacketCounter()
+    server.socketio.server._send_eio_packet = counter
+    server.email_db = None
+    server.email_store = server.email_store.__class__(replay_size=args.batch * 2)
+    clients = connect_clients(args.clients, profiles, accounts, rng, args.dashboards)
+    subscribed = sum(1 for _, _, sub in clients if sub)
+
+    print("=" * 100)
+    print(f"📡 Rooms de Socket.IO — {args.clients} clientes ({subscribed} suscritos), "
+          f"{args.emails} correos en lotes de {args.batch}")
+    print("=" * 100)
+    broadcast_time, _ = run('broadcast', emails, args.batch, counter)
+    broadcast_bytes = summarize('broadcast', clients, counter, broadcast_time, args.emails)
+    rooms_time, start_seq = run('rooms', emails, args.batch, counter)
+    rooms_bytes = summarize('rooms', clients, counter, rooms_time, args.emails)
+    errors = check(clients, counter, emails, start_seq)
+
+    print(f"\n   Tráfico: {broadcast_bytes / max(rooms_bytes, 1):.1f}x menos bytes, "
+          f"publicación {broadcast_time / max(rooms_time, 1e-9):.1f}x más rápida")
+    if errors:
+        print(f"\n❌ {len(errors)} clientes con entregas incorrectas")
+        for error in errors[:10]:
+            print(f"   ❌ {error}")
+        sys.exit(1)
+    print("\n✅ Cada cliente aplicó sus cambios una sola vez, en orden y sin pedir resume")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark de /api/search: latencia de la búsqueda FTS5 sobre el histórico SQLite.
+
+Llena una base temporal con N correos sintéticos (destinatarios de perfiles,
+tipos, códigos y fechas repartidas en la retención) y mide p50/p95 de consultas
+típicas de soporte. Verifica además que los resultados respeten los filtros.
+
+Uso:
+    python bench_search.py --emails 100000 --runs 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from email_db import EmailDatabase
+
+SUBJECTS = {
+    'codigo_inicio': ['Netflix: Tu código de inicio de sesión', 'Netflix: Your sign-in code'],
+    'codigo_temporal': ['Tu código de acceso temporal de Netflix', 'Your Netflix temporary access code'],
+    'actualizacion_hogar': ['Importante: Cómo actualizar tu Hogar con Netflix',
+                            'Important: How to update your Netflix Household'],
+}
+
+
+def synthetic_emails(count: int, profiles: int, days: int, seed: int = 11):
+    """Correos ordenados por fecha, como los va archivando el monitor"""
+    rng = random.Random(seed)
+    now = time.time()
+    step = days * 86400 / count
+    types = list(SUBJECTS)
+    for i in range(count):
+        email_type = types[i % len(types)]
+        profile = rng.randrange(profiles)
+        code = (str(rng.randint(1000, 9999)) if email_type == 'codigo_inicio'
+                else f'https://www.netflix.com/account/travel/verify?nftoken={rng.getrandbits(64):x}')
+        yield {
+            'account': f'monitor{i % 4}@gmail.com',
+            'id': str(i + 1),
+            'subject': rng.choice(SUBJECTS[email_type]),
+            'from': 'Netflix <info@account.netflix.com>',
+            'to': f'Perfil {profile} <perfil{profile}@clientes.example.com>',
+            'date': '',
+            'timestamp': now - days * 86400 + i * step,
+            'type': email_type,
+            'code': code,
+        }
+
+
+def fill(db: EmailDatabase, emails, batch: int = 5000):
+    pending = []
+    for email_data in emails:
+        pending.append(email_data)
+        if len(pending) >= batch:
+            db.conn.execute('BEGIN')
+            db._archive_emails(pending, time.time())
+            db.conn.execute('COMMIT')
+            pending = []
+    if pending:
+        db.conn.execute('BEGIN')
+        db._archive_emails(pending, time.time())
+        db.conn.execute('COMMIT')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=100000, help='Correos en el histórico')
+    parser.add_argument('--profiles', type=int, default=2000, help='Destinatarios distintos')
+    parser.add_argument('--days', type=int, default=90, help='Días cubiertos por el histórico')
+    parser.add_argument('--runs', type=int, default=50, help='Repeticiones por consulta')
+    args = parser.parse_args()
+
+    db = EmailDatabase(os.path.join(tempfile.mkdtemp(prefix='bench-search-'), 'emails.db'))
+    start = time.perf_counter()
+    fill(db, synthetic_emails(args.emails, args.profiles, args.days))
+    fill_time = time.perf_counter() - start
+
+    now = time.time()
+    yesterday = (now - 2 * 86400, now - 86400)
+    queries = [
+        ('Destinatario', dict(text='perfil123')),
+        ('Hogar de un perfil ayer', dict(text='perfil42', email_type='actualizacion_hogar',
+                                         since=yesterday[0], until=yesterday[1])),
+        ('Término común (netflix)', dict(text='netflix')),
+        ('Código exacto', dict(text='4821')),
+        ('Sólo filtro de tipo', dict(email_type='codigo_temporal')),
+        ('Rango de fechas', dict(since=yesterday[0], until=yesterday[1])),
+        ('Página 2 (cursor)', None),
+    ]
+
+    print("=" * 78)
+    print(f"📊 Búsqueda FTS5 — {args.emails} correos en el histórico (carga: {fill_time:.1f}s), {args.runs} corridas")
+    print("=" * 78)
+
+    errors = []
+    for label, params in queries:
+        if params is None:
+            _, cursor = db.search('netflix', limit=50)
+            params = dict(text='netflix', before=cursor)
+        timings = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            results, _ = db.search(limit=50, **params)
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        p50 = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"   {label:<26} p50 {p50:6.2f} ms   p95 {p95:6.2f} ms   {len(results):3d} resultados")
+
+        for result in results:
+            if params.get('email_type') and result['type'] != params['email_type']:
+                errors.append(f"{label}: tipo {result['type']}")
+            if params.get('since') and not (params['since'] <= result['timestamp'] <= params['until']):
+                errors.append(f"{label}: fecha fuera de rango")
+            if params.get('text') == 'perfil123' and 'perfil123' not in result['to'].lower():
+                errors.append(f"{label}: destinatario {result['to']}")
+        stamps = [r['timestamp'] for r in results]
+        if stamps != sorted(stamps, reverse=True):
+            errors.append(f"{label}: resultados fuera de orden")
+
+    db.close()
+    if errors:
+        for error in errors[:10]:
+            print(f"   ❌ {error}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark de arranque en frío vs. en caliente con la base SQLite.
+
+Frío: base vacía, se hace la verificación completa de todas las cuentas antes de
+tener datos para mostrar. Caliente: se cargan correos y cursores desde disco (el
+panel ya tiene datos) y la verificación inicial sólo trae lo nuevo desde el cursor.
+Usa el servidor IMAP falso local con latencia simulada.
+
+Uso:
+    python bench_startup.py --accounts 4 --messages 150 --latency 0.02
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from bench_fetch import LocalIMAPService, load_mailbox
+from email_db import EmailDatabase
+from email_store import EmailStore
+from fake_imap_server import FakeIMAPServer, make_message
+from gmail_service import GmailMonitor
+
+
+class LocalGmailMonitor(GmailMonitor):
+    """GmailMonitor cuyas cuentas apuntan al servidor falso"""
+
+    def __init__(self, port: int, accounts, **kwargs):
+        super().__init__(accounts, **kwargs)
+        self.port = port
+
+    def _create_service(self, email_address: str, password: str):
+        service = LocalIMAPService(self.port, fetch_batch_size=self.fetch_batch_size)
+        service.email_address = email_address
+        return service
+
+
+def start(db_path: str, port: int, accounts, days_back: int = 7):
+    """
+    Simula el arranque de app.py: abrir la base, cargar el almacén y hacer la
+    verificación inicial. Devuelve (segundos hasta tener datos, segundos hasta estar al día, correos)
+    """
+    begin = time.perf_counter()
+    store = EmailStore()
+    db = EmailDatabase(db_path)
+    store.add_many(db.load_emails(since=time.time() - (days_back + 1) * 86400))
+    db.mark_loaded(store)
+    monitor = LocalGmailMonitor(port, accounts)
+    monitor.sync_cursors.update(db.load_cursors())
+    first_data = time.perf_counter() - begin if len(store) else None
+
+    found = monitor.fetch_all_netflix_emails(days_back=days_back)
+    store.merge_scan(found, monitor.last_resynced)
+    db.persist_changes(store)
+    db.save_cursors(monitor.sync_cursors)
+    caught_up = time.perf_counter() - begin
+    if first_data is None:
+        first_data = caught_up
+
+    monitor.pool.close_all()
+    db.close()
+    return first_data, caught_up, len(store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=4, help='Cuentas monitoreadas')
+    parser.add_argument('--messages', type=int, default=150, help='Correos en el buzón')
+    parser.add_argument('--latency', type=float, default=0.02, help='Round trip simulado (segundos)')
+    parser.add_argument('--new', type=int, default=3, help='Correos que llegan entre un arranque y otro')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    server = FakeIMAPServer(latency=args.latency).start()
+    load_mailbox(server, args.messages)
+    accounts = [{'email': f'cuenta{i}@example.com', 'password': 'bench'} for i in range(args.accounts)]
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench-startup-'), 'emails.db')
+
+    print("=" * 78)
+    print(f"📊 Arranque frío vs. caliente — {args.accounts} cuentas × {args.messages} correos, "
+          f"RTT {args.latency * 1000:.0f} ms")
+    print("=" * 78)
+
+    cold_first, cold_total, cold_count = start(db_path, server.port, accounts)
+    print(f"   Frío (base vacía)            datos en {cold_first * 1000:8.1f} ms   "
+          f"al día en {cold_total * 1000:8.1f} ms   {cold_count} correos")
+
+    warm_first, warm_total, warm_count = start(db_path, server.port, accounts)
+    print(f"   Caliente (sin cambios)       datos en {warm_first * 1000:8.1f} ms   "
+          f"al día en {warm_total * 1000:8.1f} ms   {warm_count} correos")
+
+    for i in range(args.new):
+        server.mailbox.append(make_message('Netflix: Tu código de inicio de sesión',
+                                           f'<p>Ingresa este código para iniciar sesión</p><p>{9000 + i}</p>'))
+    delta_first, delta_total, delta_count = start(db_path, server.port, accounts)
+    print(f"   Caliente (+{args.new} correos)        datos en {delta_first * 1000:8.1f} ms   "
+          f"al día en {delta_total * 1000:8.1f} ms   {delta_count} correos")
+    print(f"   → primeros datos {cold_first / warm_first:.0f}x antes, al día {cold_total / delta_total:.1f}x antes")
+
+    server.shutdown()
+    if warm_count != cold_count or delta_count != cold_count + args.new * args.accounts:
+        print("   ❌ El arranque en caliente no tiene los mismos correos que el frío")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from email_store import EmailStore
+
+logger = logging.getLogger(__name__)
+
+# Columnas de la tabla emails en el mismo orden que el diccionario de IMAPService
+EMAIL_COLUMNS = ['account', 'id', 'subject', 'from', 'to', 'date', 'timestamp',
+                 'type', 'code', 'body_preview', 'body_full', 'gm_msgid', 'uidvalidity', 'accounts', 'expired']
+
+
+def _schema_v1(conn: sqlite3.Connection):
+    # Sentencias sueltas: executescript() haría COMMIT fuera de la transacción de la migración
+    for statement in (
+        '''CREATE TABLE emails (
+            account      TEXT NOT NULL,
+            id           TEXT NOT NULL,
+            subject      TEXT,
+            "from"       TEXT,
+            "to"         TEXT,
+            date         TEXT,
+            timestamp    REAL,
+            type         TEXT,
+            code         TEXT,
+            body_preview TEXT,
+            body_full    TEXT,
+            PRIMARY KEY (account, id)
+        ) WITHOUT ROWID''',
+        'CREATE INDEX emails_timestamp ON emails (timestamp)',
+        '''CREATE TABLE sync_cursors (
+            account     TEXT PRIMARY KEY,
+            uidvalidity INTEGER,
+            last_uid    INTEGER,
+            modseq      INTEGER,
+            updated_at  REAL
+        )''',
+        '''CREATE TABLE seen_messages (
+            account TEXT NOT NULL,
+            id      TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (account, id)
+        ) WITHOUT ROWID''',
+    ):
+        conn.execute(statement)
+
+
+def _schema_v2(conn: sqlite3.Connection):
+    # Histórico con búsqueda de texto completo. seq crece con cada correo archivado,
+    # así que ORDER BY seq DESC devuelve los más recientes sin ordenar todos los resultados.
+    for statement in (
+        '''CREATE TABLE email_archive (
+            seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+            account     TEXT NOT NULL,
+            id          TEXT NOT NULL,
+            subject     TEXT,
+            from_addr   TEXT,
+            to_addr     TEXT,
+            date        TEXT,
+            timestamp   REAL,
+            type        TEXT,
+            code        TEXT,
+            archived_at REAL NOT NULL,
+            UNIQUE (account, id)
+        )''',
+        'CREATE INDEX email_archive_timestamp ON email_archive (timestamp)',
+        'CREATE INDEX email_archive_archived_at ON email_archive (archived_at)',
+        '''CREATE VIRTUAL TABLE email_archive_fts USING fts5(
+            subject, to_addr, from_addr, code,
+            content='email_archive', content_rowid='seq',
+            tokenize='unicode61 remove_diacritics 2'
+        )''',
+        '''CREATE TRIGGER email_archive_ai AFTER INSERT ON email_archive BEGIN
+            INSERT INTO email_archive_fts (rowid, subject, to_addr, from_addr, code)
+            VALUES (new.seq, new.subject, new.to_addr, new.from_addr, new.code);
+        END''',
+        '''CREATE TRIGGER email_archive_ad AFTER DELETE ON email_archive BEGIN
+            INSERT INTO email_archive_fts (email_archive_fts, rowid, subject, to_addr, from_addr, code)
+            VALUES ('delete', old.seq, old.subject, old.to_addr, old.from_addr, old.code);
+        END''',
+        '''CREATE TRIGGER email_archive_au AFTER UPDATE ON email_archive BEGIN
+            INSERT INTO email_archive_fts (email_archive_fts, rowid, subject, to_addr, from_addr, code)
+            VALUES ('delete', old.seq, old.subject, old.to_addr, old.from_addr, old.code);
+            INSERT INTO email_archive_fts (rowid, subject, to_addr, from_addr, code)
+            VALUES (new.seq, new.subject, new.to_addr, new.from_addr, new.code);
+        END''',
+        # Los correos ya guardados pasan al histórico
+        '''INSERT INTO email_archive (account, id, subject, from_addr, to_addr, date, timestamp, type, code, archived_at)
+           SELECT account, id, subject, "from", "to", date, timestamp, type, code, strftime('%s', 'now')
+           FROM emails ORDER BY timestamp''',
+    ):
+        conn.execute(statement)
+
+
+def _schema_v3(conn: sqlite3.Connection):
+    # Clave estable para reconciliar verificaciones completas (ver EmailStore.stable_key)
+    for statement in (
+        'ALTER TABLE emails ADD COLUMN gm_msgid TEXT',
+        'ALTER TABLE emails ADD COLUMN uidvalidity INTEGER',
+    ):
+        conn.execute(statement)
+
+
+def _schema_v4(conn: sqlite3.Connection):
+    # Cuentas donde llegaron copias reenviadas del correo, separadas por coma (ver MessageDedupe)
+    conn.execute('ALTER TABLE emails ADD COLUMN accounts TEXT')
+
+
+def _schema_v5(conn: sqlite3.Connection):
+    # Correos vencidos (sin cuerpos): no dependen del TTL vigente al volver a cargarlos.
+    # Las filas ya guardadas sin ningún cuerpo sólo pudieron quedar así al vencer.
+    for statement in (
+        'ALTER TABLE emails ADD COLUMN expired INTEGER',
+        'UPDATE emails SET expired = 1 WHERE body_full IS NULL AND body_preview IS NULL',
+    ):
+        conn.execute(statement)
+
+
+# Migraciones en orden: MIGRATIONS[i] lleva el esquema de la versión i a la i + 1.
+# Para cambiar el esquema se agrega una función al final (nunca se editan las anteriores).
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _schema_v1,
+    _schema_v2,
+    _schema_v3,
+    _schema_v4,
+    _schema_v5,
+]
+
+# Columnas del histórico que devuelve search(), con los nombres del diccionario de correo
+ARCHIVE_COLUMNS = [('account', 'account'), ('id', 'id'), ('subject', 'subject'), ('from_addr', 'from'),
+                   ('to_addr', 'to'), ('date', 'date'), ('timestamp', 'timestamp'), ('type', 'type'),
+                   ('code', 'code')]
+
+
+class EmailDatabase:
+    """
+    Persistencia en SQLite (modo WAL) de los correos detectados, los cursores de
+    sincronización por cuenta y el conjunto de mensajes ya vistos.
+
+    Al arrancar se cargan los correos y los cursores desde disco, así el panel
+    tiene datos al instante y la primera verificación sólo trae lo nuevo.
+    Los cambios del EmailStore se guardan leyendo su feed de cambios.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Archivo de la base de datos (se crea junto con su directorio si no existe)
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.persisted_seq = 0
+        self.persisted_epoch = None
+        self.migrate()
+
+    @property
+    def schema_version(self) -> int:
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self):
+        """Aplica las migraciones pendientes, cada una en su propia transacción"""
+        with self._lock:
+            current = self.schema_version
+            for version in range(current, len(MIGRATIONS)):
+                logger.info(f"Migrando base de datos {self.path} a la versión {version + 1}")
+                self.conn.execute('BEGIN IMMEDIATE')
+                try:
+                    MIGRATIONS[version](self.conn)
+                    self.conn.execute(f'PRAGMA user_version = {version + 1}')
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    self.conn.execute('ROLLBACK')
+                    raise
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # ── Correos ─────────────────────────────────────────────────────────────
+
+    def load_emails(self, since: Optional[float] = None) -> List[Dict]:
+        """Correos guardados (los sin fecha siempre se incluyen), del más nuevo al más viejo"""
+        columns = ', '.join(f'"{c}"' for c in EMAIL_COLUMNS)
+        query = f'SELECT {columns} FROM emails'
+        params = ()
+        if since is not None:
+            query += ' WHERE timestamp IS NULL OR timestamp = 0 OR timestamp >= ?'
+            params = (since,)
+        query += ' ORDER BY timestamp DESC'
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        emails = [dict(zip(EMAIL_COLUMNS, row)) for row in rows]
+        for email_data in emails:
+            email_data['expired'] = True if email_data['expired'] else None
+        return emails
+
+    def _upsert_emails(self, emails: Iterable[Dict]):
+        columns = ', '.join(f'"{c}"' for c in EMAIL_COLUMNS)
+        placeholders = ', '.join('?' for _ in EMAIL_COLUMNS)
+        emails = list(emails)
+        rows = [tuple(e.get(c) for c in EMAIL_COLUMNS) for e in emails]
+        self.conn.executemany(f'INSERT OR REPLACE INTO emails ({columns}) VALUES ({placeholders})', rows)
+        now = time.time()
+        self.conn.executemany('INSERT OR IGNORE INTO seen_messages (account, id, seen_at) VALUES (?, ?, ?)',
+                              [(row[0], row[1], now) for row in rows])
+        self._archive_emails(emails, now)
+
+    def _archive_emails(self, emails: Iterable[Dict], now: float):
+        """Agrega o actualiza los correos en el histórico (nunca se borran al salir del almacén)"""
+        self.conn.executemany(
+            '''INSERT INTO email_archive (account, id, subject, from_addr, to_addr, date, timestamp, type, code, archived_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (account, id) DO UPDATE SET
+                   subject = excluded.subject, from_addr = excluded.from_addr, to_addr = excluded.to_addr,
+                   date = excluded.date, timestamp = excluded.timestamp, type = excluded.type,
+                   code = excluded.code''',
+            [(e.get('account'), str(e.get('id')), e.get('subject'), e.get('from'), e.get('to'), e.get('date'),
+              e.get('timestamp'), e.get('type'), e.get('code'), now) for e in emails]
+        )
+
+    def persist_changes(self, store: EmailStore) -> int:
+        """
+        Guarda los cambios del almacén desde la última llamada en una transacción.
+        Si el feed ya no tiene el hueco completo, reescribe la tabla con un snapshot.
+
+        Returns:
+            Cantidad de cambios aplicados
+        """
+        with self._lock:
+            changes = None
+            if self.persisted_epoch == store.epoch:
+                changes = store.changes_since(self.persisted_seq)
+            if changes == []:
+                return 0
+
+            self.conn.execute('BEGIN')
+            try:
+                if changes is None:
+                    with store.lock:
+                        snapshot = store.snapshot()
+                        seq = store.version
+                    self.conn.execute('DELETE FROM emails')
+                    self._upsert_emails(snapshot)
+                    applied = len(snapshot)
+                else:
+                    upserts = {}
+                    removed = set()
+                    for _, op, key, email_data in changes:
+                        if op == 'remove':
+                            upserts.pop(key, None)
+                            removed.add(key)
+                        else:
+                            upserts[key] = email_data
+                            removed.discard(key)
+                    self.conn.executemany('DELETE FROM emails WHERE account = ? AND id = ?', list(removed))
+                    self._upsert_emails(upserts.values())
+                    seq = changes[-1][0]
+                    applied = len(changes)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+            self.persisted_seq = seq
+            self.persisted_epoch = store.epoch
+            return applied
+
+    def mark_loaded(self, store: EmailStore):
+        """Marca el estado actual del almacén como ya guardado (tras cargarlo desde disco)"""
+        with self._lock:
+            self.persisted_seq = store.version
+            self.persisted_epoch = store.epoch
+
+    # ── Mensajes vistos ─────────────────────────────────────────────────────
+
+    def filter_unseen(self, emails: List[Dict]) -> List[Dict]:
+        """Quita los correos que ya se guardaron alguna vez (aunque ya no estén en el almacén)"""
+        if not emails:
+            return []
+        with self._lock:
+            return [e for e in emails if self.conn.execute(
+                'SELECT 1 FROM seen_messages WHERE account = ? AND id = ?', EmailStore.key(e)).fetchone() is None]
+
+    def prune_seen(self, before: float) -> int:
+        with self._lock:
+            return self.conn.execute('DELETE FROM seen_messages WHERE seen_at < ?', (before,)).rowcount
+
+    # ── Histórico y búsqueda ────────────────────────────────────────────────
+
+    @staticmethod
+    def fts_query(text: str) -> str:
+        """
+        Convierte el texto del usuario en una consulta FTS5 segura: cada palabra se
+        busca como frase por prefijo y todas deben aparecer (AND implícito).
+        """
+        terms = []
+        for word in text.split():
+            word = word.replace('"', '""')
+            terms.append(f'"{word}"*')
+        return ' '.join(terms)
+
+    def search(self, text: str = '', email_type: str = None, account: str = None,
+               since: float = None, until: float = None, limit: int = 50,
+               before: int = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Busca en el histórico por asunto, destinatario, remitente y código extraído.
+
+        Args:
+            text: Palabras a buscar (vacío = sólo filtros)
+            email_type, account: Filtros exactos
+            since, until: Rango de fechas (timestamp del correo)
+            limit: Resultados por página
+            before: Cursor devuelto por la página anterior
+
+        Returns:
+            (correos del más reciente al más antiguo, cursor de la página siguiente o None)
+        """
+        columns = ', '.join(f'a.{column}' for column, _ in ARCHIVE_COLUMNS)
+        conditions = []
+        params = []
+        match = self.fts_query(text or '')
+        if match:
+            query = (f'SELECT a.seq, {columns} FROM email_archive_fts f '
+                     f'JOIN email_archive a ON a.seq = f.rowid')
+            conditions.append('email_archive_fts MATCH ?')
+            params.append(match)
+            seq_column = 'f.rowid'
+        else:
+            query = f'SELECT a.seq, {columns} FROM email_archive a'
+            seq_column = 'a.seq'
+
+        for condition, value in ((f'{seq_column} < ?', before), ('a.type = ?', email_type),
+                                 ('a.account = ?', account), ('a.timestamp >= ?', since),
+                                 ('a.timestamp <= ?', until)):
+            if value is not None and value != '':
+                conditions.append(condition)
+                params.append(value)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f' ORDER BY {seq_column} DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        results = [dict(zip((name for _, name in ARCHIVE_COLUMNS), row[1:])) for row in rows[:limit]]
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return results, next_cursor
+
+    def prune_archive(self, before: float) -> int:
+        """Borra del histórico los correos archivados antes de `before` (retención)"""
+        with self._lock:
+            return self.conn.execute('DELETE FROM email_archive WHERE archived_at < ?', (before,)).rowcount
+
+    # ── Cursores de sincronización ──────────────────────────────────────────
+
+    def load_cursors(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self.conn.execute('SELECT account, uidvalidity, last_uid, modseq FROM sync_cursors').fetchall()
+        return {account: {'uidvalidity': uidvalidity, 'last_uid': last_uid, 'modseq': modseq}
+                for account, uidvalidity, last_uid, modseq in rows}
+
+    def save_cursors(self, cursors: Dict[str, Dict]):
+        """Guarda los cursores (llamar después de persist_changes para no saltear correos)"""
+        now = time.time()
+        rows = [(account, c.get('uidvalidity'), c.get('last_uid'), c.get('modseq'), now)
+                for account, c in cursors.items() if c]
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR REPLACE INTO sync_cursors '
+                                  '(account, uidvalidity, last_uid, modseq, updated_at) VALUES (?, ?, ?, ?, ?)',
+                                  rows)
+            self.conn.execute('COMMIT')
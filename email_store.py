@@ -0,0 +1,794 @@
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from heapq import heapify, heappop, heappush
+from itertools import islice
+from bisect import bisect_left, bisect_right, insort
+from email.utils import getaddresses
+from math import inf, nextafter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+EmailKey = Tuple[str, str]
+
+
+class SortedKeys:
+    """
+    Claves de correos ordenadas del más nuevo al más viejo.
+
+    Cada entrada es (-timestamp, clave), así que insertar y quitar son una
+    búsqueda binaria y el primer elemento es siempre el correo más reciente.
+    """
+
+    __slots__ = ('_entries',)
+
+    def __init__(self):
+        self._entries: List[tuple] = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, sort_key: tuple):
+        insort(self._entries, sort_key)
+
+    def remove(self, sort_key: tuple):
+        i = bisect_left(self._entries, sort_key)
+        if i < len(self._entries) and self._entries[i] == sort_key:
+            del self._entries[i]
+
+    def entries(self, after: tuple = None) -> Iterable[tuple]:
+        """Entradas en orden; con `after` empieza justo después de esa posición"""
+        entries = self._entries
+        start = bisect_right(entries, after) if after else 0
+        return (entries[i] for i in range(start, len(entries)))
+
+    def keys(self, after: tuple = None) -> Iterable[EmailKey]:
+        return (key for _, key in self.entries(after))
+
+    def first(self) -> Optional[EmailKey]:
+        return self._entries[0][1] if self._entries else None
+
+    def older_than(self, cutoff: float) -> List[EmailKey]:
+        """Claves con fecha anterior a cutoff (excluye las que no tienen fecha)"""
+        start = bisect_left(self._entries, (nextafter(-cutoff, inf),))
+        end = bisect_left(self._entries, (0,))
+        return [key for _, key in self._entries[start:end]]
+
+
+class RateCounter:
+    """
+    Correos recibidos por cuenta y por tipo en ventanas de 1h y 24h.
+
+    Se actualiza al insertar (un contador por minuto y otro por hora para cada
+    clave) y leer suma a lo sumo 60 + 24 cubetas por clave, así que el costo no
+    depende de cuántos correos hay guardados. La ventana de 24h tiene resolución
+    de una hora. Se cuenta por la fecha del correo, no por cuándo se detectó.
+    """
+
+    WINDOWS = {'1h': (60, 60), '24h': (3600, 24)}   # ventana → (segundos por cubeta, cubetas)
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        # ventana → (dimensión, valor) → cubeta → correos
+        self._buckets: Dict[str, Dict[Tuple[str, str], Dict[int, int]]] = {w: {} for w in self.WINDOWS}
+
+    @staticmethod
+    def _keys(email_data: Dict) -> List[Tuple[str, str]]:
+        return [('total', ''), ('type', email_data.get('type') or 'unknown'),
+                ('account', email_data.get('account') or 'unknown')]
+
+    def record(self, email_data: Dict):
+        now = self.clock()
+        timestamp = min(email_data.get('timestamp') or now, now)
+        for window, (width, count) in self.WINDOWS.items():
+            bucket = int(timestamp // width)
+            oldest = int(now // width) - count + 1
+            if bucket < oldest:
+                continue
+            for key in self._keys(email_data):
+                buckets = self._buckets[window].setdefault(key, {})
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+                if len(buckets) > count:
+                    for stale in [b for b in buckets if b < oldest]:
+                        del buckets[stale]
+
+    def clear(self):
+        self._buckets = {w: {} for w in self.WINDOWS}
+
+    def rates(self) -> Dict[str, Dict]:
+        """Por ventana: total, por tipo y por cuenta con cantidad y correos por minuto"""
+        now = self.clock()
+        result = {}
+        for window, (width, count) in self.WINDOWS.items():
+            oldest = int(now // width) - count + 1
+            minutes = width * count / 60
+            summary = {'total': 0, 'per_minute': 0.0, 'by_type': {}, 'by_account': {}}
+            for (dimension, value), buckets in self._buckets[window].items():
+                total = sum(n for b, n in buckets.items() if b >= oldest)
+                if not total:
+                    continue
+                rate = {'count': total, 'per_minute': round(total / minutes, 3)}
+                if dimension == 'total':
+                    summary['total'], summary['per_minute'] = total, rate['per_minute']
+                else:
+                    summary['by_' + dimension][value] = rate
+            result[window] = summary
+        return result
+
+
+class EmailRecord:
+    """
+    Correo guardado en el almacén.
+
+    Usa __slots__ (sin un dict por instancia), comparte los textos repetidos
+    (cuenta, tipo, remitente, destinatario) con sys.intern y guarda el HTML
+    comprimido con zlib: sólo se descomprime al leer body_full (el modal y la
+    escritura en SQLite). Se lee como un dict (record['to'], record.get('code'))
+    para que el resto del código no dependa de la representación.
+    """
+
+    FIELDS = ('id', 'subject', 'from', 'to', 'date', 'timestamp', 'type', 'code',
+              'body_preview', 'body_full', 'account', 'accounts', 'gm_msgid', 'uidvalidity', 'expired')
+    # Campo del correo → atributo ('from' es palabra reservada)
+    ATTRIBUTES = {field: 'sender' if field == 'from' else field
+                  for field in FIELDS if field != 'body_full'}
+    INTERNED = ('from', 'to', 'type', 'account', 'accounts')
+    COMPRESS_LEVEL = 6
+
+    __slots__ = tuple(ATTRIBUTES.values()) + ('_body',)
+
+    def __init__(self, **fields):
+        for field, attribute in self.ATTRIBUTES.items():
+            value = fields.get(field)
+            if field in self.INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, attribute, value)
+        self._body = self.compress(fields.get('body_full'))
+
+    @classmethod
+    def compress(cls, body: Optional[str]) -> Optional[bytes]:
+        return zlib.compress(body.encode('utf-8'), cls.COMPRESS_LEVEL) if body is not None else None
+
+    @classmethod
+    def from_dict(cls, email_data) -> 'EmailRecord':
+        if isinstance(email_data, cls):
+            return email_data
+        return cls(**email_data)
+
+    @property
+    def body_full(self) -> Optional[str]:
+        return zlib.decompress(self._body).decode('utf-8') if self._body is not None else None
+
+    def replace(self, **fields) -> 'EmailRecord':
+        """Copia con algunos campos cambiados (sin descomprimir el HTML si no se toca)"""
+        record = object.__new__(EmailRecord)
+        for attribute in self.__slots__:
+            setattr(record, attribute, getattr(self, attribute))
+        for field, value in fields.items():
+            if field == 'body_full':
+                record._body = self.compress(value)
+            else:
+                setattr(record, self.ATTRIBUTES[field], value)
+        return record
+
+    def get(self, field: str, default=None):
+        if field == 'body_full':
+            return self.body_full
+        attribute = self.ATTRIBUTES.get(field)
+        return getattr(self, attribute) if attribute else default
+
+    def __getitem__(self, field: str):
+        if field != 'body_full' and field not in self.ATTRIBUTES:
+            raise KeyError(field)
+        return self.get(field)
+
+    def __contains__(self, field: str):
+        return field in self.FIELDS
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self) -> Dict:
+        return {field: self.get(field) for field in self.FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, EmailRecord):
+            return NotImplemented
+        return all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"EmailRecord({self.account!r}, {self.id!r}, {self.type!r})"
+
+
+class Reconciliation:
+    """Diferencias entre una verificación completa y el almacén, por clave estable"""
+
+    __slots__ = ('inserts', 'updates', 'tombstones')
+
+    def __init__(self):
+        self.inserts: List[EmailRecord] = []                      # correos que no estaban
+        self.updates: List[Tuple[EmailKey, EmailRecord]] = []     # (clave actual, versión nueva)
+        self.tombstones: List[EmailKey] = []                      # ya no están en el buzón
+
+    def __len__(self):
+        return len(self.inserts) + len(self.updates) + len(self.tombstones)
+
+
+class EmailStore:
+    """
+    Almacén en memoria de los correos de Netflix detectados.
+
+    - Deduplicación O(1) por clave (cuenta, UID) y por clave estable (cuenta +
+      X-GM-MSGID, o cuenta + UIDVALIDITY + UID): las verificaciones completas se
+      reconcilian contra el almacén con altas, cambios y bajas explícitas
+    - Cada correo se guarda como EmailRecord (slots + HTML comprimido)
+    - Orden por fecha mantenido con bisect al insertar (sin re-ordenar la lista)
+    - Índices secundarios por cuenta, tipo, destinatario (to) y destinatario +
+      tipo: el último código de un destinatario es el primero de su índice
+    - Lecturas thread-safe: snapshot() devuelve una lista nueva tomada bajo el lock
+    - Feed de cambios: cada modificación recibe un número de secuencia creciente
+      (self.version) y queda en un buffer acotado para que los clientes que se
+      reconectan reciban sólo lo que se perdieron
+    - Vencimiento por tipo (TTL): al vencer un correo se descartan sus cuerpos y
+      queda sólo la metadata, con un cambio 'expire' en el feed. Los vencimientos
+      pendientes están en un heap, así que revisar cuesta O(log n) por correo vencido
+    """
+
+    # Campos pesados que se descartan al vencer un correo
+    EXPIRED_FIELDS = ('body_full', 'body_preview')
+
+    def __init__(self, replay_size: int = 1000, ttl: Dict[str, float] = None):
+        """
+        Args:
+            replay_size: Cambios que se guardan para reanudar clientes reconectados
+            ttl: Segundos de vida por tipo de correo (los tipos sin TTL no vencen)
+        """
+        self.lock = threading.RLock()
+        self.version = 0
+        # Distingue secuencias de distintos arranques (la versión vuelve a 0)
+        self.epoch = os.urandom(4).hex()
+        self._changes = deque(maxlen=replay_size)   # (seq, op, clave, correo)
+        self._emails: Dict[EmailKey, EmailRecord] = {}
+        self._order = SortedKeys()
+        self._indexes: Dict[str, Dict] = {'account': {}, 'type': {}, 'to': {}, 'to_type': {}}
+        self._stable: Dict[tuple, EmailKey] = {}   # clave estable → clave
+        self.rates = RateCounter()
+        self.ttl: Dict[str, float] = dict(ttl or {})
+        self._expiry: List[Tuple[float, EmailKey]] = []   # heap de (vence, clave)
+
+    @staticmethod
+    def key(email_data: Dict) -> EmailKey:
+        """Clave estable de un correo: (cuenta, UID)"""
+        return (email_data['account'], str(email_data['id']))
+
+    @staticmethod
+    def stable_key(email_data: Dict) -> tuple:
+        """
+        Identidad del mensaje que no depende de la sesión IMAP: X-GM-MSGID en Gmail
+        (sobrevive a cambios de UIDVALIDITY) o, si no hay, UIDVALIDITY + UID.
+        """
+        if email_data.get('gm_msgid'):
+            return (email_data['account'], 'gm', str(email_data['gm_msgid']))
+        return (email_data['account'], 'uid', email_data.get('uidvalidity'), str(email_data['id']))
+
+    @staticmethod
+    def accounts_of(email_data: Dict) -> List[str]:
+        """Cuentas donde llegó el correo: la suya y las de sus copias reenviadas (campo accounts)"""
+        accounts = [a.strip() for a in (email_data.get('accounts') or '').split(',') if a.strip()]
+        return accounts or [email_data.get('account') or 'unknown']
+
+    @staticmethod
+    def public_id(email_data: Dict) -> str:
+        """Identificador único para la API: 'cuenta:UID'"""
+        return f"{email_data['account']}:{email_data['id']}"
+
+    @staticmethod
+    def format_key(key: EmailKey) -> str:
+        return f"{key[0]}:{key[1]}"
+
+    @staticmethod
+    def parse_public_id(public_id: str) -> EmailKey:
+        account, _, uid = public_id.rpartition(':')
+        return (account, uid)
+
+    @staticmethod
+    def encode_cursor(sort_key: tuple) -> str:
+        """Cursor opaco de paginación a partir de la posición de un correo"""
+        neg_ts, (account, uid) = sort_key
+        raw = json.dumps([neg_ts, account, uid], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            neg_ts, account, uid = json.loads(raw)
+            return (float(neg_ts), (str(account), str(uid)))
+        except (ValueError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Cursor inválido: {cursor}") from e
+
+    @staticmethod
+    def recipients(to_header: str) -> Set[str]:
+        """Direcciones normalizadas (minúsculas) de un header To"""
+        return {addr.strip().lower() for _, addr in getaddresses([to_header or '']) if addr.strip()}
+
+    @staticmethod
+    def _sort_key(email_data: Dict, key: EmailKey) -> tuple:
+        return (-(email_data.get('timestamp') or 0), key)
+
+    def _index_values(self, email_data: Dict) -> Dict[str, Iterable]:
+        email_type = email_data.get('type') or 'unknown'
+        recipients = self.recipients(email_data.get('to'))
+        return {
+            'account': [email_data.get('account') or 'unknown'],
+            'type': [email_type],
+            'to': recipients,
+            'to_type': [(address, email_type) for address in recipients],
+        }
+
+    def __len__(self):
+        return len(self._emails)
+
+    def __contains__(self, key: EmailKey):
+        return key in self._emails
+
+    def get(self, key: EmailKey) -> Optional[EmailRecord]:
+        return self._emails.get(key)
+
+    # ── Escritura ───────────────────────────────────────────────────────────
+
+    def _record(self, op: str, key: EmailKey = None, email_data: Dict = None):
+        """Registra un cambio ('add', 'update', 'expire', 'remove' o 'reset') en el feed"""
+        self.version += 1
+        self._changes.append((self.version, op, key, email_data))
+
+    def _expires_at(self, email_data: Dict) -> Optional[float]:
+        ttl = self.ttl.get(email_data.get('type'))
+        if not ttl or not email_data.get('timestamp') or email_data.get('expired'):
+            return None
+        return email_data['timestamp'] + ttl
+
+    def _expired_copy(self, email_data: EmailRecord) -> EmailRecord:
+        return email_data.replace(expired=True, **{field: None for field in self.EXPIRED_FIELDS})
+
+    def _prepare(self, email_data: Dict) -> EmailRecord:
+        """
+        Convierte el correo en EmailRecord. Si ya venció al llegar (ej. de una
+        verificación completa) se guarda directamente sin cuerpos.
+        """
+        email_data = EmailRecord.from_dict(email_data)
+        expires_at = self._expires_at(email_data)
+        if expires_at is not None and expires_at <= time.time():
+            return self._expired_copy(email_data)
+        return email_data
+
+    def _insert(self, key: EmailKey, email_data: Dict, op: str = 'add'):
+        self._record(op, key, email_data)
+        if op == 'add':
+            self.rates.record(email_data)
+        expires_at = self._expires_at(email_data)
+        if expires_at is not None:
+            heappush(self._expiry, (expires_at, key))
+        self._emails[key] = email_data
+        self._stable[self.stable_key(email_data)] = key
+        sort_key = self._sort_key(email_data, key)
+        self._order.add(sort_key)
+        for index, values in self._index_values(email_data).items():
+            for value in values:
+                self._indexes[index].setdefault(value, SortedKeys()).add(sort_key)
+
+    def _delete(self, key: EmailKey, record: bool = True) -> Optional[Dict]:
+        email_data = self._emails.pop(key, None)
+        if email_data is None:
+            return None
+        if record:
+            self._record('remove', key, email_data)
+        stable = self.stable_key(email_data)
+        if self._stable.get(stable) == key:
+            del self._stable[stable]
+        sort_key = self._sort_key(email_data, key)
+        self._order.remove(sort_key)
+        for index, values in self._index_values(email_data).items():
+            for value in values:
+                keys = self._indexes[index].get(value)
+                if keys is not None:
+                    keys.remove(sort_key)
+                    if not keys:
+                        del self._indexes[index][value]
+        return email_data
+
+    def add(self, email_data: Dict) -> bool:
+        """Agrega un correo; devuelve False si ya estaba"""
+        key = self.key(email_data)
+        with self.lock:
+            if key in self._emails:
+                return False
+            email_data = self._prepare(email_data)
+            if self.stable_key(email_data) in self._stable:
+                return False
+            self._insert(key, email_data)
+            return True
+
+    def add_many(self, emails: Iterable[Dict]) -> List[Dict]:
+        """Agrega varios correos y devuelve los que no estaban"""
+        with self.lock:
+            return [e for e in emails if self.add(e)]
+
+    def upsert(self, email_data: Dict) -> bool:
+        """Agrega o reemplaza un correo; devuelve True si es nuevo"""
+        key = self.key(email_data)
+        with self.lock:
+            email_data = self._prepare(email_data)
+            existing = self._emails.get(key)
+            if existing == email_data:
+                return False
+            self._delete(key, record=False)
+            self._insert(key, email_data, op='add' if existing is None else 'update')
+            return existing is None
+
+    def remove(self, key: EmailKey) -> Optional[Dict]:
+        with self.lock:
+            return self._delete(key)
+
+    def reconcile(self, found: List[Dict], resynced: Iterable[str] = (),
+                  since: Optional[int] = None) -> Reconciliation:
+        """
+        Compara una verificación completa con el almacén por clave estable.
+
+        Cada correo encontrado es un alta (no estaba), un cambio (estaba con otro
+        contenido o con otro UID) o nada. Las bajas sólo se calculan para las
+        cuentas resincronizadas, las únicas cuya verificación trae el buzón entero;
+        con since (la versión del almacén al empezar la verificación) los correos
+        agregados mientras corría (ej. por IDLE) no se dan de baja.
+        """
+        result = Reconciliation()
+        found_stable = set()
+        with self.lock:
+            for email_data in found:
+                email_data = self._prepare(email_data)
+                stable = self.stable_key(email_data)
+                if stable in found_stable:
+                    continue
+                found_stable.add(stable)
+                current = self._stable.get(stable)
+                if current is not None and self._emails[current].accounts and not email_data.accounts:
+                    # Las cuentas de las copias reenviadas no vienen en la verificación
+                    email_data = email_data.replace(accounts=self._emails[current].accounts)
+                if current is None:
+                    result.inserts.append(email_data)
+                elif self._emails[current] != email_data:
+                    result.updates.append((current, email_data))
+
+            resynced = set(resynced)
+            recent = set()
+            if since is not None and resynced:
+                changes = self.changes_since(since)
+                # Sin el feed completo no se sabe qué llegó durante la verificación: no se da de baja nada
+                recent = None if changes is None else {key for _, op, key, _ in changes if op == 'add'}
+            for account in resynced if recent is not None else ():
+                index = self._indexes['account'].get(account)
+                for key in index.keys() if index else ():
+                    if key not in recent and self.stable_key(self._emails[key]) not in found_stable:
+                        result.tombstones.append(key)
+        return result
+
+    def apply(self, reconciliation: Reconciliation):
+        """Aplica altas, cambios y bajas: O(cambios), sin tocar el resto del almacén"""
+        with self.lock:
+            for key in reconciliation.tombstones:
+                self._delete(key)
+            for current, email_data in reconciliation.updates:
+                key = self.key(email_data)
+                # Si cambió el UID (ej. nuevo UIDVALIDITY) la clave vieja desaparece del feed
+                self._delete(current, record=key != current)
+                self._insert(key, email_data, op='update')
+            for email_data in reconciliation.inserts:
+                key = self.key(email_data)
+                # Mismo UID pero otro mensaje (UIDVALIDITY nuevo): reemplaza al anterior
+                self._delete(key)
+                self._insert(key, email_data)
+
+    def attach_account(self, key: EmailKey, account: str) -> bool:
+        """
+        Agrega una cuenta donde llegó una copia del correo (ver MessageDedupe).
+        El correo sigue indexado por su cuenta original.
+
+        Returns:
+            False si el correo no está en el almacén
+        """
+        with self.lock:
+            email_data = self._emails.get(key)
+            if email_data is None:
+                return False
+            accounts = self.accounts_of(email_data)
+            if account not in accounts:
+                self._delete(key, record=False)
+                self._insert(key, email_data.replace(accounts=sys.intern(', '.join(accounts + [account]))), op='update')
+            return True
+
+    def merge_scan(self, found: List[Dict], resynced: Iterable[str] = (),
+                   cutoff: Optional[float] = None, since: Optional[int] = None) -> List[EmailRecord]:
+        """
+        Fusiona el resultado de una verificación completa (ver reconcile y apply).
+        Si se pasa cutoff se descartan los correos más antiguos.
+
+        Returns:
+            Lista de correos que no estaban en el almacén
+        """
+        with self.lock:
+            reconciliation = self.reconcile(found, resynced, since)
+            self.apply(reconciliation)
+            if cutoff is not None:
+                self.prune_older_than(cutoff)
+            return reconciliation.inserts
+
+    def prune_older_than(self, cutoff: float) -> int:
+        """Descarta los correos con fecha anterior a cutoff (los que no tienen fecha se conservan)"""
+        with self.lock:
+            stale = self._order.older_than(cutoff)
+            for key in stale:
+                self._delete(key)
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self._record('reset')
+            self._emails.clear()
+            self._order = SortedKeys()
+            self._indexes = {name: {} for name in self._indexes}
+            self._stable = {}
+            self._expiry = []
+            self.rates.clear()
+
+    def set_ttl(self, ttl: Dict[str, float]):
+        """Cambia los TTL por tipo y recalcula los vencimientos pendientes"""
+        with self.lock:
+            self.ttl = dict(ttl)
+            self._expiry = [(expires_at, key) for key, email_data in self._emails.items()
+                            for expires_at in [self._expires_at(email_data)] if expires_at is not None]
+            heapify(self._expiry)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Vence los correos cuyo TTL ya pasó: se reemplazan por su metadata (sin
+        cuerpos, con expired=True) y se registra un cambio 'expire'.
+
+        Returns:
+            Cantidad de correos vencidos
+        """
+        now = time.time() if now is None else now
+        expired = 0
+        with self.lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, key = heappop(self._expiry)
+                email_data = self._emails.get(key)
+                # Entradas viejas (correo quitado, reemplazado o TTL cambiado) se ignoran
+                if email_data is None or self._expires_at(email_data) != expires_at:
+                    continue
+                # Misma fecha e índices: basta con reemplazar el registro
+                email_data = self._expired_copy(email_data)
+                self._emails[key] = email_data
+                self._record('expire', key, email_data)
+                expired += 1
+        return expired
+
+    def next_expiry(self) -> Optional[float]:
+        """Momento del próximo vencimiento pendiente (None si no hay)"""
+        with self.lock:
+            return self._expiry[0][0] if self._expiry else None
+
+    # ── Lectura ─────────────────────────────────────────────────────────────
+
+    def changes_since(self, seq: int, epoch: str = None) -> Optional[List[tuple]]:
+        """
+        Cambios posteriores a `seq` como lista de (seq, op, clave, correo).
+
+        Returns:
+            La lista (vacía si está al día), o None si el cliente tiene que recargar
+            todo: el hueco ya salió del buffer, hubo un 'reset' o es de otro arranque
+        """
+        with self.lock:
+            if (epoch is not None and epoch != self.epoch) or seq > self.version:
+                return None
+            if seq == self.version:
+                return []
+            if not self._changes or self._changes[0][0] > seq + 1:
+                return None
+            start = seq + 1 - self._changes[0][0]
+            changes = list(islice(self._changes, start, None))
+        if any(op == 'reset' for _, op, _, _ in changes):
+            return None
+        return changes
+
+    def _select(self, account: str = None, email_type: str = None, to: str = None):
+        """
+        Elige el índice más chico entre los filtros pedidos.
+
+        Returns:
+            (índice a recorrer, filtros restantes) o None si algún filtro no tiene correos
+        """
+        to = to.lower() if to else None
+        if to and email_type:
+            # Destinatario + tipo tiene su propio índice (/api/latest, /api/wait)
+            filters = [(name, value) for name, value in
+                       (('account', account), ('to_type', (to, email_type))) if value]
+        else:
+            filters = [(name, value) for name, value in
+                       (('account', account), ('type', email_type), ('to', to)) if value]
+        if not filters:
+            return self._order, []
+        candidates = [(self._indexes[name].get(value), name, value) for name, value in filters]
+        if any(keys is None for keys, _, _ in candidates):
+            return None
+        candidates.sort(key=lambda c: len(c[0]))
+        return candidates[0][0], [(name, value) for _, name, value in candidates[1:]]
+
+    def page(self, account: str = None, email_type: str = None, to: str = None,
+             limit: int = None, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Página de correos ordenados del más nuevo al más viejo, filtrados por índice.
+
+        Con varios filtros se recorre el índice más chico y se verifican los demás.
+
+        Returns:
+            (correos, cursor de la página siguiente o None si no hay más)
+
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        after = self.decode_cursor(cursor) if cursor else None
+        if limit is not None and limit <= 0:
+            return [], None
+        with self.lock:
+            selected = self._select(account, email_type, to)
+            if selected is None:
+                return [], None
+            keys, others = selected
+
+            result = []
+            last = None   # posición del último correo de la página (el cursor)
+            for sort_key in keys.entries(after):
+                email_data = self._emails[sort_key[1]]
+                if others and not all(self._matches(email_data, name, value) for name, value in others):
+                    continue
+                if limit is not None and len(result) >= limit:
+                    return result, self.encode_cursor(last)
+                result.append(email_data)
+                last = sort_key
+            return result, None
+
+    def snapshot(self, account: str = None, email_type: str = None, to: str = None,
+                 limit: int = None) -> List[Dict]:
+        """Correos ordenados del más nuevo al más viejo, filtrados por índice"""
+        return self.page(account, email_type, to, limit=limit)[0]
+
+    def count(self, account: str = None, email_type: str = None, to: str = None) -> int:
+        """Cantidad de correos que cumplen los filtros (O(1) con un solo filtro)"""
+        with self.lock:
+            selected = self._select(account, email_type, to)
+            if selected is None:
+                return 0
+            keys, others = selected
+            if not others:
+                return len(keys)
+            return sum(1 for key in keys.keys()
+                       if all(self._matches(self._emails[key], name, value) for name, value in others))
+
+    def _matches(self, email_data: Dict, index: str, value: str) -> bool:
+        return value in self._index_values(email_data)[index]
+
+    def latest(self, to: str = None, email_type: str = None) -> Optional[Dict]:
+        """Correo más reciente para un destinatario y/o tipo: el primero de su índice"""
+        result = self.snapshot(to=to, email_type=email_type, limit=1)
+        return result[0] if result else None
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Totales por tipo y por cuenta, leídos directamente de los índices"""
+        with self.lock:
+            return {
+                'by_type': {value: len(keys) for value, keys in self._indexes['type'].items()},
+                'by_account': {value: len(keys) for value, keys in self._indexes['account'].items()},
+            }
+
+    def stats(self) -> Dict:
+        """
+        Totales y tasas de llegada. Los índices y los contadores se mantienen al
+        insertar, quitar y podar, así que el costo no crece con los correos guardados.
+        """
+        with self.lock:
+            stats = self.counts()
+            stats['total'] = len(self._emails)
+            stats['rates'] = self.rates.rates()
+            return stats
+
+
+class Waiter:
+    """Una espera de /api/wait: se completa con el primer correo que coincide"""
+
+    __slots__ = ('event', 'email_type', 'email')
+
+    def __init__(self, event, email_type: Optional[str]):
+        self.event = event
+        self.email_type = email_type
+        self.email: Optional[Dict] = None
+
+
+class RecipientWaiters:
+    """
+    Esperas de long-poll por destinatario (/api/wait).
+
+    Cada espera es un evento registrado bajo la dirección del destinatario; al
+    guardarse un correo se despiertan sólo las esperas de sus destinatarios, sin
+    que nadie consulte el almacén en bucle. El evento lo crea event_factory, así
+    que con un servidor asíncrono (eventlet/gevent) una espera es un greenlet y
+    no un hilo del sistema. Con el servidor por hilos cada espera ocupa un hilo
+    mientras dura: max_waiters es el tope de hilos tomados por esperas.
+    """
+
+    def __init__(self, event_factory: Callable = threading.Event, max_waiters: int = 500):
+        """
+        Args:
+            event_factory: Fábrica de eventos (ej: socketio.server.eio.create_event)
+            max_waiters: Máximo de esperas simultáneas
+        """
+        self.event_factory = event_factory
+        self.max_waiters = max_waiters
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[Waiter]] = {}   # dirección → esperas
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def register(self, to: str, email_type: str = None) -> Waiter:
+        """
+        Registra una espera; devolver siempre con unregister().
+
+        Raises:
+            OverflowError: Si ya hay max_waiters esperas activas
+        """
+        waiter = Waiter(self.event_factory(), email_type)
+        with self._lock:
+            if self._count >= self.max_waiters:
+                raise OverflowError("Demasiadas esperas simultáneas")
+            self._waiters.setdefault(to.lower(), []).append(waiter)
+            self._count += 1
+        return waiter
+
+    def unregister(self, to: str, waiter: Waiter):
+        with self._lock:
+            waiters = self._waiters.get(to.lower())
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                self._count -= 1
+                if not waiters:
+                    del self._waiters[to.lower()]
+
+    def wait(self, waiter: Waiter, timeout: float) -> Optional[Dict]:
+        """Bloquea hasta que llegue un correo para la espera o venza el timeout"""
+        waiter.event.wait(timeout)
+        return waiter.email
+
+    def notify(self, changes: Iterable[tuple]):
+        """Despierta las esperas de los destinatarios de los correos agregados"""
+        with self._lock:
+            if not self._waiters:
+                return
+            for _, op, _, email_data in changes:
+                if op != 'add':
+                    continue
+                for address in EmailStore.recipients(email_data.get('to')):
+                    for waiter in self._waiters.get(address, ()):
+                        if waiter.email is None and waiter.email_type in (None, email_data.get('type')):
+                            waiter.email = email_data
+                            waiter.event.set()
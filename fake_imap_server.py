@@ -0,0 +1,290 @@
+"""
+Servidor IMAP falso en memoria para benchmarks locales (no usar en producción).
+
+Implementa el subconjunto de IMAP4rev1 que usa gmail_service.IMAPService:
+LOGIN, CAPABILITY, ENABLE, SELECT, (UID) SEARCH, (UID) FETCH, IDLE, NOOP,
+CLOSE y LOGOUT. Simula la latencia de red por comando respetando el pipeline
+(los comandos enviados juntos pagan un solo round trip).
+"""
+import re
+import queue
+import socketserver
+import threading
+import time
+import email.utils
+from email.message import EmailMessage
+
+
+class Mailbox:
+    """Buzón INBOX en memoria compartido por todas las conexiones del servidor"""
+
+    def __init__(self, uidvalidity=1):
+        self.lock = threading.Lock()
+        self.uidvalidity = uidvalidity
+        self.messages = []  # list of dict(uid, raw, modseq, msgid)
+        self.next_uid = 1
+        self.modseq = 1
+        self.listeners = []
+
+    def append(self, raw):
+        """Agrega un mensaje y avisa EXISTS a las conexiones con el buzón seleccionado"""
+        with self.lock:
+            self.modseq += 1
+            m = {'uid': self.next_uid, 'raw': raw, 'modseq': self.modseq, 'msgid': 10**15 + self.next_uid}
+            self.next_uid += 1
+            self.messages.append(m)
+            n = len(self.messages)
+            listeners = list(self.listeners)
+        for cb in listeners:
+            cb(f'* {n} EXISTS')
+
+
+def make_message(subject, body, to='user@example.com', html=True, date=None):
+    """Arma un correo de Netflix en bytes (RFC822) para cargar en el buzón"""
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = 'Netflix <info@account.netflix.com>'
+    msg['To'] = to
+    msg['Date'] = email.utils.format_datetime(date) if date else email.utils.formatdate(localtime=True)
+    msg['Message-ID'] = email.utils.make_msgid(domain='netflix.com')
+    if html:
+        msg.set_content('texto plano')
+        msg.add_alternative(body, subtype='html')
+    else:
+        msg.set_content(body)
+    return msg.as_bytes()
+
+
+def parse_set(spec, maxval):
+    """Expande un conjunto IMAP ("1:3,7,9:*") a una lista de números"""
+    out = []
+    for part in spec.split(','):
+        if ':' in part:
+            a, b = part.split(':')
+            a = maxval if a == '*' else int(a)
+            b = maxval if b == '*' else int(b)
+            if a > b:
+                a, b = b, a
+            out.extend(range(a, b + 1))
+        else:
+            out.append(maxval if part == '*' else int(part))
+    return out
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Una sesión IMAP por conexión"""
+
+    def send(self, s):
+        if isinstance(s, str):
+            s = s.encode()
+        self.server.bytes_sent += len(s)
+        self.wfile.write(s)
+        self.wfile.flush()
+
+    def _read_commands(self, queue):
+        """Lee comandos apenas llegan y los marca con la hora de recepción"""
+        while True:
+            line = self.rfile.readline()
+            queue.put((time.monotonic(), line))
+            if not line:
+                return
+
+    def handle(self):
+        srv = self.server
+        box = srv.mailbox
+        self.idling = False
+        self.queued = []   # EXISTS recibidos fuera de IDLE: salen antes de la próxima respuesta
+        self.wlock = threading.Lock()
+        try:
+            self.session(srv, box)
+        finally:
+            with box.lock:
+                if self.notify in box.listeners:
+                    box.listeners.remove(self.notify)
+
+    def session(self, srv, box):
+        self.send(b'* OK [CAPABILITY IMAP4rev1 IDLE UIDPLUS CONDSTORE ENABLE X-GM-EXT-1] fake ready\r\n')
+        commands = queue.Queue()
+        threading.Thread(target=self._read_commands, args=(commands,), daemon=True).start()
+        while True:
+            received, line = commands.get()
+            if not line:
+                return
+            srv.commands += 1
+            # Cada comando responde `latency` segundos después de recibirse:
+            # los comandos en pipeline se superponen en lugar de sumarse
+            delay = received + srv.latency - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            line = line.decode().rstrip('\r\n')
+            if self.idling:
+                if line == 'DONE':
+                    with self.wlock:
+                        self.idling = False
+                        self.send(f'{self.idle_tag} OK IDLE terminated\r\n')
+                continue
+            tag, _, rest = line.partition(' ')
+            cmd, _, args = rest.partition(' ')
+            cmd = cmd.upper()
+            uid = False
+            if cmd == 'UID':
+                uid = True
+                cmd, _, args = args.partition(' ')
+                cmd = cmd.upper()
+            with self.wlock:
+                # Lo que cambió en el buzón se anuncia antes de la respuesta del próximo
+                # comando (SELECT ya informa el estado nuevo)
+                queued, self.queued = self.queued, []
+                if cmd not in ('SELECT', 'EXAMINE'):
+                    for notice in queued:
+                        self.send(notice + '\r\n')
+            if cmd == 'LOGIN':
+                self.send(f'{tag} OK LOGIN completed\r\n')
+            elif cmd == 'CAPABILITY':
+                self.send(f'* CAPABILITY IMAP4rev1 IDLE UIDPLUS CONDSTORE ENABLE X-GM-EXT-1\r\n{tag} OK CAPABILITY completed\r\n')
+            elif cmd in ('SELECT', 'EXAMINE'):
+                with box.lock:
+                    n = len(box.messages)
+                    if self.notify not in box.listeners:
+                        box.listeners.append(self.notify)
+                    self.send(f'* {n} EXISTS\r\n* 0 RECENT\r\n* OK [UIDVALIDITY {box.uidvalidity}] ok\r\n'
+                              f'* OK [UIDNEXT {box.next_uid}] ok\r\n* OK [HIGHESTMODSEQ {box.modseq}] ok\r\n'
+                              f'{tag} OK [READ-WRITE] SELECT completed\r\n')
+            elif cmd == 'ENABLE':
+                self.send(f'* ENABLED {args}\r\n{tag} OK ENABLE completed\r\n')
+            elif cmd in ('NOOP', 'CHECK'):
+                self.send(f'{tag} OK NOOP completed\r\n')
+            elif cmd == 'CLOSE':
+                self.send(f'{tag} OK CLOSE completed\r\n')
+            elif cmd == 'LOGOUT':
+                self.send(f'* BYE\r\n{tag} OK LOGOUT completed\r\n')
+                return
+            elif cmd == 'IDLE':
+                with self.wlock:
+                    self.idling = True
+                    self.idle_tag = tag
+                    self.send(b'+ idling\r\n')
+            elif cmd == 'SEARCH':
+                self.search(tag, args, uid)
+            elif cmd == 'FETCH':
+                self.fetch(tag, args, uid)
+            elif cmd == 'STORE':
+                self.send(f'{tag} OK STORE completed\r\n')
+            else:
+                self.send(f'{tag} BAD unknown command\r\n')
+
+    def notify(self, line):
+        """Envía una respuesta no etiquetada (en IDLE enseguida, si no con la próxima respuesta)"""
+        with self.wlock:
+            if not self.idling:
+                self.queued.append(line)
+                return
+            try:
+                self.send(line + '\r\n')
+            except OSError:
+                pass
+
+    def search(self, tag, args, uid):
+        """SEARCH: sólo filtra por UID y MODSEQ; los criterios de texto/fecha se ignoran"""
+        box = self.server.mailbox
+        with box.lock:
+            msgs = list(enumerate(box.messages, 1))
+        m = re.search(r'UID (\S+)', args)
+        if m:
+            ids = set(parse_set(m.group(1), box.next_uid - 1 or 1))
+            msgs = [(i, x) for i, x in msgs if x['uid'] in ids]
+        m = re.search(r'MODSEQ (\d+)', args)
+        if m:
+            ms = int(m.group(1))
+            msgs = [(i, x) for i, x in msgs if x['modseq'] >= ms]
+        res = ' '.join(str(x['uid'] if uid else i) for i, x in msgs)
+        self.send(f'* SEARCH {res}\r\n{tag} OK SEARCH completed\r\n'.replace('SEARCH \r\n', 'SEARCH\r\n'))
+
+    def fetch(self, tag, args, uid):
+        """FETCH: UID, FLAGS, MODSEQ, X-GM-MSGID, RFC822, BODY[] y secciones HEADER/TEXT parciales"""
+        box = self.server.mailbox
+        spec, _, items = args.partition(' ')
+        items = items.strip()
+        if items.startswith('(') and items.endswith(')'):
+            items = items[1:-1]
+        with box.lock:
+            msgs = list(enumerate(box.messages, 1))
+            maxuid = box.next_uid - 1
+            n = len(msgs)
+        if uid:
+            wanted = set(parse_set(spec, maxuid or 1))
+            sel = [(i, x) for i, x in msgs if x['uid'] in wanted]
+        else:
+            wanted = set(parse_set(spec, n or 1))
+            sel = [(i, x) for i, x in msgs if i in wanted]
+        tokens = re.findall(r'BODY(?:\.PEEK)?\[[^\]]*\](?:<\d+(?:\.\d+)?>)?|[A-Z0-9.\-]+', items.upper())
+        if uid and 'UID' not in tokens:
+            tokens.insert(0, 'UID')
+        out = bytearray()
+        for i, x in sel:
+            parts = []
+            raw = x['raw']
+            for t in tokens:
+                if t == 'UID':
+                    parts.append(f'UID {x["uid"]}'.encode())
+                elif t == 'FLAGS':
+                    parts.append(b'FLAGS ()')
+                elif t == 'MODSEQ':
+                    parts.append(f'MODSEQ ({x["modseq"]})'.encode())
+                elif t == 'X-GM-MSGID':
+                    parts.append(f'X-GM-MSGID {x["msgid"]}'.encode())
+                elif t == 'RFC822.SIZE':
+                    parts.append(f'RFC822.SIZE {len(raw)}'.encode())
+                elif t in ('RFC822', 'BODY[]', 'BODY.PEEK[]'):
+                    name = 'RFC822' if t == 'RFC822' else 'BODY[]'
+                    parts.append(f'{name} {{{len(raw)}}}\r\n'.encode() + raw)
+                elif t.startswith('BODY'):
+                    m = re.match(r'BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)(?:\.(\d+))?>)?', t)
+                    section, start, length = m.group(1), m.group(2), m.group(3)
+                    head, _, body = raw.partition(b'\r\n\r\n') if b'\r\n\r\n' in raw else raw.partition(b'\n\n')
+                    if section == 'TEXT':
+                        data = body
+                    elif section.startswith('HEADER.FIELDS'):
+                        names = re.search(r'\((.*)\)', section).group(1).split()
+                        hdrs = re.split(rb'\r?\n(?![ \t])', head)
+                        data = b'\r\n'.join(h for h in hdrs if h.split(b':')[0].upper().decode() in names) + b'\r\n\r\n'
+                    elif section == 'HEADER':
+                        data = head + b'\r\n\r\n'
+                    else:
+                        data = raw
+                    name = f'BODY[{section}]'
+                    if start is not None:
+                        s0 = int(start)
+                        data = data[s0:s0 + int(length)] if length else data[s0:]
+                        name += f'<{start}>'
+                    parts.append(f'{name} {{{len(data)}}}\r\n'.encode() + data)
+            out += f'* {i} FETCH ('.encode() + b' '.join(parts) + b')\r\n'
+        out += f'{tag} OK FETCH completed\r\n'.encode()
+        self.send(bytes(out))
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """
+    Servidor IMAP falso en 127.0.0.1 (puerto libre aleatorio).
+
+    Args:
+        latency: Round trip simulado en segundos por comando
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.mailbox = Mailbox()
+        self.latency = latency
+        self.commands = 0
+        self.bytes_sent = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    @property
+    def port(self):
+        return self.server_address[1]
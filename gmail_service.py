@@ -1,12 +1,21 @@
 import imaplib
 import email
-from email.header import decode_header
+import html
+import quopri
 import re
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Callable, Iterator, Optional
 import logging
-from email.utils import parsedate_to_datetime
 import time
+import socket
+import threading
+from concurrent.futures import CancelledError, Executor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import ingest
+from imap_pool import IMAPConnectionPool
+from message_dedupe import MessageDedupe
+from message_parser import InlineExecutor, create_parse_executor, decode_mime_words, get_email_body, parse_message
+from netflix_parser import CLASSIFIER, NETFLIX_PATTERNS, extract_code_or_link
 
 logger = logging.getLogger(__name__)
 
@@ -17,47 +26,62 @@ class IMAPService:
     IMAP_SERVER = 'imap.gmail.com'
     IMAP_PORT = 993
     
-    # Patrones para identificar correos de Netflix
-    NETFLIX_PATTERNS = {
-        'codigo_inicio': [
-            r'c[oó]digo de inicio',
-            r'sign-in code',
-            r'verification code',
-            r'c[oó]digo de verificaci[oó]n'
-        ],
-        'codigo_temporal': [
-            r'c[oó]digo de acceso temporal',
-            r'c[oó]digo temporal',
-            r'obtener c[oó]digo',
-            r'temporary code',
-            r'temporary access code',
-            r'one-time code',
-            r'c[oó]digo de un solo uso'
-        ],
-        'actualizacion_hogar': [
-            r'actualizaci[oó]n de hogar',
-            r'actualizar tu hogar',
-            r'confirmar hogar',
-            r'household update',
-            r'update your netflix household',
-            r'manage your household',
-            r'administra tu hogar',
-            r'¿solicitaste actualizar',
-            r'actualizar.*?hogar'
-        ]
-    }
+    # Respuestas no etiquetadas que puede enviar el servidor durante IDLE
+    IDLE_RESPONSE_RE = re.compile(r'\*\s+(\d+)\s+(EXISTS|EXPUNGE|FETCH)\b', re.IGNORECASE)
     
-    def __init__(self, email_address: str, password: str):
+    # Fase 1 del fetch: encabezados útiles + inicio del cuerpo (PEEK no marca como leído)
+    PREVIEW_BYTES = 4096
+    PREVIEW_FETCH_ITEMS = (
+        '(UID BODY.PEEK[HEADER.FIELDS (SUBJECT FROM TO DATE DELIVERED-TO X-FORWARDED-TO MESSAGE-ID '
+        f'CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] BODY.PEEK[TEXT]<0.{PREVIEW_BYTES}>)'
+    )
+    # Partes del inicio del cuerpo que no se ven: <head>, <style> y <script> (aunque estén cortados)
+    HIDDEN_HTML_RE = re.compile(r'<(head|style|script)\b.*?(</\1\s*>|$)', re.IGNORECASE | re.DOTALL)
+    HTML_TAG_RE = re.compile(r'<[^>]*>?')
+    MIME_LINE_RE = re.compile(r'^(--\S*|(content-[\w-]+|mime-version):.*)$', re.IGNORECASE | re.MULTILINE)
+    FETCH_START_RE = re.compile(rb'^\* \d+ FETCH \(', re.IGNORECASE)
+    FETCH_LITERAL_RE = re.compile(rb'\{(\d+)\}\r?\n$')
+    FETCH_SECTION_RE = re.compile(rb'(BODY\[[^\]]*\](?:<\d+>)?|RFC822)\s*\{\d+\}\r?\n$', re.IGNORECASE)
+    FETCH_MSGID_RE = re.compile(rb'X-GM-MSGID (\d+)', re.IGNORECASE)
+    
+    # Patrones para identificar correos de Netflix (ver netflix_parser)
+    NETFLIX_PATTERNS = NETFLIX_PATTERNS
+    
+    def __init__(self, email_address: str, password: str, timeout: Optional[float] = None,
+                 fetch_batch_size: int = 50, dedupe: Optional[MessageDedupe] = None,
+                 parse_executor: Optional[Executor] = None,
+                 rebuild_parser: Optional[Callable[[Executor], Executor]] = None):
         """
         Inicializa el servicio IMAP para Gmail
         
         Args:
             email_address: Dirección de correo de Gmail
             password: Contraseña de aplicación de Gmail
+            timeout: Timeout en segundos para cada operación del socket (None = sin límite)
+            fetch_batch_size: Máximo de mensajes pedidos en cada comando FETCH
+            dedupe: Deduplicación compartida entre cuentas (correos reenviados a varias)
+            parse_executor: Executor donde corre parse_message (None = en este hilo)
+            rebuild_parser: Recibe el executor de parseo roto y devuelve uno nuevo
+                            (None = parsear en este hilo cuando se rompe)
         """
         self.email_address = email_address
         self.password = password
+        self.timeout = timeout
+        self.fetch_batch_size = fetch_batch_size
+        self.dedupe = dedupe
+        self.parse_executor = parse_executor
+        self.rebuild_parser = rebuild_parser
+        self._broken_parser = None
         self.mail = None
+        self.condstore = False
+        self.uidvalidity = None
+        self.aborted = False
+        self.sync_cursor = None
+        self.resynced = False
+        self.idle_pending = []    # respuestas no etiquetadas (EXISTS, EXPUNGE…) todavía sin atender
+        self.idle_since = None
+        self.idle_last_uid = None
+        self._idle_tag = None
         self.imap_server = self.IMAP_SERVER
         self.imap_port = self.IMAP_PORT
         
@@ -65,8 +89,9 @@ class IMAPService:
         """Conecta al servidor IMAP"""
         try:
             logger.info(f"Conectando a Gmail ({self.imap_server}:{self.imap_port}) para {self.email_address}")
-            self.mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+            self.mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port, timeout=self.timeout)
             self.mail.login(self.email_address, self.password)
+            self._enable_condstore()
             logger.info(f"Conectado exitosamente a Gmail: {self.email_address}")
             return True
         except Exception as e:
@@ -82,62 +107,91 @@ class IMAPService:
                 logger.info(f"Desconectado de {self.email_address}")
             except:
                 pass
+
+    def _enable_condstore(self):
+        """Activa CONDSTORE (RFC 7162) si el servidor lo soporta, para recibir HIGHESTMODSEQ en SELECT"""
+        caps = self.mail.capabilities
+        self.condstore = False
+        if 'CONDSTORE' in caps and 'ENABLE' in caps:
+            try:
+                self.mail.enable('CONDSTORE')
+                self.condstore = True
+            except Exception as e:
+                logger.debug(f"[{self.email_address}] No se pudo activar CONDSTORE: {e}")
+
+    def _response_int(self, code: str) -> Optional[int]:
+        """Lee un código de respuesta numérico (UIDVALIDITY, UIDNEXT…) del último SELECT"""
+        _, data = self.mail.response(code)
+        try:
+            return int(data[-1])
+        except (TypeError, ValueError, IndexError):
+            return None
+
+    def select_inbox(self) -> Dict:
+        """
+        Selecciona INBOX y devuelve su estado de sincronización.
+
+        Returns:
+            Diccionario con 'uidvalidity', 'uidnext' y 'highestmodseq' (None si no aplica)
+        """
+        status, data = self.mail.select("INBOX")
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"No se pudo seleccionar INBOX: {data}")
+        mailbox = {
+            'exists': int(data[0]) if data and data[0] else 0,
+            'uidvalidity': self._response_int('UIDVALIDITY'),
+            'uidnext': self._response_int('UIDNEXT'),
+            'highestmodseq': self._response_int('HIGHESTMODSEQ') if self.condstore else None
+        }
+        self.uidvalidity = mailbox['uidvalidity']
+        # El estado recién seleccionado ya incluye lo anunciado antes
+        self.idle_pending = []
+        return mailbox
+
+    @property
+    def body_fetch_items(self) -> str:
+        """Mensaje completo y, en Gmail, su X-GM-MSGID (identificador estable entre sesiones y UIDVALIDITY)"""
+        if self.mail and 'X-GM-EXT-1' in self.mail.capabilities:
+            return "(UID X-GM-MSGID BODY.PEEK[])"
+        return "(UID BODY.PEEK[])"
+
+    def _uid_search(self, *criteria) -> List[bytes]:
+        """Ejecuta UID SEARCH y devuelve la lista de UIDs (vacía si falla)"""
+        status, messages = self.mail.uid('SEARCH', None, *criteria)
+        if status != "OK" or not messages or not messages[0]:
+            return []
+        return messages[0].split()
+
+    def _search_new_uids(self, last_uid: int) -> List[bytes]:
+        """Busca correos de Netflix con UID posterior al cursor de sincronización"""
+        uid_range = f'{last_uid + 1}:*'
+        try:
+            uids = self._uid_search('UID', uid_range, 'X-GM-RAW', '"from:netflix.com"')
+        except Exception:
+            # Fallback a búsqueda IMAP estándar si X-GM-RAW falla
+            uids = self._uid_search('UID', uid_range, 'FROM', '"netflix.com"')
+        # "n:*" devuelve siempre el último mensaje aunque su UID sea menor que n
+        return [uid for uid in uids if int(uid) > last_uid]
+
+    def abort(self):
+        """
+        Corta la conexión de forma abrupta desde otro hilo.
+        Desbloquea cualquier lectura en curso (la operación pendiente fallará).
+        """
+        self.aborted = True
+        if self.mail:
+            try:
+                self.mail.socket().shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
     
     def _decode_mime_words(self, s):
         """Decodifica palabras MIME en el encabezado"""
-        if s is None:
-            return ""
-        decoded_fragments = decode_header(s)
-        result = []
-        for fragment, encoding in decoded_fragments:
-            if isinstance(fragment, bytes):
-                if encoding:
-                    try:
-                        result.append(fragment.decode(encoding))
-                    except:
-                        result.append(fragment.decode('utf-8', errors='ignore'))
-                else:
-                    result.append(fragment.decode('utf-8', errors='ignore'))
-            else:
-                result.append(str(fragment))
-        return ''.join(result)
+        return decode_mime_words(s)
     
     def _get_email_body(self, msg):
         """Extrae el cuerpo del correo, priorizando HTML para una mejor visualización"""
-        html_body = ""
-        plain_body = ""
-        
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                if "attachment" in content_disposition:
-                    continue
-                    
-                if content_type == "text/html":
-                    try:
-                        html_body = part.get_payload(decode=True).decode()
-                    except:
-                        pass
-                elif content_type == "text/plain":
-                    try:
-                        plain_body = part.get_payload(decode=True).decode()
-                    except:
-                        pass
-        else:
-            try:
-                content_type = msg.get_content_type()
-                payload = msg.get_payload(decode=True).decode()
-                if content_type == "text/html":
-                    html_body = payload
-                else:
-                    plain_body = payload
-            except:
-                pass
-        
-        # Priorizar HTML para el visor original
-        return html_body if html_body else plain_body
+        return get_email_body(msg)
     
     def _classify_email(self, subject: str, body: str) -> str:
         """
@@ -146,120 +200,76 @@ class IMAPService:
         Returns:
             'codigo_inicio', 'codigo_temporal', 'actualizacion_hogar' o None
         """
-        text_to_search = (subject + " " + body).lower()
-        
-        for email_type, patterns in self.NETFLIX_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, text_to_search, re.IGNORECASE):
-                    return email_type
-        
-        return None
+        return CLASSIFIER.classify(subject, body)
     
     def _extract_code_or_link(self, body: str, email_type: str) -> str:
         """
-        Extrae el código o link según el tipo de correo usando BeautifulSoup para mayor precisión
+        Extrae el código o link según el tipo de correo (un solo recorrido del HTML)
         """
-        if not body:
-            return ""
-
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(body, 'html.parser')
-        
-        # 1. Caso: Código de Inicio (Numérico)
-        if email_type == 'codigo_inicio':
-            # Primero intentar extraer del texto plano para evitar tags intermedios
-            text_content = soup.get_text(separator=' ')
-            patterns = [
-                r'(?:código|code).*?(?:iniciar sesión|sign-?in|login).*?(\d{4,8})',
-                r'(?:iniciar sesión|sign-?in|login).*?(?:código|code).*?(\d{4,8})',
-                r'(?:ingresa|enter).*?(?:este|this).*?(?:código|code).*?(\d{4,8})',
-                r'(?:para|to).*?(?:iniciar sesión|sign in).*?(\d{4,8})',
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, text_content, re.IGNORECASE | re.DOTALL)
-                if match:
-                    return match.group(1)
-            
-            # Fallback a 4 dígitos aislados si hay contexto de login
-            if re.search(r'sign-?in|iniciar sesión', text_content, re.IGNORECASE):
-                match = re.search(r'\b(\d{4,6})\b', text_content)
-                if match:
-                    return match.group(1)
-
-        # 2. Caso: Links (Hogar o Temporal)
-        # Prioridad absoluta: Buscar el botón rojo de Netflix o links con estilo de botón
-        # Netflix suele usar tablas con background color o estilos inline para los botones
-        
-        # Buscar todos los enlaces
-        all_links = soup.find_all('a', href=True)
-        
-        # Filtrar por prioridad
-        primary_link = None
-        
-        # Prioridad 1: Enlaces que contienen palabras clave en su texto (ej: "Sí, la envié yo", "Obtener código")
-        button_keywords = [
-            'sí, la envié yo', 'si, la envie yo', 'obtener código', 'obtener codigo', 
-            'get code', 'verify', 'update', 'actualizar', 'confirmar', 'yes, this was me'
-        ]
-        
-        for link in all_links:
-            link_text = link.get_text().lower().strip()
-            link_href = link['href']
-            
-            # Solo procesar links de netflix.com
-            if 'netflix.com' not in link_href:
-                continue
-                
-            # Evitar links de ayuda o legales
-            if any(word in link_href.lower() for word in ['help', 'privacy', 'unsubscribe', 'terms', 'contact']):
-                continue
-
-            # Si el texto coincide con un botón, es casi seguro que es el correcto
-            if any(keyword in link_text for keyword in button_keywords):
-                primary_link = link_href
-                break
-        
-        # Prioridad 2: Si no se encontró por texto, buscar en los patrones de URL (nmv, access, household)
-        if not primary_link:
-            patterns = []
-            if email_type == 'actualizacion_hogar':
-                patterns = [r'/household/', r'/update-household/', r'/update-primary-location/']
-            elif email_type == 'codigo_temporal':
-                patterns = [r'/temporary-access/', r'/access/', r'/otp/', r'/nmv/']
-                
-            for link in all_links:
-                link_href = link['href']
-                if 'netflix.com' in link_href:
-                    if any(re.search(p, link_href, re.IGNORECASE) for p in patterns):
-                        primary_link = link_href
-                        break
-
-        # Prioridad 3: Último recurso, el primer link de netflix que no sea basura
-        if not primary_link:
-            for link in all_links:
-                link_href = link['href']
-                if 'netflix.com' in link_href and not any(word in link_href.lower() for word in ['help', 'privacy', 'unsubscribe']):
-                    primary_link = link_href
-                    break
-                    
-        return primary_link if primary_link else ""
+        return extract_code_or_link(body, email_type)
     
-    def fetch_netflix_emails(self, days_back: int = 7) -> List[Dict]:
+    def fetch_netflix_emails(self, days_back: int = 7, cursor: Optional[Dict] = None) -> List[Dict]:
+        """Lista completa de stream_netflix_emails (ver allí los argumentos y el cursor)"""
+        return list(self.stream_netflix_emails(days_back, cursor))
+
+    def stream_netflix_emails(self, days_back: int = 7, cursor: Optional[Dict] = None) -> Iterator[Dict]:
         """
-        Obtiene correos de Netflix de los últimos N días
+        Entrega los correos de Netflix de los últimos N días a medida que se parsean
+        
+        Si se pasa un cursor de sincronización con el mismo UIDVALIDITY que el buzón,
+        sólo se descargan los correos con UID posterior al cursor (y nada si
+        HIGHESTMODSEQ no cambió). Si UIDVALIDITY cambió se hace una resincronización
+        completa de los últimos N días. Al agotar el generador el cursor actualizado
+        queda en self.sync_cursor y self.resynced indica si hubo resincronización completa.
         
         Args:
             days_back: Número de días hacia atrás para buscar
+            cursor: Cursor previo {'uidvalidity', 'last_uid', 'modseq'} o None
             
-        Returns:
-            Lista de diccionarios con información de los correos
+        Yields:
+            Diccionarios con información de los correos, los más nuevos primero
         """
         if not self.mail:
             self.connect()
         
         # Seleccionar la bandeja de entrada
-        self.mail.select("INBOX")
-        
+        mailbox = self.select_inbox()
+
+        incremental = bool(cursor) and cursor.get('uidvalidity') == mailbox['uidvalidity']
+        if cursor and not incremental:
+            logger.info(f"[{self.email_address}] UIDVALIDITY cambió "
+                        f"({cursor.get('uidvalidity')} → {mailbox['uidvalidity']}), resincronizando")
+        self.resynced = not incremental
+        last_uid = cursor['last_uid'] if incremental else 0
+
+        if incremental:
+            if mailbox['highestmodseq'] and mailbox['highestmodseq'] == cursor.get('modseq'):
+                logger.info(f"[{self.email_address}] Sin cambios desde la última sincronización")
+                self.sync_cursor = dict(cursor)
+                return
+
+            logger.info(f"[{self.email_address}] Sincronización incremental desde UID {last_uid + 1}")
+            email_ids = self._search_new_uids(last_uid)
+        else:
+            email_ids = self._search_by_date(days_back)
+            if email_ids is None:
+                logger.warning(f"[{self.email_address}] Error al ejecutar búsqueda IMAP")
+                return
+
+        yield from self._stream_classified(email_ids)
+
+        # Todo lo anterior a UIDNEXT ya fue evaluado por la búsqueda
+        highest = max([last_uid] + [int(uid) for uid in email_ids])
+        if mailbox['uidnext']:
+            highest = max(highest, mailbox['uidnext'] - 1)
+        self.sync_cursor = {
+            'uidvalidity': mailbox['uidvalidity'],
+            'last_uid': highest,
+            'modseq': mailbox['highestmodseq']
+        }
+
+    def _search_by_date(self, days_back: int) -> Optional[List[bytes]]:
+        """Busca por fecha los UIDs de correos de Netflix de los últimos N días (None si falla)"""
         # Calcular fecha de búsqueda (formato IMAP: 17-Feb-2026)
         # Usamos days_back + 1 para asegurar que no se pierdan correos del borde del día
         search_date = (datetime.now() - timedelta(days=days_back + 1)).strftime("%d-%b-%Y")
@@ -272,91 +282,261 @@ class IMAPService:
             # Usamos una búsqueda más amplia (un día extra atrás) para evitar problemas de zona horaria
             search_query = f'from:netflix.com after:{(datetime.now() - timedelta(days=days_back + 1)).strftime("%Y/%m/%d")}'
             logger.info(f"[{self.email_address}] Buscando con query: {search_query}")
-            status, messages = self.mail.search(None, 'X-GM-RAW', search_query)
+            status, messages = self.mail.uid('SEARCH', None, 'X-GM-RAW', f'"{search_query}"')
         except:
             # Fallback a búsqueda IMAP estándar si X-GM-RAW falla
-            search_date = (datetime.now() - timedelta(days=days_back + 1)).strftime("%d-%b-%Y")
-            status, messages = self.mail.search(None, f'(FROM "netflix.com" SINCE {search_date})')
+            status, messages = self.mail.uid('SEARCH', None, f'(FROM "netflix.com" SINCE {search_date})')
         
         if status != "OK" or not messages[0]:
             # Segundo intento: buscar por palabra "Netflix"
             logger.info(f"[{self.email_address}] Reintentando búsqueda general...")
-            search_date = (datetime.now() - timedelta(days=days_back + 1)).strftime("%d-%b-%Y")
-            status, messages = self.mail.search(None, f'(SUBJECT "Netflix" SINCE {search_date})')
+            status, messages = self.mail.uid('SEARCH', None, f'(SUBJECT "Netflix" SINCE {search_date})')
         
         if status != "OK":
-            logger.warning(f"[{self.email_address}] Error al ejecutar búsqueda IMAP")
-            return []
+            return None
         
-        email_ids = messages[0].split()
+        return messages[0].split()
+
+    def _fetch_and_classify(self, email_ids: List[bytes]) -> List[Dict]:
+        """Lista completa de _stream_classified"""
+        return list(self._stream_classified(email_ids))
+
+    def _stream_classified(self, email_ids: List[bytes]) -> Iterator[Dict]:
+        """
+        Descarga por UID, clasifica y extrae el código de cada correo con el
+        pipeline de ingest, en dos fases:
+
+        1. Sólo encabezados seleccionados y los primeros PREVIEW_BYTES del cuerpo,
+           suficientes para descartar publicidad y otros correos sin código.
+        2. Mensaje completo únicamente para los candidatos de la fase 1 que no
+           sean copias de un correo ya reclamado por otra cuenta (ver _is_duplicate).
+
+        Cada fase pide los UIDs en lotes de fetch_batch_size (conjuntos compactos
+        como "1:50,60,72") enviados en pipeline, así que cuesta un solo round trip.
+        Cada correo se entrega en cuanto termina de parsearse.
+        """
         logger.info(f"[{self.email_address}] Encontrados {len(email_ids)} correos potenciales")
-        netflix_emails = []
-        
-        # Procesar cada correo
-        for email_id in email_ids:
-            try:
-                status, msg_data = self.mail.fetch(email_id, "(RFC822)")
-                
-                if status != "OK":
+        candidates = list(ingest.select_candidates(self, ingest.fetch_previews(self, email_ids)))
+        logger.info(f"[{self.email_address}] {len(candidates)} de {len(email_ids)} correos pasan el filtro de encabezados")
+
+        bodies = ingest.fetch_bodies(self, candidates)
+        yield from ingest.build_records(self, ingest.parse_bodies(self, bodies), reject=True)
+
+    @staticmethod
+    def _compact_uid_set(uids: List[int]) -> str:
+        """Convierte una lista de UIDs en un conjunto IMAP compacto: [1, 2, 3, 7] → 1:3,7"""
+        ranges = []
+        for uid in sorted(set(uids)):
+            if ranges and uid == ranges[-1][1] + 1:
+                ranges[-1][1] = uid
+            else:
+                ranges.append([uid, uid])
+        return ','.join(str(a) if a == b else f'{a}:{b}' for a, b in ranges)
+
+    def _stream_fetch(self, uids, items: str):
+        """
+        Ejecuta UID FETCH de muchos mensajes y entrega cada uno en cuanto llega.
+
+        Los UIDs se agrupan en lotes de fetch_batch_size; todos los comandos se
+        envían antes de leer la primera respuesta (pipeline) y la respuesta
+        multi-mensaje se parsea línea a línea en lugar de esperar a que termine.
+
+        Args:
+            uids: Lista de UIDs (int o bytes) o un conjunto IMAP ya armado ("5:*")
+            items: Elementos a pedir, ej. "(UID BODY.PEEK[])"
+
+        Yields:
+            (uid en bytes, {'HEADER'|'TEXT'|'BODY'|'X-GM-MSGID': bytes})
+
+        Raises:
+            imaplib.IMAP4.error: Algún lote terminó en NO/BAD. Se lanza después de
+            leer todas las respuestas (la conexión sigue sincronizada) para que el
+            cursor no avance sobre los mensajes que no llegaron.
+        """
+        if isinstance(uids, str):
+            uid_sets = [uids]
+        else:
+            uids = [int(uid) for uid in uids]
+            size = max(1, self.fetch_batch_size)
+            uid_sets = [self._compact_uid_set(uids[i:i + size]) for i in range(0, len(uids), size)]
+        if not uid_sets:
+            return
+
+        # Enviar todos los lotes de una vez
+        pending = []
+        for uid_set in uid_sets:
+            tag = self.mail._new_tag()
+            self.mail.send(tag + f' UID FETCH {uid_set} {items}\r\n'.encode())
+            pending.append((tag, uid_set))
+
+        failed = []
+        for tag, uid_set in pending:
+            while True:
+                line = self.mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Conexión cerrada por el servidor durante FETCH")
+                if line.startswith(tag + b' '):
+                    if not line[len(tag) + 1:].upper().startswith(b'OK'):
+                        failed.append(f"FETCH {uid_set} falló: {line.decode(errors='ignore').strip()}")
+                        logger.warning(f"[{self.email_address}] {failed[-1]}")
+                    break
+                if not self.FETCH_START_RE.match(line):
+                    if self.IDLE_RESPONSE_RE.match(line.decode(errors='ignore')):
+                        # EXISTS/EXPUNGE durante el FETCH: quedan para el próximo IDLE
+                        self.idle_pending.append(line.decode(errors='ignore').strip())
                     continue
-                
-                for response_part in msg_data:
-                    if isinstance(response_part, tuple):
-                        msg = email.message_from_bytes(response_part[1])
-                        
-                        # Decodificar asunto y remitente
-                        subject = self._decode_mime_words(msg["Subject"])
-                        from_address = self._decode_mime_words(msg["From"])
-                        
-                        # Estrategia para obtener el destinatario real
-                        # Priorizamos el "To" del header porque suele contener la cuenta original (digitalacc09...)
-                        to_address = self._decode_mime_words(msg["To"])
-                        
-                        # Si no hay, probamos otros (fallback)
-                        if not to_address:
-                            to_address = self._decode_mime_words(msg["Delivered-To"])
-                        if not to_address:
-                            to_address = self._decode_mime_words(msg["X-Forwarded-To"])
-                        
-                        # Extraer fecha real para ordenamiento
-                        date_str = msg["Date"]
-                        try:
-                            dt = parsedate_to_datetime(date_str)
-                            timestamp = dt.timestamp()
-                        except:
-                            timestamp = 0
-                        
-                        # Obtener cuerpo
-                        body = self._get_email_body(msg)
-                        
-                        # Clasificar el correo
-                        email_type = self._classify_email(subject, body)
-                        
-                        if email_type:
-                            # Extraer código o link según el tipo
-                            code = self._extract_code_or_link(body, email_type)
-                            
-                            netflix_emails.append({
-                                'id': email_id.decode(),
-                                'subject': subject,
-                                'from': from_address,
-                                'to': to_address,
-                                'date': date_str,
-                                'timestamp': timestamp,
-                                'type': email_type,
-                                'code': code,
-                                'body_preview': body[:200] if body else "",
-                                'body_full': body,
-                                'account': self.email_address
-                            })
-                            
-                            logger.info(f"Correo de Netflix encontrado: {subject} - Tipo: {email_type}")
-            
-            except Exception as e:
-                logger.error(f"Error al procesar correo {email_id}: {str(e)}")
-                continue
-        
-        return netflix_emails
+
+                uid = None
+                sections = {}
+                while True:
+                    if uid is None:
+                        match = re.search(rb'UID (\d+)', line)
+                        if match:
+                            uid = match.group(1)
+                    if 'X-GM-MSGID' not in sections:
+                        match = self.FETCH_MSGID_RE.search(line)
+                        if match:
+                            sections['X-GM-MSGID'] = match.group(1)
+                    literal = self.FETCH_LITERAL_RE.search(line)
+                    if not literal:
+                        break
+                    data = self.mail.read(int(literal.group(1)))
+                    section = self.FETCH_SECTION_RE.search(line)
+                    name = section.group(1).upper() if section else b''
+                    if name.startswith(b'BODY[HEADER'):
+                        sections['HEADER'] = data
+                    elif name.startswith(b'BODY[TEXT]'):
+                        sections['TEXT'] = data
+                    elif name:
+                        sections['BODY'] = data
+                    line = self.mail.readline()
+                    if not line:
+                        raise imaplib.IMAP4.abort("Conexión cerrada por el servidor durante FETCH")
+
+                if uid is not None:
+                    yield uid, sections
+
+        if failed:
+            raise imaplib.IMAP4.error('; '.join(failed))
+
+    def _is_candidate(self, header: bytes, preview: bytes) -> bool:
+        """
+        Decide con encabezados e inicio del cuerpo si vale la pena descargar el correo completo.
+
+        Ante la duda descarga: un cuerpo en base64 o quoted-printable no se puede
+        evaluar con un prefijo, y un prefijo que corta antes del texto visible (un
+        <head> con mucho CSS) no dice nada del correo.
+        """
+        try:
+            msg = email.message_from_bytes(header)
+            subject = self._decode_mime_words(msg["Subject"])
+            if self._classify_email(subject, "") is not None:
+                return True
+            encoding = str(msg['Content-Transfer-Encoding'] or '').strip().lower()
+            if encoding in ('base64', 'quoted-printable'):
+                # Cuerpo de una sola parte codificado: se evalúa completo
+                return True
+            if b'base64' in preview.lower():
+                # Alguna parte en base64: no se puede evaluar sin decodificar, se descarga completo
+                return True
+            text = html.unescape(quopri.decodestring(preview).decode('utf-8', errors='ignore'))
+            if self._classify_email(subject, text) is not None:
+                return True
+            if len(preview) < self.PREVIEW_BYTES:
+                return False
+            # Prefijo cortado dentro de <head>/<style> o sin texto visible todavía:
+            # el código puede estar más adelante
+            hidden = list(self.HIDDEN_HTML_RE.finditer(text))
+            if hidden and not hidden[-1].group(2):
+                return True
+            visible = self.HTML_TAG_RE.sub(' ', self.HIDDEN_HTML_RE.sub(' ', self.MIME_LINE_RE.sub(' ', text)))
+            return not visible.split()
+        except Exception as e:
+            logger.warning(f"[{self.email_address}] No se pudo evaluar el inicio del correo, se descarga: {str(e)}")
+            return True
+
+    def _is_duplicate(self, uid: bytes, header: bytes, preview: bytes) -> bool:
+        """
+        True si el mensaje es una copia (reenvío) de uno que otra cuenta ya reclamó:
+        no se descarga ni se parsea, la cuenta queda anotada para el correo original.
+        """
+        if self.dedupe is None:
+            return False
+        key = self.dedupe.message_key(header, preview)
+        owner = self.dedupe.claim(key, self.email_address, uid.decode())
+        if owner is None:
+            return False
+        logger.debug(f"[{self.email_address}] Correo {uid.decode()} duplicado de {owner[0]}:{owner[1]}")
+        return True
+
+    def _submit_parse(self, raw: bytes, require_netflix_sender: bool = False):
+        """
+        Envía parse_message al executor de parseo. Si el pool se rompió (un worker
+        murió) o se detuvo, lo reemplaza con rebuild_parser; si no hay reemplazo,
+        parsea en este hilo.
+        """
+        executor = self.parse_executor
+        if executor is not None:
+            try:
+                return executor.submit(parse_message, raw, require_netflix_sender)
+            except (BrokenProcessPool, RuntimeError) as e:
+                if self.rebuild_parser is not None:
+                    logger.warning(f"[{self.email_address}] Pool de parseo no disponible, se crea uno nuevo: {e}")
+                    self.parse_executor = self.rebuild_parser(executor)
+                    try:
+                        return self.parse_executor.submit(parse_message, raw, require_netflix_sender)
+                    except (BrokenProcessPool, RuntimeError) as retry_error:
+                        e = retry_error
+                logger.warning(f"[{self.email_address}] Pool de parseo no disponible, parseando en el hilo: {e}")
+        return InlineExecutor().submit(parse_message, raw, require_netflix_sender)
+
+    def _parse_result(self, future, raw: bytes, require_netflix_sender: bool = False) -> Optional[Dict]:
+        """
+        Resultado de _submit_parse. Si el pool se rompió con el mensaje adentro, se
+        parsea de nuevo en este hilo (el próximo _submit_parse reemplaza el pool);
+        lo mismo si shutdown_parser lo canceló antes de empezar.
+        """
+        try:
+            return future.result()
+        except CancelledError:
+            return parse_message(raw, require_netflix_sender)
+        except BrokenProcessPool as e:
+            if self._broken_parser is not self.parse_executor:
+                # Un aviso por pool roto, no uno por cada correo que tenía adentro
+                self._broken_parser = self.parse_executor
+                logger.warning(f"[{self.email_address}] Pool de parseo roto, los correos pendientes "
+                               f"se parsean en el hilo: {e}")
+            return parse_message(raw, require_netflix_sender)
+
+    def _build_record(self, email_id: bytes, fields: Optional[Dict], msgid: Optional[bytes] = None) -> Optional[Dict]:
+        """Completa los campos devueltos por parse_message con UID, cuenta y claves estables"""
+        if fields is None:
+            return None
+        logger.info(f"Correo de Netflix encontrado: {fields['subject']} - Tipo: {fields['type']}")
+        return {
+            'id': email_id.decode(),
+            **fields,
+            'account': self.email_address,
+            'gm_msgid': msgid.decode() if msgid else None,
+            'uidvalidity': self.uidvalidity
+        }
+
+    def _parse_message(self, email_id: bytes, raw: bytes, require_netflix_sender: bool = False,
+                       msgid: Optional[bytes] = None) -> Optional[Dict]:
+        """
+        Parsea un mensaje RFC822 en este hilo, lo clasifica y extrae el código o link.
+
+        Args:
+            email_id: UID del mensaje
+            raw: Mensaje completo en bytes
+            require_netflix_sender: Descartar correos cuyo remitente/asunto no mencione Netflix
+                                    (para mensajes que no pasaron por el filtro de búsqueda)
+            msgid: X-GM-MSGID del mensaje, si el servidor es Gmail
+
+        Returns:
+            Diccionario con la información del correo, o None si no es un correo de código
+        """
+        return self._build_record(email_id, parse_message(raw, require_netflix_sender), msgid)
     
     def mark_as_read(self, email_id: str):
         """Marca un correo como leído"""
@@ -366,46 +546,143 @@ class IMAPService:
         except Exception as e:
             logger.error(f"Error al marcar correo como leído: {str(e)}")
 
+    def start_idle(self):
+        """
+        Entra en modo IMAP IDLE sin bloquear esperando notificaciones.
+        Las respuestas no etiquetadas recibidas antes del "+ idling" (y las que
+        llegaron durante el último FETCH) quedan en self.idle_pending para no
+        perderlas: si no está vacío hay correo por atender sin esperar al socket.
+        """
+        tag = self.mail._new_tag()
+        self.mail.send(f'{tag.decode()} IDLE\r\n'.encode())
+
+        # Leer respuesta de confirmación "+ idling"
+        while True:
+            resp = self.mail.readline()
+            if not resp:
+                raise imaplib.IMAP4.abort("Conexión cerrada por el servidor al iniciar IDLE")
+            if resp.startswith(b'+'):
+                break
+            if resp.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE rechazado: {resp.decode(errors='ignore').strip()}")
+            self.idle_pending.append(resp.decode(errors='ignore').strip())
+
+        self._idle_tag = tag
+        self.idle_since = time.time()
+        logger.debug(f"[{self.email_address}] IDLE iniciado: {resp.decode(errors='ignore').strip()}")
+
+    def read_idle_line(self) -> str:
+        """Lee una respuesta no etiquetada mientras la conexión está en IDLE"""
+        line = self.mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Conexión cerrada por el servidor durante IDLE")
+        return line.decode(errors='ignore').strip()
+
+    @property
+    def idling(self) -> bool:
+        """True entre start_idle y stop_idle"""
+        return self._idle_tag is not None
+
+    def stop_idle(self) -> List[str]:
+        """
+        Sale de IDLE (DONE) y consume la respuesta final del servidor.
+
+        Returns:
+            Respuestas no etiquetadas pendientes (EXISTS, FETCH, EXPUNGE…)
+        """
+        tag = self._idle_tag
+        self._idle_tag = None
+        self.mail.send(b'DONE\r\n')
+
+        lines = self.idle_pending
+        self.idle_pending = []
+        while True:
+            line = self.mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Conexión cerrada por el servidor al salir de IDLE")
+            if tag and line.startswith(tag):
+                break
+            lines.append(line.decode(errors='ignore').strip())
+        return lines
+
+    def prepare_idle(self):
+        """
+        Selecciona INBOX y guarda el punto de partida (EXISTS y último UID) para
+        interpretar después las notificaciones IDLE.
+        """
+        mailbox = self.select_inbox()
+        self.idle_last_uid = mailbox['uidnext'] - 1 if mailbox['uidnext'] else None
+
+    def fetch_idle_updates(self, lines: List[str]) -> List[Dict]:
+        """
+        Interpreta las respuestas recibidas en IDLE (EXISTS, EXPUNGE, FETCH) y
+        descarga sólo los mensajes nuevos anunciados, con el mismo pipeline de
+        dos fases que la verificación completa.
+        Cualquier EXISTS dispara el fetch desde idle_last_uid: el número de
+        mensajes no sirve para saber si hay nuevos (un EXPUNGE y un correo nuevo
+        a la vez lo dejan igual).
+        Debe llamarse con la conexión fuera de IDLE (ver IdleMultiplexer.poll).
+
+        Args:
+            lines: Respuestas no etiquetadas recibidas durante IDLE
+
+        Returns:
+            Lista de correos de Netflix nuevos
+        """
+        # EXPUNGE y FETCH (cambio de flags de un mensaje existente) no traen correo nuevo
+        has_new = any(match and match.group(2).upper() == 'EXISTS'
+                      for match in map(self.IDLE_RESPONSE_RE.match, lines))
+        if not has_new:
+            return []
+
+        if self.idle_last_uid is None:
+            # Sin UIDNEXT no sabemos dónde empieza lo nuevo: búsqueda por fecha
+            return self.fetch_recent_netflix_emails(minutes_back=15)
+
+        # Mismas etapas que la verificación completa: encabezados primero, cuerpo sólo de los candidatos
+        last_uid = self.idle_last_uid
+
+        def new_previews():
+            nonlocal last_uid
+            for uid, header, preview in ingest.fetch_previews(self, f'{self.idle_last_uid + 1}:*'):
+                # "n:*" devuelve siempre el último mensaje aunque su UID sea menor que n
+                if int(uid) > self.idle_last_uid:
+                    last_uid = max(last_uid, int(uid))
+                    yield uid, header, preview
+
+        candidates = list(ingest.select_candidates(self, new_previews()))
+        bodies = ingest.fetch_bodies(self, candidates)
+        emails = list(ingest.build_records(self, ingest.parse_bodies(self, bodies, require_netflix_sender=True),
+                                           reject=True))
+        # Sólo se avanza si todo el pipeline terminó (un FETCH fallido lanza antes)
+        self.idle_last_uid = last_uid
+        return emails
+
     def wait_for_new_email(self, timeout: int = 25) -> bool:
         """
         Usa IMAP IDLE para esperar notificaciones push de Gmail.
         Retorna True si llegó un correo nuevo, False si fue timeout.
         El timeout máximo recomendado es 29 min (Gmail cierra IDLE a los 30 min).
+        Para muchas cuentas a la vez usar IdleMultiplexer en lugar de este método.
         """
         try:
-            # Enviar comando IDLE
-            tag = self.mail._new_tag()
-            self.mail.send(f'{tag.decode()} IDLE\r\n'.encode())
-            
-            # Leer respuesta de confirmación "+ idling"
-            resp = self.mail.readline()
-            logger.debug(f"[{self.email_address}] IDLE iniciado: {resp.decode(errors='ignore').strip()}")
-            
+            self.start_idle()
+
             # Esperar datos dentro del timeout
             import select
             sock = self.mail.socket()
             readable, _, _ = select.select([sock], [], [], timeout)
-            
-            # Salir de IDLE
-            self.mail.send(b'DONE\r\n')
-            
-            if readable:
+
+            lines = [self.read_idle_line()] if readable else []
+            # Salir de IDLE y consumir lo que haya llegado mientras tanto
+            lines.extend(self.stop_idle())
+
+            if lines:
                 # Hay datos → llegó algo nuevo (EXISTS, FETCH, EXPUNGE…)
-                line = self.mail.readline()
-                logger.info(f"[{self.email_address}] IDLE notificación: {line.decode(errors='ignore').strip()}")
-                # Consumir respuesta final del servidor
-                try:
-                    self.mail.readline()
-                except:
-                    pass
+                logger.info(f"[{self.email_address}] IDLE notificación: {lines[0]}")
                 return True
-            else:
-                # Timeout normal, sin notificación
-                try:
-                    self.mail.readline()
-                except:
-                    pass
-                return False
+            # Timeout normal, sin notificación
+            return False
 
         except Exception as e:
             logger.warning(f"[{self.email_address}] IMAP IDLE no soportado o error: {str(e)}")
@@ -419,114 +696,205 @@ class IMAPService:
         if not self.mail:
             self.connect()
 
-        self.mail.select("INBOX")
+        self.select_inbox()
         search_date = (datetime.now() - timedelta(minutes=minutes_back)).strftime("%d-%b-%Y")
 
         try:
             search_query = f'from:netflix.com after:{(datetime.now() - timedelta(minutes=minutes_back)).strftime("%Y/%m/%d")}'
-            status, messages = self.mail.search(None, 'X-GM-RAW', search_query)
+            status, messages = self.mail.uid('SEARCH', None, 'X-GM-RAW', f'"{search_query}"')
         except Exception:
-            status, messages = self.mail.search(None, f'(FROM "netflix.com" SINCE {search_date})')
+            status, messages = self.mail.uid('SEARCH', None, f'(FROM "netflix.com" SINCE {search_date})')
 
         if status != "OK" or not messages[0]:
             return []
 
-        email_ids = messages[0].split()
-        netflix_emails = []
-
-        for email_id in email_ids:
-            try:
-                status, msg_data = self.mail.fetch(email_id, "(RFC822)")
-                if status != "OK":
-                    continue
-                for response_part in msg_data:
-                    if isinstance(response_part, tuple):
-                        msg = email.message_from_bytes(response_part[1])
-                        subject = self._decode_mime_words(msg["Subject"])
-                        from_address = self._decode_mime_words(msg["From"])
-                        to_address = self._decode_mime_words(msg["To"])
-                        if not to_address:
-                            to_address = self._decode_mime_words(msg["Delivered-To"])
-                        if not to_address:
-                            to_address = self._decode_mime_words(msg["X-Forwarded-To"])
-                        date_str = msg["Date"]
-                        try:
-                            dt = parsedate_to_datetime(date_str)
-                            timestamp = dt.timestamp()
-                        except:
-                            timestamp = 0
-                        body = self._get_email_body(msg)
-                        email_type = self._classify_email(subject, body)
-                        if email_type:
-                            code = self._extract_code_or_link(body, email_type)
-                            netflix_emails.append({
-                                'id': email_id.decode(),
-                                'subject': subject,
-                                'from': from_address,
-                                'to': to_address,
-                                'date': date_str,
-                                'timestamp': timestamp,
-                                'type': email_type,
-                                'code': code,
-                                'body_preview': body[:200] if body else "",
-                                'body_full': body,
-                                'account': self.email_address
-                            })
-            except Exception as e:
-                logger.error(f"Error al procesar correo reciente {email_id}: {str(e)}")
-                continue
-
-        return netflix_emails
+        return self._fetch_and_classify(messages[0].split())
 
 
 class GmailMonitor:
     """Monitor para múltiples cuentas de Gmail"""
     
-    def __init__(self, accounts: List[Dict[str, str]]):
+    def __init__(self, accounts: List[Dict[str, str]], max_workers: int = 8,
+                 account_timeout: float = 120, fetch_batch_size: int = 50,
+                 pool_max_per_account: int = 3, pool_idle_timeout: float = 600,
+                 parse_workers: Optional[int] = None):
         """
         Inicializa el monitor con múltiples cuentas de Gmail
         
         Args:
             accounts: Lista de diccionarios con 'email' y 'password'
+            max_workers: Número máximo de cuentas consultadas en paralelo
+            account_timeout: Tiempo máximo en segundos para procesar una cuenta
+            fetch_batch_size: Máximo de mensajes pedidos en cada comando FETCH
+            pool_max_per_account: Máximo de conexiones IMAP abiertas por cuenta
+            pool_idle_timeout: Segundos sin uso tras los cuales se cierra una conexión del pool
+            parse_workers: Procesos para parsear y clasificar correos (None = uno por núcleo
+                           hasta DEFAULT_PARSE_WORKERS, 0 = en el hilo de cada cuenta)
         """
         self.accounts = accounts
-        self.services = []
+        self.fetch_batch_size = fetch_batch_size
+        # Conexiones autenticadas compartidas por verificaciones completas, manuales e IDLE
+        self.pool = IMAPConnectionPool(
+            self._create_service,
+            max_per_account=pool_max_per_account,
+            idle_timeout=pool_idle_timeout
+        )
+        self.sync_cursors: Dict[str, Dict] = {}   # email_address → cursor UID/UIDVALIDITY/MODSEQ
+        self.last_resynced = set()                # cuentas resincronizadas por completo en la última verificación
+        self.dedupe = MessageDedupe()             # copias del mismo correo reenviado a varias cuentas
+        self.parse_workers = parse_workers
+        self._parse_executor = None
+        self._parse_lock = threading.Lock()
+        self._parser_closed = False               # tras shutdown_parser no se crean más procesos
+        self.max_workers = max(1, int(max_workers))
+        self.account_timeout = account_timeout
+
+    @property
+    def parse_executor(self) -> Executor:
+        """
+        Executor de parseo compartido por todas las conexiones (se crea al primer
+        uso). Después de shutdown_parser se parsea en el hilo que lo pide.
+        """
+        with self._parse_lock:
+            if self._parser_closed:
+                return InlineExecutor()
+            if self._parse_executor is None:
+                self._parse_executor = create_parse_executor(self.parse_workers)
+            return self._parse_executor
+
+    def shutdown_parser(self):
+        """
+        Detiene los procesos de parseo. Una verificación que siga corriendo termina
+        parseando en su hilo: ni rebuild_parser ni parse_executor crean otro pool,
+        que nadie cerraría.
+        """
+        with self._parse_lock:
+            self._parser_closed = True
+            executor, self._parse_executor = self._parse_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def rebuild_parser(self, broken: Executor) -> Executor:
+        """
+        Reemplaza el executor de parseo roto por uno nuevo. Si varias conexiones
+        lo piden por el mismo executor, sólo la primera lo reemplaza.
+        """
+        with self._parse_lock:
+            if self._parse_executor is broken:
+                self._parse_executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        return self.parse_executor
+
+    def _create_service(self, email_address: str, password: str) -> IMAPService:
+        """Fábrica de conexiones para el pool"""
+        return IMAPService(
+            email_address=email_address,
+            password=password,
+            timeout=self.account_timeout,
+            fetch_batch_size=self.fetch_batch_size,
+            dedupe=self.dedupe,
+            parse_executor=self.parse_executor,
+            rebuild_parser=self.rebuild_parser
+        )
+
+    def _fetch_account(self, email_address: str, password: str, days_back: int,
+                       started: Dict[str, tuple],
+                       on_email: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Procesa una sola cuenta con una conexión prestada por el pool (se ejecuta en un worker)"""
+        service = self.pool.acquire(email_address, password, timeout=self.account_timeout)
+        started[email_address] = (time.time(), service)
+        broken = True
+        try:
+            emails = []
+            for email_data in service.stream_netflix_emails(days_back, cursor=self.sync_cursors.get(email_address)):
+                emails.append(email_data)
+                if on_email:
+                    try:
+                        on_email(email_data)
+                    except Exception as e:
+                        logger.error(f"Error en callback de correo para {email_address}: {str(e)}")
+            if service.aborted:
+                # Resultado parcial de una cuenta abandonada por timeout: no avanzar el cursor
+                raise TimeoutError(f"Cuenta {email_address} abortada por timeout")
+            self.sync_cursors[email_address] = service.sync_cursor
+            if service.resynced:
+                self.last_resynced.add(email_address)
+            broken = False
+            return emails
+        finally:
+            self.pool.release(service, broken=broken)
         
-    def fetch_all_netflix_emails(self, days_back: int = 7) -> List[Dict]:
+    def fetch_all_netflix_emails(self, days_back: int = 7,
+                                 on_result: Optional[Callable[[str, List[Dict]], None]] = None,
+                                 on_email: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
         """
-        Obtiene correos de Netflix de todas las cuentas de Gmail configuradas
+        Obtiene correos de Netflix de todas las cuentas de Gmail configuradas.
+        Las cuentas se consultan en paralelo (hasta max_workers a la vez), así que
+        el tiempo total se acerca al de la cuenta más lenta y no a la suma de todas.
+        
+        Cada cuenta guarda un cursor de sincronización: tras la primera carga sólo
+        se devuelven los correos nuevos. Las cuentas que tuvieron que resincronizarse
+        por completo (primera carga o cambio de UIDVALIDITY) quedan en last_resynced.
         
         Args:
             days_back: Número de días hacia atrás para buscar
+            on_result: Callback opcional llamado con (cuenta, correos) en cuanto
+                       termina cada cuenta, sin esperar al resto
+            on_email: Callback opcional llamado con cada correo en cuanto se parsea,
+                      sin esperar a que termine su cuenta (desde el hilo de la cuenta)
             
         Returns:
             Lista consolidada de todos los correos de Netflix
         """
         all_emails = []
-        
-        for account in self.accounts:
-            email_address = account.get('email')
-            password = account.get('password')
-            
-            if not email_address or not password:
-                logger.warning(f"Cuenta sin email o password: {account}")
-                continue
-            
-            try:
-                service = IMAPService(
-                    email_address=email_address,
-                    password=password
-                )
-                service.connect()
-                
-                emails = service.fetch_netflix_emails(days_back)
-                all_emails.extend(emails)
-                
-                service.disconnect()
+        self.last_resynced = set()
+        started = {}   # email_address → (inicio, IMAPService) de las cuentas en curso
+        pending = {}   # Future → email_address
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='imap-fetch')
+        try:
+            for account in self.accounts:
+                email_address = account.get('email')
+                password = account.get('password')
                 
-            except Exception as e:
-                logger.error(f"Error al procesar cuenta de Gmail {email_address}: {str(e)}")
-                continue
+                if not email_address or not password:
+                    logger.warning(f"Cuenta sin email o password: {account}")
+                    continue
+
+                future = executor.submit(self._fetch_account, email_address, password, days_back, started, on_email)
+                pending[future] = email_address
+
+            while pending:
+                done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+
+                # Fusionar resultados a medida que llegan
+                for future in done:
+                    email_address = pending.pop(future)
+                    started.pop(email_address, None)
+                    try:
+                        emails = future.result()
+                    except Exception as e:
+                        logger.error(f"Error al procesar cuenta de Gmail {email_address}: {str(e)}")
+                        continue
+                    all_emails.extend(emails)
+                    if on_result:
+                        try:
+                            on_result(email_address, emails)
+                        except Exception as e:
+                            logger.error(f"Error en callback de resultados para {email_address}: {str(e)}")
+
+                # Abandonar cuentas que superaron su tiempo máximo
+                now = time.time()
+                for future, email_address in list(pending.items()):
+                    entry = started.get(email_address)
+                    if entry and now - entry[0] > self.account_timeout:
+                        logger.error(f"Timeout al procesar cuenta de Gmail {email_address} "
+                                     f"({self.account_timeout}s), se omite en esta verificación")
+                        entry[1].abort()
+                        started.pop(email_address, None)
+                        pending.pop(future)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         
         # Ordenar por timestamp numérico (más recientes primero)
         all_emails.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
@@ -0,0 +1,206 @@
+import selectors
+import threading
+import time
+import logging
+from typing import Dict, List, Set, Tuple
+
+from gmail_service import IMAPService
+
+logger = logging.getLogger(__name__)
+
+
+class IdleMultiplexer:
+    """
+    Mantiene IMAP IDLE abierto en todas las cuentas a la vez.
+
+    Todos los sockets quedan registrados en un único selector (epoll/kqueue/select
+    según la plataforma) y se atiende la primera cuenta que recibe datos, así que
+    la latencia de detección no depende del número de cuentas.
+
+    También mide la cobertura de escucha: qué fracción del tiempo estuvo cada
+    cuenta realmente en IDLE desde que se registró por primera vez (el resto es
+    tiempo atendiendo notificaciones, reconectando o caída).
+    """
+
+    # Gmail corta IDLE a los ~30 min; renovamos antes (RFC 2177 recomienda < 29 min)
+    IDLE_RENEW_SECONDS = 20 * 60
+
+    def __init__(self, pool=None):
+        """
+        Args:
+            pool: IMAPConnectionPool al que se devuelven las conexiones caídas (opcional)
+        """
+        self.selector = selectors.DefaultSelector()
+        self.services: Dict[str, IMAPService] = {}
+        self.pool = pool
+        self._coverage_lock = threading.Lock()
+        self._tracked_since: Dict[str, float] = {}     # cuenta → primer registro
+        self._listening_since: Dict[str, float] = {}   # cuenta → inicio del IDLE actual
+        self._listened: Dict[str, float] = {}          # cuenta → segundos en IDLE ya cerrados
+        self._pending: Set[str] = set()                # cuentas con respuestas sin atender al entrar en IDLE
+
+    def __len__(self):
+        return len(self.services)
+
+    def __contains__(self, email_address: str):
+        return email_address in self.services
+
+    def add(self, service: IMAPService):
+        """Registra una conexión ya autenticada (con INBOX seleccionado) y entra en IDLE"""
+        service.start_idle()
+        self.selector.register(service.mail.socket(), selectors.EVENT_READ, service.email_address)
+        self.services[service.email_address] = service
+        self._listening(service.email_address, True)
+        self._check_pending(service)
+        logger.info(f"[{service.email_address}] Escuchando IDLE")
+
+    def remove(self, email_address: str) -> IMAPService:
+        """Quita una cuenta del selector (sin cerrar la conexión) y la devuelve"""
+        service = self.services.pop(email_address, None)
+        self._pending.discard(email_address)
+        self._listening(email_address, False)
+        if service and service.mail:
+            try:
+                self.selector.unregister(service.mail.socket())
+            except (KeyError, ValueError):
+                pass
+        return service
+
+    def resume(self, email_address: str):
+        """Vuelve a poner en IDLE una cuenta devuelta por poll() una vez atendida"""
+        service = self.services[email_address]
+        service.start_idle()
+        self.selector.register(service.mail.socket(), selectors.EVENT_READ, email_address)
+        self._listening(email_address, True)
+        self._check_pending(service)
+
+    def _check_pending(self, service: IMAPService):
+        """
+        Si al entrar en IDLE ya había respuestas sin atender (llegaron durante el
+        FETCH o antes del "+ idling"), el servidor no las va a repetir: la cuenta
+        sale en el próximo poll() sin esperar datos del socket.
+        """
+        if service.idle_pending:
+            self._pending.add(service.email_address)
+
+    def _pause(self, email_address: str) -> List[str]:
+        """Saca una cuenta de IDLE y del selector; devuelve las respuestas pendientes"""
+        service = self.services[email_address]
+        self._listening(email_address, False)
+        self.selector.unregister(service.mail.socket())
+        return service.stop_idle()
+
+    def _listening(self, email_address: str, listening: bool):
+        """Marca el inicio o el fin de un período en IDLE para la cobertura"""
+        now = time.time()
+        with self._coverage_lock:
+            self._tracked_since.setdefault(email_address, now)
+            started = self._listening_since.pop(email_address, None)
+            if started is not None:
+                self._listened[email_address] = self._listened.get(email_address, 0.0) + now - started
+            if listening:
+                self._listening_since[email_address] = now
+
+    def coverage(self) -> Dict[str, Dict]:
+        """
+        Cobertura de escucha por cuenta.
+
+        Returns:
+            {cuenta: {'listening': bool, 'coverage': fracción 0-1, 'listened_seconds', 'tracked_seconds'}}
+        """
+        now = time.time()
+        with self._coverage_lock:
+            result = {}
+            for email_address, since in self._tracked_since.items():
+                started = self._listening_since.get(email_address)
+                listened = self._listened.get(email_address, 0.0) + (now - started if started else 0.0)
+                tracked = now - since
+                result[email_address] = {
+                    'listening': started is not None,
+                    'coverage': round(listened / tracked, 4) if tracked > 0 else 1.0,
+                    'listened_seconds': round(listened, 1),
+                    'tracked_seconds': round(tracked, 1),
+                }
+            return result
+
+    def poll(self, timeout: float) -> Tuple[List[Tuple[str, List[str]]], List[str]]:
+        """
+        Espera hasta `timeout` segundos a que cualquier cuenta reciba una notificación.
+
+        Las cuentas notificadas salen de IDLE (quedan libres para SEARCH/FETCH) y
+        deben volver con resume(). Las cuentas con error se quitan del multiplexor
+        para que el llamador las reconecte.
+
+        Returns:
+            (notificadas, fallidas): lista de (cuenta, respuestas IDLE) y lista de cuentas caídas
+        """
+        ready = []
+        failed = []
+
+        if self.services:
+            events = self.selector.select(0 if self._pending else timeout)
+        else:
+            time.sleep(timeout)
+            events = []
+
+        # Cuentas con datos en el socket y cuentas que ya tenían respuestas al entrar en IDLE
+        readable = [key.data for key, _ in events]
+        pending, self._pending = self._pending, set()
+        pending = [addr for addr in pending if addr in self.services and addr not in readable]
+        for email_address in readable + pending:
+            service = self.services[email_address]
+            try:
+                lines = [service.read_idle_line()] if email_address in readable else []
+                lines.extend(self._pause(email_address))
+                logger.info(f"[{email_address}] IDLE notificación: {lines[0]}")
+                ready.append((email_address, lines))
+            except Exception as e:
+                logger.warning(f"[{email_address}] Error en IDLE: {e}")
+                self.drop(email_address)
+                failed.append(email_address)
+
+        # Renovar IDLE en las conexiones que llevan demasiado tiempo esperando
+        now = time.time()
+        notified = {addr for addr, _ in ready}
+        for email_address, service in list(self.services.items()):
+            if email_address in notified or email_address in failed:
+                continue
+            if service.idle_since and now - service.idle_since >= self.IDLE_RENEW_SECONDS:
+                try:
+                    lines = self._pause(email_address)
+                    if lines:
+                        ready.append((email_address, lines))
+                    else:
+                        self.resume(email_address)
+                except Exception as e:
+                    logger.warning(f"[{email_address}] Error al renovar IDLE: {e}")
+                    self.drop(email_address)
+                    failed.append(email_address)
+
+        return ready, failed
+
+    def drop(self, email_address: str):
+        """Quita una cuenta del multiplexor y cierra su conexión"""
+        service = self.remove(email_address)
+        if not service:
+            return
+        if service.idling:
+            # Mientras está en IDLE el servidor ignora todo salvo DONE (CLOSE/LOGOUT quedarían esperando)
+            try:
+                service.stop_idle()
+            except Exception:
+                pass
+        if self.pool:
+            # Una conexión en IDLE o con error no se puede reutilizar
+            self.pool.release(service, broken=True)
+            return
+        try:
+            service.disconnect()
+        except Exception:
+            pass
+
+    def close(self):
+        """Cierra todas las conexiones y el selector"""
+        for email_address in list(self.services):
+            self.drop(email_address)
+        self.selector.close()
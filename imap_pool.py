@@ -0,0 +1,138 @@
+import threading
+import time
+import logging
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class IMAPConnectionPool:
+    """
+    Pool de conexiones IMAP autenticadas por cuenta.
+
+    Las verificaciones completas, las manuales y las conexiones IDLE piden
+    sesiones al pool en lugar de pagar TLS + LOGIN en cada uso. Las conexiones
+    libres se validan con NOOP si llevan tiempo sin usarse y se cierran si
+    superan idle_timeout. Cada cuenta tiene un máximo de conexiones abiertas
+    (Gmail permite ~15 simultáneas por cuenta).
+    """
+
+    def __init__(self, factory: Callable[[str, str], object], max_per_account: int = 3,
+                 idle_timeout: float = 600, health_check_after: float = 60):
+        """
+        Args:
+            factory: Función (email, password) → IMAPService sin conectar
+            max_per_account: Máximo de conexiones abiertas por cuenta (libres + en uso)
+            idle_timeout: Segundos sin uso tras los cuales se cierra una conexión libre
+            health_check_after: Segundos sin uso tras los cuales se valida con NOOP antes de prestarla
+        """
+        self.factory = factory
+        self.max_per_account = max(1, int(max_per_account))
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self._lock = threading.Condition()
+        self._free: Dict[str, List[tuple]] = {}   # email → [(último uso, servicio)]
+        self._open: Dict[str, int] = {}           # email → conexiones abiertas (libres + en uso)
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0, 'broken': 0}
+
+    def acquire(self, email_address: str, password: str, timeout: float = None):
+        """
+        Presta una conexión autenticada de la cuenta, creando una si hace falta.
+
+        Raises:
+            TimeoutError: Si la cuenta está al máximo de conexiones y ninguna se libera a tiempo
+        """
+        deadline = time.time() + timeout if timeout else None
+        self.evict_idle()
+
+        while True:
+            with self._lock:
+                free = self._free.get(email_address)
+                if free:
+                    last_used, service = free.pop()
+                    create = False
+                elif self._open.get(email_address, 0) < self.max_per_account:
+                    self._open[email_address] = self._open.get(email_address, 0) + 1
+                    service = None
+                    create = True
+                else:
+                    remaining = deadline - time.time() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"Sin conexiones libres para {email_address}")
+                    self._lock.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    service = self.factory(email_address, password)
+                    service.connect()
+                except Exception:
+                    self._forget(email_address)
+                    raise
+                self.stats['created'] += 1
+                return service
+
+            # Conexión reutilizada: validar si estuvo quieta un rato
+            if time.time() - last_used >= self.health_check_after and not self._is_alive(service):
+                logger.info(f"[{email_address}] Conexión del pool caída, se descarta")
+                self._discard(service)
+                continue
+
+            self.stats['reused'] += 1
+            return service
+
+    def release(self, service, broken: bool = False):
+        """Devuelve una conexión al pool; si está rota (o en IDLE) se cierra"""
+        if broken or not service.mail:
+            self.stats['broken'] += 1
+            self._discard(service)
+            return
+        with self._lock:
+            self._free.setdefault(service.email_address, []).append((time.time(), service))
+            self._lock.notify_all()
+
+    def evict_idle(self):
+        """Cierra las conexiones libres que superaron idle_timeout"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for email_address, free in self._free.items():
+                keep = []
+                for last_used, service in free:
+                    if now - last_used >= self.idle_timeout:
+                        expired.append(service)
+                    else:
+                        keep.append((last_used, service))
+                free[:] = keep
+        for service in expired:
+            self.stats['evicted'] += 1
+            self._discard(service)
+
+    def close_all(self):
+        """Cierra todas las conexiones libres (las prestadas se cierran al devolverse)"""
+        with self._lock:
+            services = [service for free in self._free.values() for _, service in free]
+            self._free.clear()
+        for service in services:
+            self._discard(service)
+
+    def _is_alive(self, service) -> bool:
+        """Health check con NOOP"""
+        try:
+            status, _ = service.mail.noop()
+            return status == 'OK'
+        except Exception:
+            return False
+
+    def _discard(self, service):
+        """Cierra la conexión y libera su lugar en el cupo de la cuenta"""
+        try:
+            service.disconnect()
+        except Exception:
+            pass
+        self._forget(service.email_address)
+
+    def _forget(self, email_address: str):
+        with self._lock:
+            self._open[email_address] = max(0, self._open.get(email_address, 0) - 1)
+            self._lock.notify_all()
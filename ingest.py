@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Pipeline de ingesta por etapas, compartido por la verificación completa, la
+# búsqueda reciente y las notificaciones IDLE:
+#
+#   UIDs → fetch_previews → select_candidates → fetch_bodies → parse_bodies → build_records → StoreSink
+#          (encabezados +   (filtro y dedupe     (mensaje      (clasificado y   (correo
+#           inicio crudo)    sin bajar cuerpo)    completo)     extraído)        completo)
+#
+# Cada etapa es un generador que recibe el iterable de la anterior: se puede probar
+# o medir por separado con datos ya materializados, y cada correo sigue aguas abajo
+# en cuanto está listo en lugar de esperar a que termine toda la cuenta. Las etapas
+# que hablan con IMAP reciben el IMAPService de la cuenta.
+
+
+# (uid, encabezados, inicio del cuerpo) / (uid, mensaje completo, X-GM-MSGID) / (uid, X-GM-MSGID, campos)
+Preview = Tuple[bytes, bytes, bytes]
+Body = Tuple[bytes, bytes, Optional[bytes]]
+Parsed = Tuple[bytes, Optional[bytes], Optional[Dict]]
+
+
+def fetch_previews(service, uids: Union[str, Iterable[bytes]]) -> Iterator[Preview]:
+    """
+    Fase 1 del fetch: encabezados seleccionados y los primeros PREVIEW_BYTES de cada mensaje
+
+    Args:
+        uids: UIDs encontrados o un conjunto IMAP ya armado ("5:*")
+    """
+    for uid, sections in service._stream_fetch(uids, service.PREVIEW_FETCH_ITEMS):
+        yield uid, sections.get('HEADER', b''), sections.get('TEXT', b'')
+
+
+def select_candidates(service, previews: Iterable[Preview]) -> Iterator[bytes]:
+    """
+    Descarta publicidad y copias de correos ya reclamados por otra cuenta (sin bajar
+    el cuerpo). Ante un error se descarga el correo: perder un código es peor que
+    un fetch de más.
+    """
+    for uid, header, preview in previews:
+        try:
+            if not service._is_candidate(header, preview) or service._is_duplicate(uid, header, preview):
+                continue
+        except Exception as e:
+            logger.error(f"Error al procesar encabezados del correo {uid}: {str(e)}")
+        yield uid
+
+
+def fetch_bodies(service, uids: Union[str, Iterable[bytes]]) -> Iterator[Body]:
+    """
+    Fase 2 del fetch: mensaje completo. Los UIDs se piden de los más nuevos a
+    los más viejos para que los códigos recientes lleguen primero.
+
+    Args:
+        uids: UIDs de la etapa anterior o un conjunto IMAP ya armado ("5:*")
+    """
+    if not isinstance(uids, str):
+        uids = sorted(uids, key=int, reverse=True)
+    for uid, sections in service._stream_fetch(uids, service.body_fetch_items):
+        if 'BODY' in sections:
+            yield uid, sections['BODY'], sections.get('X-GM-MSGID')
+
+
+def parse_bodies(service, bodies: Iterable[Body], require_netflix_sender: bool = False) -> Iterator[Parsed]:
+    """
+    Parseo MIME, clasificación y extracción en el executor de parseo. Cada mensaje
+    se envía apenas llega y los resultados salen en orden de llegada en cuanto
+    están listos, sin esperar al resto de la descarga.
+
+    Un mensaje que no se pudo parsear no se entrega: no es un correo rechazado,
+    así que tampoco se descartan sus copias en otras cuentas (se liberan para
+    que otra cuenta lo intente).
+    """
+    pending = deque()
+
+    def result(uid, msgid, raw, future):
+        try:
+            return uid, msgid, service._parse_result(future, raw, require_netflix_sender)
+        except Exception as e:
+            logger.error(f"[{service.email_address}] Error al procesar correo {uid}: {str(e)}")
+            if service.dedupe is not None:
+                service.dedupe.release((service.email_address, uid.decode()))
+            return None
+
+    for uid, raw, msgid in bodies:
+        pending.append((uid, msgid, raw, service._submit_parse(raw, require_netflix_sender)))
+        while pending and pending[0][3].done():
+            item = result(*pending.popleft())
+            if item:
+                yield item
+    while pending:
+        item = result(*pending.popleft())
+        if item:
+            yield item
+
+
+def build_records(service, parsed: Iterable[Parsed], reject: bool = False) -> Iterator[Dict]:
+    """
+    Completa cada correo clasificado con UID, cuenta y claves estables.
+
+    Args:
+        reject: Avisar a la deduplicación de los mensajes que no eran códigos (sus
+                copias en otras cuentas se descartan sin anotarse)
+    """
+    for uid, msgid, fields in parsed:
+        record = service._build_record(uid, fields, msgid)
+        if record:
+            yield record
+        elif reject and service.dedupe is not None:
+            service.dedupe.reject(service.email_address, uid.decode())
+
+
+class StoreSink:
+    """
+    Última etapa: agrega cada correo al almacén apenas sale del pipeline y avisa
+    los nuevos en tandas de a lo sumo un envío cada `interval` segundos (el
+    primero sale enseguida). Se puede llamar desde los hilos de varias cuentas.
+    """
+
+    def __init__(self, store, on_flush: Callable[[List[Dict]], None], interval: float = 0.25):
+        """
+        Args:
+            store: EmailStore donde se agregan los correos
+            on_flush: Recibe los correos nuevos de cada tanda (publicar, notificar)
+            interval: Segundos mínimos entre tandas
+        """
+        self.store = store
+        self.on_flush = on_flush
+        self.interval = interval
+        self.added = 0
+        self._pending: List[Dict] = []
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, email_data: Dict):
+        if not self.store.add(email_data):
+            return
+        with self._lock:
+            self.added += 1
+            self._pending.append(self.store.get(self.store.key(email_data)) or email_data)
+            due = time.time() - self._last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Envía la tanda pendiente (también al terminar, para no dejar correos sin avisar)"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.time()
+        if pending:
+            try:
+                self.on_flush(pending)
+            except Exception as e:
+                logger.error(f"Error al publicar correos de la ingesta: {str(e)}")
@@ -0,0 +1,153 @@
+import email
+import hashlib
+import html
+import quopri
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+EmailKey = Tuple[str, str]
+
+# Prefijos que agregan los reenvíos manuales al asunto
+FORWARD_PREFIX_RE = re.compile(r'^\s*((fwd?|rv|re|tr|wg)\s*:\s*)+', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]+>')
+SPACE_RE = re.compile(r'\s+')
+
+# El ganador de un mensaje que resultó no ser un correo de código
+REJECTED = ('', '')
+
+
+class MessageDedupe:
+    """
+    Deduplicación entre cuentas de los correos reenviados.
+
+    Los buzones de perfil se reenvían a varias cuentas monitoreadas, así que el
+    mismo correo llega una vez por cuenta. Cada mensaje se identifica antes de
+    descargar su cuerpo (con los encabezados y el inicio del texto de la fase 1
+    del fetch) por Message-ID o, si no tiene, por un hash del contenido
+    normalizado. La primera cuenta que lo reclama lo descarga y lo parsea; las
+    demás sólo quedan anotadas para agregarse al correo existente (ver apply).
+    Las copias anotadas esperan en cola hasta que el original llega al almacén;
+    se descartan sólo si el original no era un código (reject) o si salió del
+    almacén (release).
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        """
+        Args:
+            max_entries: Mensajes recordados; los más viejos se olvidan primero
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._owners: 'OrderedDict[str, EmailKey]' = OrderedDict()   # clave de mensaje → (cuenta, UID)
+        self._keys: Dict[EmailKey, str] = {}                          # (cuenta, UID) → clave de mensaje
+        self._attachments: Dict[EmailKey, Set[str]] = {}               # correo original → cuentas de sus copias
+
+    @staticmethod
+    def split_raw(raw: bytes, preview_bytes: int) -> Tuple[bytes, bytes]:
+        """Separa un mensaje completo en encabezados e inicio del cuerpo, como los pide la fase 1"""
+        header, separator, body = raw.partition(b'\r\n\r\n')
+        if not separator:
+            header, _, body = raw.partition(b'\n\n')
+        return header, body[:preview_bytes]
+
+    @staticmethod
+    def message_key(header: bytes, preview: bytes) -> str:
+        """Message-ID del mensaje o, si no tiene, hash de asunto, remitente, fecha y texto normalizados"""
+        msg = email.message_from_bytes(header)
+        message_id = (msg['Message-ID'] or '').strip().strip('<>').strip()
+        if message_id:
+            return f"mid:{message_id}"
+        subject = FORWARD_PREFIX_RE.sub('', str(msg['Subject'] or ''))
+        try:
+            text = quopri.decodestring(preview).decode('utf-8', errors='ignore')
+        except Exception:
+            text = preview.decode('utf-8', errors='ignore')
+        text = html.unescape(TAG_RE.sub(' ', text))
+        normalized = '\n'.join(SPACE_RE.sub(' ', part).strip().lower()
+                               for part in (subject, str(msg['From'] or ''), str(msg['Date'] or ''), text))
+        return f"sha:{hashlib.sha1(normalized.encode()).hexdigest()}"
+
+    def claim(self, key: str, account: str, uid: str) -> Optional[EmailKey]:
+        """
+        Reclama un mensaje para (cuenta, UID).
+
+        Returns:
+            None si le toca a esta cuenta procesarlo (primera vez o ya era suyo),
+            o el (cuenta, UID) del correo original si es una copia de otra cuenta
+        """
+        with self._lock:
+            owner = self._owners.get(key)
+            if owner is None or owner[0] == account:
+                # Misma cuenta: verificación repetida o UID nuevo tras un cambio de UIDVALIDITY
+                if owner is not None and owner != (account, uid):
+                    self._keys.pop(owner, None)
+                    if owner in self._attachments:
+                        self._attachments.setdefault((account, uid), set()).update(self._attachments.pop(owner))
+                self._owners[key] = (account, uid)
+                self._owners.move_to_end(key)
+                self._keys[(account, uid)] = key
+                while len(self._owners) > self.max_entries:
+                    _, evicted = self._owners.popitem(last=False)
+                    self._keys.pop(evicted, None)
+                    self._attachments.pop(evicted, None)
+                return None
+            self._owners.move_to_end(key)
+            if owner != REJECTED:
+                self._attachments.setdefault(owner, set()).add(account)
+            return owner
+
+    def reject(self, account: str, uid: str):
+        """El mensaje reclamado no era un correo de código: sus copias se descartan sin anotarse"""
+        with self._lock:
+            key = self._keys.pop((account, uid), None)
+            self._attachments.pop((account, uid), None)
+            if key is not None:
+                self._owners[key] = REJECTED
+
+    def release(self, owner: EmailKey):
+        """Olvida el original (salió del almacén): la próxima copia que llegue se procesa"""
+        with self._lock:
+            self._attachments.pop(owner, None)
+            key = self._keys.pop(owner, None)
+            if key is not None and self._owners.get(key) == owner:
+                del self._owners[key]
+
+    def drain(self) -> List[Tuple[EmailKey, str]]:
+        """Devuelve y limpia las copias anotadas: (correo original, cuenta donde llegó la copia)"""
+        with self._lock:
+            attachments, self._attachments = self._attachments, {}
+            return [(owner, account) for owner, accounts in attachments.items() for account in sorted(accounts)]
+
+    def requeue(self, owner: EmailKey, account: str):
+        """Vuelve a encolar una copia cuyo original todavía no llegó al almacén"""
+        with self._lock:
+            # Si entretanto se rechazó, se liberó o se olvidó el original, la copia se descarta
+            if owner in self._keys:
+                self._attachments.setdefault(owner, set()).add(account)
+
+    def apply(self, attach: Callable[[EmailKey, str], bool]) -> int:
+        """
+        Agrega cada copia anotada a su original con attach (ej. EmailStore.attach_account).
+        Las copias cuyo original todavía no está en el almacén (sigue en el pipeline
+        de su cuenta) quedan en cola para el próximo apply.
+
+        Returns:
+            Cantidad de copias agregadas
+        """
+        attached = 0
+        for owner, account in self.drain():
+            if attach(owner, account):
+                attached += 1
+            else:
+                self.requeue(owner, account)
+        return attached
+
+    def pending(self) -> int:
+        """Copias en cola esperando a su original"""
+        with self._lock:
+            return sum(len(accounts) for accounts in self._attachments.values())
+
+    def __len__(self):
+        return len(self._owners)
@@ -0,0 +1,172 @@
+import email
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from email.header import decode_header
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from netflix_parser import CLASSIFIER, extract_code_or_link
+
+logger = logging.getLogger(__name__)
+
+# Tope de procesos de parseo por defecto: en servidores con muchos núcleos cada
+# worker es un intérprete completo en memoria y el parseo no necesita más
+DEFAULT_PARSE_WORKERS = 4
+
+
+def decode_mime_words(s) -> str:
+    """Decodifica palabras MIME en el encabezado"""
+    if s is None:
+        return ""
+    decoded_fragments = decode_header(s)
+    result = []
+    for fragment, encoding in decoded_fragments:
+        if isinstance(fragment, bytes):
+            if encoding:
+                try:
+                    result.append(fragment.decode(encoding))
+                except:
+                    result.append(fragment.decode('utf-8', errors='ignore'))
+            else:
+                result.append(fragment.decode('utf-8', errors='ignore'))
+        else:
+            result.append(str(fragment))
+    return ''.join(result)
+
+
+def get_email_body(msg) -> str:
+    """Extrae el cuerpo del correo, priorizando HTML para una mejor visualización"""
+    html_body = ""
+    plain_body = ""
+
+    if msg.is_multipart():
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            content_disposition = str(part.get("Content-Disposition"))
+
+            if "attachment" in content_disposition:
+                continue
+
+            if content_type == "text/html":
+                try:
+                    html_body = part.get_payload(decode=True).decode()
+                except:
+                    pass
+            elif content_type == "text/plain":
+                try:
+                    plain_body = part.get_payload(decode=True).decode()
+                except:
+                    pass
+    else:
+        try:
+            content_type = msg.get_content_type()
+            payload = msg.get_payload(decode=True).decode()
+            if content_type == "text/html":
+                html_body = payload
+            else:
+                plain_body = payload
+        except:
+            pass
+
+    # Priorizar HTML para el visor original
+    return html_body if html_body else plain_body
+
+
+def parse_message(raw: bytes, require_netflix_sender: bool = False) -> Optional[Dict]:
+    """
+    Parsea un mensaje RFC822, lo clasifica y extrae el código o link.
+
+    Es una función de módulo sin estado para poder correr en otro proceso (ver
+    create_parse_executor): recibe los bytes crudos y devuelve sólo los campos
+    del correo; la cuenta, el UID y el X-GM-MSGID los agrega IMAPService.
+
+    Args:
+        raw: Mensaje completo en bytes
+        require_netflix_sender: Descartar correos cuyo remitente/asunto no mencione Netflix
+                                (para mensajes que no pasaron por el filtro de búsqueda)
+
+    Returns:
+        Campos del correo, o None si no es un correo de código
+    """
+    msg = email.message_from_bytes(raw)
+
+    # Decodificar asunto y remitente
+    subject = decode_mime_words(msg["Subject"])
+    from_address = decode_mime_words(msg["From"])
+
+    if require_netflix_sender and 'netflix' not in (from_address + " " + subject).lower():
+        return None
+
+    # Estrategia para obtener el destinatario real
+    # Priorizamos el "To" del header porque suele contener la cuenta original (digitalacc09...)
+    to_address = decode_mime_words(msg["To"])
+
+    # Si no hay, probamos otros (fallback)
+    if not to_address:
+        to_address = decode_mime_words(msg["Delivered-To"])
+    if not to_address:
+        to_address = decode_mime_words(msg["X-Forwarded-To"])
+
+    # Extraer fecha real para ordenamiento
+    date_str = msg["Date"]
+    try:
+        dt = parsedate_to_datetime(date_str)
+        timestamp = dt.timestamp()
+    except:
+        timestamp = 0
+
+    # Obtener cuerpo y clasificar el correo
+    body = get_email_body(msg)
+    email_type = CLASSIFIER.classify(subject, body)
+
+    if not email_type:
+        return None
+
+    return {
+        'subject': subject,
+        'from': from_address,
+        'to': to_address,
+        'date': date_str,
+        'timestamp': timestamp,
+        'type': email_type,
+        'code': extract_code_or_link(body, email_type),
+        'body_preview': body[:200] if body else "",
+        'body_full': body,
+    }
+
+
+class InlineExecutor(Executor):
+    """Executor que corre cada tarea en el hilo que la envía (parse_workers = 0)"""
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def create_parse_executor(workers: Optional[int] = None) -> Executor:
+    """
+    Executor para parse_message.
+
+    Por defecto un pool de procesos (un worker por núcleo, hasta
+    DEFAULT_PARSE_WORKERS): el parseo MIME, la clasificación y la extracción no
+    compiten por el GIL con Flask y Socket.IO.
+    Los workers arrancan con forkserver (o spawn), nunca con fork de un proceso
+    que ya tiene hilos.
+
+    Args:
+        workers: Procesos del pool; 0 parsea en el hilo que descarga (sin procesos)
+    """
+    if workers is None:
+        workers = min(os.cpu_count() or 1, DEFAULT_PARSE_WORKERS)
+    if workers <= 0:
+        return InlineExecutor()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    logger.info(f"Parseo de correos en un pool de {workers} procesos ({context.get_start_method()})")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
@@ -0,0 +1,313 @@
+import re
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+# Patrones para identificar correos de Netflix, en orden de prioridad:
+# si un correo coincide con varios tipos gana el primero de esta lista
+NETFLIX_PATTERNS = {
+    'codigo_inicio': [
+        r'c[oó]digo de inicio',
+        r'sign-in code',
+        r'verification code',
+        r'c[oó]digo de verificaci[oó]n'
+    ],
+    'codigo_temporal': [
+        r'c[oó]digo de acceso temporal',
+        r'c[oó]digo temporal',
+        r'obtener c[oó]digo',
+        r'temporary code',
+        r'temporary access code',
+        r'one-time code',
+        r'c[oó]digo de un solo uso'
+    ],
+    'actualizacion_hogar': [
+        r'actualizaci[oó]n de hogar',
+        r'actualizar tu hogar',
+        r'confirmar hogar',
+        r'household update',
+        r'update your netflix household',
+        r'manage your household',
+        r'administra tu hogar',
+        r'¿solicitaste actualizar',
+        r'actualizar.*?hogar'
+    ]
+}
+
+# Extracción del código numérico de inicio de sesión (sobre el texto visible)
+SIGNIN_CODE_PATTERNS = [
+    re.compile(p, re.IGNORECASE | re.DOTALL) for p in [
+        r'(?:código|code).*?(?:iniciar sesión|sign-?in|login).*?(\d{4,8})',
+        r'(?:iniciar sesión|sign-?in|login).*?(?:código|code).*?(\d{4,8})',
+        r'(?:ingresa|enter).*?(?:este|this).*?(?:código|code).*?(\d{4,8})',
+        r'(?:para|to).*?(?:iniciar sesión|sign in).*?(\d{4,8})',
+    ]
+]
+SIGNIN_CONTEXT_RE = re.compile(r'sign-?in|iniciar sesión', re.IGNORECASE)
+ISOLATED_CODE_RE = re.compile(r'\b(\d{4,6})\b')
+
+# Texto de los botones de acción (ej: "Sí, la envié yo", "Obtener código")
+BUTTON_KEYWORDS = [
+    'sí, la envié yo', 'si, la envie yo', 'obtener código', 'obtener codigo',
+    'get code', 'verify', 'update', 'actualizar', 'confirmar', 'yes, this was me'
+]
+# Links de ayuda o legales que nunca son el botón de acción
+EXCLUDED_LINK_WORDS = ['help', 'privacy', 'unsubscribe', 'terms', 'contact']
+FALLBACK_EXCLUDED_LINK_WORDS = ['help', 'privacy', 'unsubscribe']
+
+# Rutas de los links de acción según el tipo de correo
+LINK_URL_PATTERNS = {
+    'actualizacion_hogar': re.compile(r'/household/|/update-household/|/update-primary-location/', re.IGNORECASE),
+    'codigo_temporal': re.compile(r'/temporary-access/|/access/|/otp/|/nmv/', re.IGNORECASE),
+}
+
+
+class NetflixClassifier:
+    """
+    Clasificador de correos de Netflix compilado una sola vez al importar.
+
+    Casi todos los patrones son texto literal con alguna clase tipo [oó]; esos se
+    expanden a sus variantes y se buscan con `in` sobre el texto en minúsculas
+    (búsqueda de subcadenas en C, mucho más rápida que el motor de regex). Sólo
+    los patrones con sintaxis real (ej. 'actualizar.*?hogar') quedan como regex.
+
+    Se busca primero en el asunto y, sólo si hace falta, en 'asunto cuerpo' (que
+    se pasa a minúsculas una sola vez), igual que antes: un patrón puede empezar
+    en el asunto y terminar en el cuerpo. Se respeta la prioridad de
+    NETFLIX_PATTERNS: gana el tipo más prioritario que aparezca en el correo.
+    """
+
+    REGEX_SYNTAX = set('.*+?()|\\{}^$')
+
+    def __init__(self, patterns: Dict[str, List[str]]):
+        self.types = list(patterns)
+        self.matchers = []   # (tipo, literales, regex compiladas) en orden de prioridad
+        for email_type, type_patterns in patterns.items():
+            literals = []
+            regexes = []
+            for pattern in type_patterns:
+                variants = self._expand(pattern)
+                if variants is None:
+                    regexes.append(re.compile(pattern, re.IGNORECASE))
+                else:
+                    literals.extend(v.lower() for v in variants)
+            self.matchers.append((email_type, tuple(dict.fromkeys(literals)), tuple(regexes)))
+
+    @classmethod
+    def _expand(cls, pattern: str) -> Optional[List[str]]:
+        """Expande 'c[oó]digo' → ['codigo', 'código']; None si el patrón necesita regex"""
+        variants = ['']
+        for char_class, literal in re.findall(r'\[([^\]]+)\]|([^\[]+)', pattern):
+            if literal and cls.REGEX_SYNTAX.intersection(literal):
+                return None
+            options = list(char_class) if char_class else [literal]
+            variants = [v + o for v in variants for o in options]
+        return variants
+
+    @staticmethod
+    def _matches(text: str, literals, regexes) -> bool:
+        return any(literal in text for literal in literals) or any(r.search(text) for r in regexes)
+
+    def classify(self, subject: str, body: str) -> Optional[str]:
+        """
+        Returns:
+            'codigo_inicio', 'codigo_temporal', 'actualizacion_hogar' o None
+        """
+        subject = (subject or "").lower()
+        text = None
+        for email_type, literals, regexes in self.matchers:
+            if self._matches(subject, literals, regexes):
+                return email_type
+            if text is None:
+                text = subject + " " + (body or "").lower()
+            if self._matches(text, literals, regexes):
+                return email_type
+        return None
+
+
+# Instancia compartida, construida al importar el módulo
+CLASSIFIER = NetflixClassifier(NETFLIX_PATTERNS)
+
+
+class HTMLScan(HTMLParser):
+    """
+    Recorre el HTML una sola vez y junta el texto visible y los links <a href>.
+
+    Reproduce lo que devolvían soup.get_text(separator=' ') y
+    soup.find_all('a', href=True) con BeautifulSoup + html.parser: mismos nodos
+    de texto (sin script/style/template ni comentarios, espacios en blanco
+    colapsados igual) y el texto de cada link según el anidamiento real de tags.
+    """
+
+    VOID_ELEMENTS = {
+        'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+        'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+        'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+    }
+    NON_TEXT_ELEMENTS = {'script', 'style', 'template'}
+    PRESERVE_WHITESPACE = {'pre', 'textarea'}
+    ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings: List[str] = []
+        self.links: List[Tuple[str, List[str]]] = []   # (href, partes del texto del link)
+        self._stack = []          # (tag, índice del link o None)
+        self._data = []
+        self._non_text = 0
+        self._preserve = 0
+        self._open_links = []
+
+    def text(self) -> str:
+        """Equivalente a soup.get_text(separator=' ')"""
+        return ' '.join(self.strings)
+
+    def link_items(self) -> List[Tuple[str, str]]:
+        """Lista de (href, texto del link) en orden de documento"""
+        return [(href, ''.join(parts)) for href, parts in self.links]
+
+    def _flush(self):
+        if not self._data:
+            return
+        text = ''.join(self._data)
+        self._data = []
+        if not self._preserve and not text.strip(self.ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        if self._non_text:
+            return
+        self.strings.append(text)
+        for link in self._open_links:
+            self.links[link][1].append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in self.VOID_ELEMENTS:
+            return
+        link = None
+        if tag == 'a':
+            href = None
+            for name, value in attrs:
+                if name == 'href':
+                    href = value if value is not None else ''
+            if href is not None:
+                link = len(self.links)
+                self.links.append((href, []))
+                self._open_links.append(link)
+        self._stack.append((tag, link))
+        self._non_text += tag in self.NON_TEXT_ELEMENTS
+        self._preserve += tag in self.PRESERVE_WHITESPACE
+
+    def handle_endtag(self, tag):
+        self._flush()
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        # Cerrar el tag y todos los que quedaron abiertos dentro de él
+        while len(self._stack) > i:
+            name, link = self._stack.pop()
+            self._non_text -= name in self.NON_TEXT_ELEMENTS
+            self._preserve -= name in self.PRESERVE_WHITESPACE
+            if link is not None:
+                self._open_links.remove(link)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        character = html5.get(name + ';') or html5.get(name)
+        self._data.append(character if character is not None else f'&{name}')
+
+    def handle_charref(self, name):
+        try:
+            code = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+        except ValueError:
+            code = None
+        data = None
+        if code and code < 256:
+            # Referencias numéricas < 256 suelen venir en windows-1252
+            try:
+                data = bytes([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data and code:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._data.append(data or '\N{REPLACEMENT CHARACTER}')
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.startswith('CDATA['):
+            self._data.append(data[len('CDATA['):])
+            self._flush()
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def scan_html(body: str) -> HTMLScan:
+    """Parsea el HTML en una sola pasada"""
+    scan = HTMLScan()
+    scan.feed(body)
+    scan.close()
+    return scan
+
+
+def extract_code_or_link(body: str, email_type: str) -> str:
+    """
+    Extrae el código de inicio de sesión o el link de acción de un correo.
+    Un solo recorrido del HTML alimenta las tres prioridades de links.
+    """
+    if not body:
+        return ""
+
+    scan = scan_html(body)
+
+    # 1. Caso: Código de Inicio (Numérico)
+    if email_type == 'codigo_inicio':
+        # Primero intentar extraer del texto plano para evitar tags intermedios
+        text_content = scan.text()
+        for pattern in SIGNIN_CODE_PATTERNS:
+            match = pattern.search(text_content)
+            if match:
+                return match.group(1)
+
+        # Fallback a 4 dígitos aislados si hay contexto de login
+        if SIGNIN_CONTEXT_RE.search(text_content):
+            match = ISOLATED_CODE_RE.search(text_content)
+            if match:
+                return match.group(1)
+
+    # 2. Caso: Links (Hogar o Temporal), sólo de netflix.com
+    links = [(href, text) for href, text in scan.link_items() if 'netflix.com' in href]
+    url_pattern = LINK_URL_PATTERNS.get(email_type)
+
+    url_link = fallback_link = None
+    for href, text in links:
+        href_lower = href.lower()
+        # Prioridad 1: el texto coincide con un botón (evitando links de ayuda o legales)
+        if not any(word in href_lower for word in EXCLUDED_LINK_WORDS):
+            link_text = text.lower().strip()
+            if any(keyword in link_text for keyword in BUTTON_KEYWORDS):
+                return href
+        # Prioridad 2: ruta típica del tipo de correo (nmv, access, household)
+        if url_link is None and url_pattern and url_pattern.search(href):
+            url_link = href
+        # Prioridad 3: el primer link de netflix que no sea basura
+        if fallback_link is None and not any(word in href_lower for word in FALLBACK_EXCLUDED_LINK_WORDS):
+            fallback_link = href
+
+    return url_link or fallback_link or ""
@@ -0,0 +1,148 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ScanJob:
+    """Una verificación completa de todas las cuentas y su estado"""
+
+    __slots__ = ('id', 'reason', 'status', 'created_at', 'started_at', 'finished_at',
+                 'accounts_done', 'accounts_total', 'result', 'error', 'event')
+
+    def __init__(self, job_id: str, reason: str, event):
+        self.id = job_id
+        self.reason = reason
+        self.status = 'pending'   # pending → running → done | failed
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.accounts_done = 0
+        self.accounts_total = 0
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.event = event
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'reason': self.reason,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'accounts_done': self.accounts_done,
+            'accounts_total': self.accounts_total,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class ScanCoordinator:
+    """
+    Verificaciones completas en single-flight.
+
+    Los pedidos manuales (/api/check) y los periódicos del loop de monitoreo se
+    juntan en un único trabajo en curso: quien pide mientras hay uno corriendo
+    recibe ese mismo trabajo, y si el último terminó hace menos de min_interval
+    se devuelve su resultado sin volver a consultar Gmail. El trabajo corre en
+    una tarea de fondo y quien quiera el resultado espera su evento.
+    """
+
+    def __init__(self, run: Callable[[ScanJob], Dict], min_interval: float = 30,
+                 on_update: Optional[Callable[[ScanJob], None]] = None,
+                 event_factory: Callable = threading.Event,
+                 start_task: Optional[Callable] = None, history: int = 50):
+        """
+        Args:
+            run: Hace la verificación; recibe el trabajo y devuelve su resultado
+            min_interval: Segundos mínimos entre el fin de una verificación y la siguiente
+            on_update: Callback con cada cambio de estado o progreso del trabajo
+            event_factory: Fábrica de eventos (ej: socketio.server.eio.create_event)
+            start_task: Lanza run en segundo plano (ej: socketio.start_background_task)
+            history: Trabajos terminados que se recuerdan para consultar su estado
+        """
+        self.run = run
+        self.min_interval = min_interval
+        self.on_update = on_update
+        self.event_factory = event_factory
+        self.start_task = start_task or self._start_thread
+        self.history = history
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs: 'OrderedDict[str, ScanJob]' = OrderedDict()
+        self.current: Optional[ScanJob] = None
+        self.last: Optional[ScanJob] = None
+
+    @staticmethod
+    def _start_thread(target, *args):
+        threading.Thread(target=target, args=args, daemon=True, name='full-scan').start()
+
+    def request(self, reason: str = 'manual', force: bool = False) -> Tuple[ScanJob, bool]:
+        """
+        Pide una verificación completa.
+
+        Returns:
+            (trabajo, nuevo): nuevo es False si se reutilizó el trabajo en curso
+            o el resultado reciente (force ignora el intervalo mínimo, no el trabajo en curso)
+        """
+        with self._lock:
+            if self.current is not None:
+                return self.current, False
+            last = self.last
+            if (not force and last is not None and last.status == 'done'
+                    and time.time() - last.finished_at < self.min_interval):
+                return last, False
+            job = ScanJob(f"scan-{next(self._ids)}", reason, self.event_factory())
+            self.current = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        self.start_task(self._execute, job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job: ScanJob, timeout: Optional[float] = None) -> bool:
+        """Espera a que el trabajo termine; False si venció el timeout"""
+        job.event.wait(timeout)
+        return job.finished
+
+    def progress(self, job: ScanJob, done: int, total: int):
+        job.accounts_done = done
+        job.accounts_total = total
+        self._notify(job)
+
+    def _notify(self, job: ScanJob):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                logger.error(f"Error al avisar el progreso de {job.id}: {str(e)}")
+
+    def _execute(self, job: ScanJob):
+        job.status = 'running'
+        job.started_at = time.time()
+        self._notify(job)
+        try:
+            job.result = self.run(job)
+            job.status = 'done'
+        except Exception as e:
+            logger.error(f"Error en la verificación completa {job.id}: {str(e)}")
+            job.error = str(e)
+            job.status = 'failed'
+        job.finished_at = time.time()
+        with self._lock:
+            self.current = None
+            self.last = job
+        job.event.set()
+        self._notify(job)
@@ -3,8 +3,14 @@ const socket = io();
 
 // State
 let currentEmails = [];
+let nextCursor = null;
+let lastSeq = 0;        // Última secuencia del feed de cambios aplicada
+let storeEpoch = null;  // Arranque del servidor al que corresponde lastSeq
+let resumePending = false;  // Se pidieron los cambios perdidos y todavía no llegaron
 let currentSettings = {};
 let isMonitoring = false;
+let pendingScanJob = null;  // Verificación pedida con "Verificar Ahora" que todavía no terminó
+let lastFinishedScan = null;
 
 // DOM Elements
 const elements = {
@@ -76,6 +82,63 @@ socket.on('connected', (data) => {
     console.log('📡 Datos de conexión:', data);
     isMonitoring = data.monitoring_active;
     updateMonitoringUI(isMonitoring);
+
+    // Al reconectar, pedir sólo los cambios que nos perdimos
+    if (storeEpoch) {
+        requestResume();
+    }
+});
+
+function requestResume() {
+    resumePending = true;
+    socket.emit('resume', { epoch: storeEpoch, last_seq: lastSeq });
+}
+
+socket.on('email_deltas', (data) => {
+    if (data.epoch !== storeEpoch) {
+        loadEmails();
+        return;
+    }
+    // prev_seq es el límite del lote completo: con una suscripción llega sólo
+    // una parte y los saltos de secuencia dentro del lote no son huecos
+    if (data.prev_seq > lastSeq) {
+        // Hueco en la secuencia: pedir lo que falta (una sola vez hasta que llegue)
+        if (!resumePending) requestResume();
+        return;
+    }
+    resumePending = false;
+
+    data.deltas.forEach(delta => {
+        if (delta.seq > lastSeq) applyDelta(delta);
+    });
+    lastSeq = Math.max(lastSeq, data.to_seq);
+    elements.lastUpdate.textContent = `Última actualización: ${formatDateTime(data.timestamp)}`;
+});
+
+// El servidor envía las estadísticas después de cada lote de cambios, con la
+// secuencia publicada: los lotes sin cambios para nuestra suscripción no llegan,
+// pero los cambios que sí nos tocaban ya llegaron antes que estas estadísticas
+socket.on('stats', (stats) => {
+    updateStats(stats);
+    if (stats.epoch === storeEpoch && !resumePending && stats.seq > lastSeq) {
+        lastSeq = stats.seq;
+    }
+});
+
+socket.on('scan_progress', (job) => {
+    const finished = job.status === 'done' || job.status === 'failed';
+    if (finished) lastFinishedScan = job;
+    if (job.job_id !== pendingScanJob) return;
+    if (finished) {
+        finishScan(job);
+    } else if (job.accounts_total) {
+        console.log(`🔎 Verificación ${job.job_id}: ${job.accounts_done}/${job.accounts_total} cuentas`);
+    }
+});
+
+socket.on('resync_required', () => {
+    console.log('🔄 Fuera del buffer de cambios, recargando lista completa');
+    loadEmails();
 });
 
 socket.on('new_emails', (data) => {
@@ -218,21 +281,35 @@ async function checkNow() {
         const data = await response.json();
 
         if (data.success) {
-            currentEmails = data.emails;
-            renderEmails(currentEmails);
-            updateStats(currentEmails);
-            showToast(data.message, 'success');
+            // La verificación sigue en el servidor; el resultado llega por 'scan_progress'
+            pendingScanJob = data.job.job_id;
+            if (data.job.status === 'done' || data.job.status === 'failed') {
+                finishScan(data.job);
+            } else if (lastFinishedScan && lastFinishedScan.job_id === pendingScanJob) {
+                // Terminó antes de que llegara la respuesta
+                finishScan(lastFinishedScan);
+            }
         } else {
             showToast(data.error || 'Error al verificar correos', 'error');
+            hideLoading(elements.checkNowBtn);
         }
     } catch (error) {
         console.error('Error:', error);
         showToast('Error al verificar correos', 'error');
-    } finally {
         hideLoading(elements.checkNowBtn);
     }
 }
 
+function finishScan(job) {
+    pendingScanJob = null;
+    hideLoading(elements.checkNowBtn);
+    if (job.status === 'done') {
+        showToast(`Se encontraron ${job.result.total} correos de Netflix (${job.result.new} nuevos)`, 'success');
+    } else {
+        showToast(job.error || 'Error al verificar correos', 'error');
+    }
+}
+
 function updateMonitoringUI(monitoring) {
     if (monitoring) {
         elements.startMonitoringBtn.style.display = 'none';
@@ -245,13 +322,20 @@ function updateMonitoringUI(monitoring) {
 
 // Load Data
 // Emails Rendering & Modal
-function openEmailModal(emailId) {
-    const email = currentEmails.find(e => e.id === emailId);
-    if (!email) return;
-
-    elements.emailViewer.innerHTML = email.body_full || 'No hay contenido disponible';
+async function openEmailModal(emailKey) {
+    // El HTML completo no viene en la lista: se pide sólo al abrir el modal
+    elements.emailViewer.innerHTML = '<span class="loading"></span>';
     elements.emailModal.classList.add('active');
     document.body.style.overflow = 'hidden';
+
+    try {
+        const response = await fetch(`/api/emails/${encodeURIComponent(emailKey)}/body`);
+        const data = await response.json();
+        elements.emailViewer.innerHTML = (data.success && data.body) || 'No hay contenido disponible';
+    } catch (error) {
+        console.error('Error al cargar el correo:', error);
+        elements.emailViewer.innerHTML = 'No hay contenido disponible';
+    }
 }
 
 function closeEmailModal() {
@@ -259,7 +343,7 @@ function closeEmailModal() {
     document.body.style.overflow = 'auto';
 }
 
-async function loadEmails() {
+async function loadEmails(append = false) {
     try {
         const typeFilter = elements.typeFilter.value;
 
@@ -267,18 +351,31 @@ async function loadEmails() {
         const params = new URLSearchParams();
 
         if (typeFilter) params.append('type', typeFilter);
+        if (append && nextCursor) params.append('cursor', nextCursor);
 
         if (params.toString()) {
             url += '?' + params.toString();
         }
 
+        // Si nada cambió el servidor responde 304 y el navegador reutiliza su copia
         const response = await fetch(url);
         const data = await response.json();
 
         if (data.success) {
-            currentEmails = data.emails;
-            renderEmails(currentEmails);
-            updateStats(currentEmails);
+            nextCursor = data.next_cursor;
+            if (!append) {
+                lastSeq = data.seq;
+                storeEpoch = data.epoch;
+                resumePending = false;
+            }
+            if (append) {
+                currentEmails = currentEmails.concat(data.emails);
+                appendEmails(data.emails);
+            } else {
+                currentEmails = data.emails;
+                renderEmails(currentEmails);
+            }
+            loadStats();
         }
     } catch (error) {
         console.error('Error al cargar correos:', error);
@@ -286,6 +383,19 @@ async function loadEmails() {
     }
 }
 
+async function loadStats() {
+    try {
+        const response = await fetch('/api/stats');
+        const data = await response.json();
+
+        if (data.success) {
+            updateStats(data.stats);
+        }
+    } catch (error) {
+        console.error('Error al cargar estadísticas:', error);
+    }
+}
+
 async function loadSettings() {
     try {
         const response = await fetch('/api/settings');
@@ -352,7 +462,8 @@ async function saveSettings() {
         const data = await response.json();
 
         if (data.success) {
-            currentSettings = newSettings;
+            // El servidor combina estas claves con el resto de settings.json
+            currentSettings = { ...currentSettings, ...newSettings };
             showToast('Configuración guardada correctamente', 'success');
             closeSettingsModal();
 
@@ -391,13 +502,82 @@ function renderEmails(emails) {
         setTimeout(() => {
             const card = createEmailCard(email);
             elements.emailsContainer.appendChild(card);
+            if (index === emails.length - 1) renderLoadMore();
         }, index * 100); // 100ms de delay entre cada tarjeta
     });
 }
 
+function applyDelta(delta) {
+    const index = currentEmails.findIndex(e => e.key === delta.key);
+    if (index !== -1) {
+        currentEmails.splice(index, 1);
+        const card = elements.emailsContainer.querySelector(`.email-card[data-key="${CSS.escape(delta.key)}"]`);
+        if (card) card.remove();
+    }
+
+    if (delta.op !== 'remove') {
+        const email = delta.email;
+        const typeFilter = elements.typeFilter.value;
+        if (!typeFilter || email.type === typeFilter) {
+            // Posición por fecha (más nuevo primero)
+            let position = currentEmails.findIndex(e => (e.timestamp || 0) < (email.timestamp || 0));
+            if (position === -1 && !nextCursor) position = currentEmails.length;
+            // Si es más viejo que la página cargada llegará con "Cargar más"
+            if (position !== -1) {
+                currentEmails.splice(position, 0, email);
+                insertEmailCard(email, position);
+            }
+        }
+    }
+
+    if (currentEmails.length === 0) renderEmails(currentEmails);
+}
+
+function insertEmailCard(email, position) {
+    const emptyState = elements.emailsContainer.querySelector('.empty-state');
+    if (emptyState) emptyState.remove();
+
+    const card = createEmailCard(email);
+    const cards = elements.emailsContainer.querySelectorAll('.email-card');
+    const loadMore = document.getElementById('loadMoreWrapper');
+    if (position < cards.length) {
+        elements.emailsContainer.insertBefore(card, cards[position]);
+    } else if (loadMore) {
+        elements.emailsContainer.insertBefore(card, loadMore);
+    } else {
+        elements.emailsContainer.appendChild(card);
+    }
+}
+
+function appendEmails(emails) {
+    emails.forEach(email => {
+        elements.emailsContainer.appendChild(createEmailCard(email));
+    });
+    renderLoadMore();
+}
+
+function renderLoadMore() {
+    const existing = document.getElementById('loadMoreWrapper');
+    if (existing) existing.remove();
+    if (!nextCursor) return;
+
+    const wrapper = document.createElement('div');
+    wrapper.id = 'loadMoreWrapper';
+    wrapper.style.cssText = 'display: flex; justify-content: center; margin-top: 12px;';
+    wrapper.innerHTML = `
+        <button class="btn btn-secondary" id="loadMoreBtn">
+            <i class="fas fa-chevron-down"></i>
+            Cargar más
+        </button>
+    `;
+    elements.emailsContainer.appendChild(wrapper);
+    wrapper.querySelector('button').addEventListener('click', () => loadEmails(true));
+}
+
 function createEmailCard(email) {
     const card = document.createElement('div');
-    card.className = `email-card type-${email.type}`;
+    card.className = `email-card type-${email.type}${email.expired ? ' expired' : ''}`;
+    card.dataset.key = email.key;
 
     const typeName = {
         'codigo_inicio': 'Código de Inicio',
@@ -422,6 +602,11 @@ function createEmailCard(email) {
                 <i class="fas fa-user-tag" title="Para"></i>
                 Para: ${escapeHtml(email.to || email.account)}
             </span>
+            ${email.accounts ? `
+            <span>
+                <i class="fas fa-inbox" title="Cuentas"></i>
+                En: ${escapeHtml(email.accounts)}
+            </span>` : ''}
             <span>
                 <i class="fas fa-clock"></i>
                 ${formatDate(email.date)}
@@ -434,7 +619,7 @@ function createEmailCard(email) {
                     <div class="email-code-header">
                         <div class="code-label">${email.type === 'actualizacion_hogar' ? 'Confirmación de Hogar:' : 'Acceso Temporal:'}</div>
                         <div style="display: flex; gap: 8px;">
-                            <button class="btn btn-icon" onclick="openEmailModal('${email.id}')" title="Ver correo original">
+                            <button class="btn btn-icon" onclick="openEmailModal('${escapeHtml(email.key)}')" title="Ver correo original">
                                 <i class="fas fa-eye"></i>
                             </button>
                             <button class="btn btn-icon" onclick="copyCode('${escapeHtml(email.code)}')" title="Copiar link">
@@ -452,7 +637,7 @@ function createEmailCard(email) {
                     <div class="email-code-header">
                         <div class="code-label">Código extraído:</div>
                         <div style="display: flex; gap: 8px;">
-                            <button class="btn btn-icon" onclick="openEmailModal('${email.id}')" title="Ver correo original">
+                            <button class="btn btn-icon" onclick="openEmailModal('${escapeHtml(email.key)}')" title="Ver correo original">
                                 <i class="fas fa-eye"></i>
                             </button>
                             <button class="btn btn-icon" onclick="copyCode('${escapeHtml(email.code)}')" title="Copiar código">
@@ -465,7 +650,7 @@ function createEmailCard(email) {
             `}
         ` : `
             <div style="display: flex; justify-content: flex-end; margin-top: 12px;">
-                <button class="btn btn-icon" onclick="openEmailModal('${email.id}')" title="Ver correo original">
+                <button class="btn btn-icon" onclick="openEmailModal('${escapeHtml(email.key)}')" title="Ver correo original">
                     <i class="fas fa-eye"></i>
                 </button>
             </div>
@@ -481,24 +666,15 @@ function createEmailCard(email) {
     return card;
 }
 
-function updateStats(emails) {
-    const stats = {
-        total: emails.length,
-        codigo_inicio: 0,
-        codigo_temporal: 0,
-        actualizacion_hogar: 0
-    };
-
-    emails.forEach(email => {
-        if (email.type in stats) {
-            stats[email.type]++;
-        }
-    });
+function updateStats(stats) {
+    // Los totales vienen del servidor: la lista está paginada y no tiene todos los correos
+    if (!elements.totalEmails) return;
+    const byType = stats.by_type || {};
 
-    animateValue(elements.totalEmails, parseInt(elements.totalEmails.textContent) || 0, stats.total);
-    animateValue(elements.codigosInicio, parseInt(elements.codigosInicio.textContent) || 0, stats.codigo_inicio);
-    animateValue(elements.codigosTemporal, parseInt(elements.codigosTemporal.textContent) || 0, stats.codigo_temporal);
-    animateValue(elements.actualizacionesHogar, parseInt(elements.actualizacionesHogar.textContent) || 0, stats.actualizacion_hogar);
+    animateValue(elements.totalEmails, parseInt(elements.totalEmails.textContent) || 0, stats.total || 0);
+    animateValue(elements.codigosInicio, parseInt(elements.codigosInicio.textContent) || 0, byType.codigo_inicio || 0);
+    animateValue(elements.codigosTemporal, parseInt(elements.codigosTemporal.textContent) || 0, byType.codigo_temporal || 0);
+    animateValue(elements.actualizacionesHogar, parseInt(elements.actualizacionesHogar.textContent) || 0, byType.actualizacion_hogar || 0);
 }
 
 // Filters
@@ -0,0 +1,90 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from email_store import EmailStore
+
+# Room de los clientes sin suscripción (dashboards): reciben todos los cambios
+ALL_ROOM = 'all'
+# Filtros de suscripción → índice del almacén que los respalda
+SUBSCRIPTION_FILTERS = {'accounts': 'account', 'to': 'to', 'types': 'type'}
+MAX_SUBSCRIPTION_KEYS = 100
+
+
+def room_name(index: str, value: str) -> str:
+    """Nombre del room de Socket.IO para un valor de índice (ej: 'to:user@gmail.com')"""
+    return f"{index}:{value.strip().lower()}"
+
+
+def email_rooms(email_data: Dict) -> Tuple[str, ...]:
+    """Rooms interesados en un correo: sus cuentas (con las de sus copias), su tipo y cada destinatario"""
+    rooms = [room_name('account', account) for account in EmailStore.accounts_of(email_data)]
+    rooms.append(room_name('type', email_data.get('type') or 'unknown'))
+    rooms.extend(room_name('to', address) for address in sorted(EmailStore.recipients(email_data.get('to'))))
+    return tuple(rooms)
+
+
+class Subscription:
+    """
+    Filtros de un cliente de Socket.IO: cuentas, destinatarios y tipos.
+
+    Un correo le interesa si coincide con cualquiera de los filtros (es la unión
+    de sus rooms); una suscripción vacía equivale a recibir todo.
+    """
+
+    __slots__ = ('filters', 'rooms')
+
+    def __init__(self, filters: Dict[str, List[str]] = None):
+        self.filters = {name: sorted(set(values)) for name, values in (filters or {}).items() if values}
+        self.rooms = frozenset(room_name(SUBSCRIPTION_FILTERS[name], value)
+                               for name, values in self.filters.items() for value in values)
+
+    @classmethod
+    def parse(cls, data: Optional[Dict]) -> 'Subscription':
+        """
+        Construye la suscripción desde el payload del cliente.
+
+        Raises:
+            ValueError: Si un filtro no es una lista de textos o hay demasiados
+        """
+        filters = {}
+        for name in SUBSCRIPTION_FILTERS:
+            values = (data or {}).get(name) or []
+            if isinstance(values, str):
+                values = [values]
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"'{name}' debe ser una lista de textos")
+            filters[name] = [v.strip().lower() for v in values if v.strip()]
+        if sum(len(values) for values in filters.values()) > MAX_SUBSCRIPTION_KEYS:
+            raise ValueError(f"Máximo {MAX_SUBSCRIPTION_KEYS} filtros por suscripción")
+        return cls(filters)
+
+    def __bool__(self):
+        return bool(self.rooms)
+
+    def matches(self, email_data: Optional[Dict]) -> bool:
+        if not self.rooms or email_data is None:
+            return True
+        return not self.rooms.isdisjoint(email_rooms(email_data))
+
+    def filter_changes(self, changes: Iterable[tuple]) -> List[tuple]:
+        """Cambios del feed que le interesan (los 'reset' siempre)"""
+        return [change for change in changes if change[1] == 'reset' or self.matches(change[3])]
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {name: self.filters.get(name, []) for name in SUBSCRIPTION_FILTERS}
+
+
+def route(items: Iterable, rooms_of: Callable[[object], Tuple[str, ...]]) -> List[Tuple[Tuple[str, ...], list]]:
+    """
+    Agrupa elementos consecutivos que van a los mismos rooms.
+
+    Sólo se juntan vecinos, así que un cliente que está en varios rooms sigue
+    recibiendo los elementos en orden (y una sola vez por emisión).
+    """
+    runs = []
+    for item in items:
+        rooms = rooms_of(item)
+        if runs and runs[-1][0] == rooms:
+            runs[-1][1].append(item)
+        else:
+            runs.append((rooms, [item]))
+    return runs